@@ -0,0 +1,175 @@
+import numpy as np
+
+from dwell_engine import DWELL_THRESHOLDS
+
+# 警报状态
+IDLE = 0  # 不在警告区域内
+ENTERING = 1  # 已进入警告区域，停留时间未超过阈值
+VIOLATING = 2  # 停留超时，正在警报
+CLEARED = 3  # 警报已解除，处于冷却期
+
+
+class AlertStateMachine:
+    """
+    按警报事件（episode）去抖的警报状态机
+    作用：
+        代替 process_frame 中 entry_time / warned_ids / displayed_warning_ids 的分散判断。
+        原来 warned_ids 永不清除，目标离开后再次进入不会再报警；停留期间每帧都会输出一条警告信息。
+        状态机为每个目标维护 空闲 → 进入 → 警报 → 解除 的状态，每次警报事件只触发一次，
+        警报的开销和数量与事件数成正比，而不是与帧数成正比。
+    实现：
+        1. 目标状态保存在按 ID 排序的数组中，每帧对所有目标一次性做状态转移
+        2. 滞回：进入状态下短暂离开（exit_grace 内）不重新计时，警报状态下离开超过 clear_after 才解除
+        3. 冷却：解除后 cooldown 内再次进入区域视为同一事件继续，不重复报警；冷却结束后才能触发新的警报
+        4. 本帧没有出现的目标视为不在区域内，目标消失后警报同样会按时解除
+    """
+    def __init__(self, thresholds=None, num_classes=5, exit_grace=0.5, clear_after=1.0, cooldown=10.0,
+                 max_age=5.0):
+        """
+        :param thresholds: {类别: 停留阈值（秒）}，为 None 时使用 DWELL_THRESHOLDS，未列出的类别不报警
+        :param num_classes: 类别数量
+        :param exit_grace: 进入状态下离开区域超过该时长（秒）才回到空闲状态
+        :param clear_after: 警报状态下离开区域超过该时长（秒）才解除警报
+        :param cooldown: 警报解除后的冷却时间（秒），冷却期内再次进入区域不会重复报警
+        :param max_age: 空闲目标超过该时长（秒）未出现时清除其状态
+        """
+        self.num_classes = num_classes
+        self.thresholds = np.full(num_classes, np.inf)
+        for cls, seconds in (DWELL_THRESHOLDS if thresholds is None else thresholds).items():
+            self.thresholds[int(cls)] = seconds
+        self.exit_grace = exit_grace
+        self.clear_after = clear_after
+        self.cooldown = cooldown
+        self.max_age = max_age
+
+        self.episodes = 0  # 累计触发的警报事件数
+        self.cleared = 0  # 累计解除的警报事件数
+        self.last_started = []  # 最近一次 update 中触发警报的目标 ID
+        self.last_ended = []  # 最近一次 update 中警报事件结束的目标 ID
+
+        self._ids = np.empty(0, dtype=np.int64)
+        self._state = np.empty(0, dtype=np.int8)
+        self._class = np.empty(0, dtype=np.int64)
+        self._entry = np.empty(0, dtype=np.float64)  # 进入警告区域的时间
+        self._last_inside = np.empty(0, dtype=np.float64)  # 最近在区域内的时间，从未进入为 nan
+        self._last_seen = np.empty(0, dtype=np.float64)
+        self._cleared_at = np.empty(0, dtype=np.float64)
+
+    def _slots(self, ids, now):
+        """查找目标在状态数组中的位置，新目标插入后保持按 ID 排序"""
+        new_ids = np.setdiff1d(ids, self._ids)
+        if len(new_ids) > 0:
+            count = len(new_ids)
+            self._ids = np.concatenate([self._ids, new_ids])
+            self._state = np.concatenate([self._state, np.full(count, IDLE, dtype=np.int8)])
+            self._class = np.concatenate([self._class, np.zeros(count, dtype=np.int64)])
+            self._entry = np.concatenate([self._entry, np.full(count, np.nan)])
+            self._last_inside = np.concatenate([self._last_inside, np.full(count, np.nan)])
+            self._last_seen = np.concatenate([self._last_seen, np.full(count, now)])
+            self._cleared_at = np.concatenate([self._cleared_at, np.full(count, np.nan)])
+            self._keep(np.argsort(self._ids, kind='stable'))
+        return np.searchsorted(self._ids, ids)
+
+    def _keep(self, index):
+        """按索引重排或筛选所有状态数组"""
+        self._ids, self._state, self._class = self._ids[index], self._state[index], self._class[index]
+        self._entry, self._last_inside = self._entry[index], self._last_inside[index]
+        self._last_seen, self._cleared_at = self._last_seen[index], self._cleared_at[index]
+
+    def update(self, track_ids, in_zone, track_classes, timestamp, exceeded=None):
+        """
+        用当前帧的区域判断结果更新所有目标的警报状态
+        :param track_ids: 当前帧各目标的 ID
+        :param in_zone: 当前帧各目标是否在警告区域内
+        :param track_classes: 当前帧各目标的类别
+        :param timestamp: 当前帧的时间（秒）
+        :param exceeded: 各目标的停留时间是否已超过阈值（如 DwellTimeEngine 的结果），
+                         为 None 时由状态机按进入时间和类别阈值自行计时
+        :return: (violating, started)，形状均为 (N,)：是否处于警报状态、本帧是否触发了新的警报事件
+        """
+        now = float(timestamp)
+        ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        in_zone = np.asarray(in_zone, dtype=bool).reshape(-1)
+        classes = np.clip(np.asarray(track_classes, dtype=np.int64).reshape(-1), 0, self.num_classes - 1)
+
+        slots = self._slots(ids, now)
+        self._class[slots] = classes
+        self._last_seen[slots] = now
+        # 本帧没有出现的目标视为不在区域内
+        present = np.zeros(len(self._ids), dtype=bool)
+        present[slots] = in_zone
+        self._last_inside[present] = now
+        absent_for = np.where(np.isnan(self._last_inside), np.inf, now - self._last_inside)
+        state = self._state
+
+        # 解除 → 空闲：冷却结束
+        state[(state == CLEARED) & (now - self._cleared_at >= self.cooldown)] = IDLE
+        # 解除 → 警报：冷却期内再次进入，视为同一事件继续，不重复报警
+        state[(state == CLEARED) & present] = VIOLATING
+
+        # 空闲 → 进入：只有配置了阈值的类别参与警报
+        entering = (state == IDLE) & present & np.isfinite(self.thresholds[self._class])
+        state[entering] = ENTERING
+        self._entry[entering] = now
+
+        # 进入 → 警报：停留超过阈值；进入 → 空闲：离开超过 exit_grace
+        if exceeded is None:
+            ready = present & (now - self._entry >= self.thresholds[self._class])
+        else:
+            ready = np.zeros(len(self._ids), dtype=bool)
+            ready[slots] = np.asarray(exceeded, dtype=bool).reshape(-1)
+        started = (state == ENTERING) & ready
+        state[started] = VIOLATING
+        state[(state == ENTERING) & (absent_for > self.exit_grace)] = IDLE
+
+        # 警报 → 解除：离开（或消失）超过 clear_after
+        ended = (state == VIOLATING) & (absent_for > self.clear_after)
+        # 冷却期内恢复的事件再次解除时不重复计数（上次解除时间晚于本次进入时间）
+        first_clear = ended & ~(self._cleared_at >= self._entry)
+        state[ended] = CLEARED
+        self._cleared_at[ended] = now
+
+        self.last_started = self._ids[started].tolist()
+        self.last_ended = self._ids[first_clear].tolist()
+        self.episodes += len(self.last_started)
+        self.cleared += len(self.last_ended)
+        result = state[slots] == VIOLATING, started[slots]
+
+        # 清除长时间未出现的空闲目标
+        alive = (state != IDLE) | (now - self._last_seen <= self.max_age)
+        if not alive.all():
+            self._keep(alive)
+        return result
+
+    def get_state(self):
+        """返回全部目标的警报状态和累计统计（用于断点续处理）"""
+        return {'ids': self._ids, 'state': self._state, 'class': self._class, 'entry': self._entry,
+                'last_inside': self._last_inside, 'last_seen': self._last_seen, 'cleared_at': self._cleared_at,
+                'episodes': self.episodes, 'cleared': self.cleared}
+
+    def set_state(self, state):
+        """从 get_state 的结果恢复"""
+        self._ids = np.array(state['ids'], dtype=np.int64)
+        self._state = np.array(state['state'], dtype=np.int8)
+        self._class = np.array(state['class'], dtype=np.int64)
+        self._entry = np.array(state['entry'], dtype=np.float64)
+        self._last_inside = np.array(state['last_inside'], dtype=np.float64)
+        self._last_seen = np.array(state['last_seen'], dtype=np.float64)
+        self._cleared_at = np.array(state['cleared_at'], dtype=np.float64)
+        self.episodes = int(state['episodes'])
+        self.cleared = int(state['cleared'])
+        self.last_started = []
+        self.last_ended = []
+
+    @property
+    def active(self):
+        """当前处于警报状态的目标数"""
+        return int((self._state == VIOLATING).sum())
+
+    def reset(self):
+        """清空所有状态和统计"""
+        self.episodes = 0
+        self.cleared = 0
+        self.last_started = []
+        self.last_ended = []
+        self._keep(np.empty(0, dtype=np.int64))
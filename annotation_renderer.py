@@ -0,0 +1,135 @@
+import cv2
+import numpy as np
+
+# 各类别检测框的绘制颜色（BGR），按类别索引循环取用
+CLASS_COLORS = [(255, 178, 29), (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255)]
+
+
+class AnnotationRenderer:
+    """
+    轻量级标注渲染器
+    作用：
+        代替 results[0].plot()，直接在原始帧上绘制检测框、ID 和轨迹，不再拷贝整帧。
+    绘制方式：
+        1. 同一类别的所有检测框合并为一次 cv2.polylines 调用
+        2. 所有目标的轨迹合并为一次 cv2.polylines 调用
+        3. 区域半透明效果只在多边形外接矩形内混合，而不是对整帧做 addWeighted
+    无标注模式：
+        既不显示也不录制时（enabled=False），跟踪会话会完全跳过绘制。
+    """
+    def __init__(self, class_names=None, draw_boxes=True, draw_labels=True, draw_trails=True,
+                 draw_zones=True, draw_lines=True, line_width=2, enabled=True):
+        """
+        :param class_names: 类别名称映射（如 model.names），为 None 时只显示类别编号
+        :param draw_boxes: 是否绘制检测框
+        :param draw_labels: 是否绘制 ID 和类别标签
+        :param draw_trails: 是否绘制跟踪轨迹
+        :param draw_zones: 是否绘制统计区域和警告区域
+        :param draw_lines: 是否绘制虚拟计数线
+        :param line_width: 线宽
+        :param enabled: 是否启用绘制，False 表示无标注模式
+        """
+        self.class_names = class_names or {}
+        self.draw_boxes = draw_boxes
+        self.draw_labels = draw_labels
+        self.draw_trails = draw_trails
+        self.draw_zones = draw_zones
+        self.draw_lines = draw_lines
+        self.line_width = line_width
+        self.enabled = enabled
+
+    def set_outputs(self, display, recording):
+        """
+        根据输出需求切换无标注模式：既不显示也不录制时不需要任何绘制
+        :param display: 当前是否需要显示画面
+        :param recording: 当前是否在录制结果视频
+        """
+        self.enabled = bool(display or recording)
+
+    def blend_polygon(self, frame, polygon, color, alpha):
+        """
+        在帧上原地绘制半透明多边形，只处理多边形的外接矩形区域
+        :param frame: 待绘制的帧图像（原地修改）
+        :param polygon: 多边形顶点坐标，形状为 (N, 2)
+        :param color: 填充颜色（BGR）
+        :param alpha: 叠加强度，与 cv2.addWeighted(frame, 1, mask, alpha, 0) 效果一致
+        """
+        height, width = frame.shape[:2]
+        x, y, w, h = cv2.boundingRect(polygon)
+        x1, y1 = max(x, 0), max(y, 0)
+        x2, y2 = min(x + w, width), min(y + h, height)
+        if x2 <= x1 or y2 <= y1:
+            return
+
+        roi = frame[y1:y2, x1:x2]
+        mask = np.zeros_like(roi)
+        cv2.fillPoly(mask, [polygon - np.array([x1, y1], dtype=polygon.dtype)], color)
+        cv2.addWeighted(roi, 1, mask, alpha, 0, dst=roi)
+
+    def render(self, frame, boxes, track_ids, track_classes, trails=(), zone=None,
+               warning_zone=None, warnings=(), lines=None):
+        """
+        在帧上原地绘制全部标注
+        :param frame: 待绘制的帧图像（原地修改）
+        :param boxes: 检测框数组，格式为 (x, y, w, h)，其中 (x, y) 为中心点（与 boxes.xywh 一致）
+        :param track_ids: 每个检测框对应的跟踪 ID
+        :param track_classes: 每个检测框对应的类别
+        :param trails: 各目标的轨迹点列表
+        :param zone: 统计区域多边形，为 None 时不绘制
+        :param warning_zone: 警告区域多边形，仅在存在警告时传入
+        :param warnings: 需要标注警告文字的 (track_id, center) 列表
+        :param lines: 虚拟计数线列表，每项为 {'name': 名称, 'points': [[x1, y1], [x2, y2]]}
+        :return: 绘制后的帧图像（与输入为同一对象）
+        """
+        if not self.enabled:
+            return frame
+
+        if self.draw_zones:
+            if zone is not None:
+                self.blend_polygon(frame, zone, (0, 255, 255), 0.1)
+            if warning_zone is not None:
+                self.blend_polygon(frame, warning_zone, (0, 0, 255), 0.2)
+
+        if self.draw_lines and lines:
+            segments = [np.asarray(line['points'], dtype=np.int32).reshape(-1, 1, 2) for line in lines]
+            cv2.polylines(frame, segments, isClosed=False, color=(255, 0, 255), thickness=self.line_width)
+            for line in lines:
+                x, y = np.asarray(line['points'], dtype=np.int32)[0]
+                cv2.putText(frame, line.get('name', ''), (int(x), max(int(y) - 5, 12)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 255), 1, cv2.LINE_AA)
+
+        if self.draw_trails and trails:
+            points = [np.asarray(track, dtype=np.int32).reshape(-1, 1, 2) for track in trails if len(track) > 1]
+            if points:
+                cv2.polylines(frame, points, isClosed=False, color=(0, 0, 255), thickness=self.line_width)
+
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if len(boxes) > 0:
+            track_classes = np.asarray(track_classes, dtype=np.int32)
+            # 中心点格式转换为四个角点，形状为 (N, 4, 1, 2)
+            x1 = boxes[:, 0] - boxes[:, 2] / 2
+            y1 = boxes[:, 1] - boxes[:, 3] / 2
+            x2 = x1 + boxes[:, 2]
+            y2 = y1 + boxes[:, 3]
+
+            if self.draw_boxes:
+                corners = np.stack([np.stack([x1, y1], 1), np.stack([x2, y1], 1),
+                                    np.stack([x2, y2], 1), np.stack([x1, y2], 1)], 1)
+                corners = corners.astype(np.int32).reshape(-1, 4, 1, 2)
+                for cls in np.unique(track_classes):
+                    color = CLASS_COLORS[int(cls) % len(CLASS_COLORS)]
+                    cv2.polylines(frame, list(corners[track_classes == cls]), isClosed=True,
+                                  color=color, thickness=self.line_width)
+
+            if self.draw_labels:
+                for left, top, track_id, cls in zip(x1.astype(int), y1.astype(int), track_ids, track_classes):
+                    name = self.class_names.get(int(cls), str(int(cls)))
+                    color = CLASS_COLORS[int(cls) % len(CLASS_COLORS)]
+                    cv2.putText(frame, f'id:{track_id} {name}', (int(left), max(int(top) - 5, 12)),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+
+        for track_id, center in warnings:
+            cv2.putText(frame, f'warn: ID {track_id}', (int(center[0]), int(center[1] - 10)),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+
+        return frame
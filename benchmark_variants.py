@@ -0,0 +1,382 @@
+"""
+模型变体的精度-延迟 Pareto 基准测试
+对 模型 × 推理尺寸 × 精度 × 推理后端 的全部组合：
+    1. 在验证集上评估 mAP50-95 / mAP50
+    2. 把示例视频的前 N 帧完整走一遍 track_frame + TrackingSession.track，测量单帧延迟、FPS 和内存峰值
+最后按 (mAP 越高越好, 单帧延迟越低越好) 标记 Pareto 前沿，用数据为每个路口选择模型。
+类别与数据集不同的模型（如 80 类的 COCO 预训练模型 yolov8n.pt）按类别名称映射到数据集的类别后评估，
+可以直接与在车辆数据集上训练的模型对比。
+每个变体在独立的子进程中测试，内存峰值互不影响，某个后端崩溃也不会中断整个测试。
+
+用法：
+    python benchmark_variants.py car_test3.mp4 --models yolov8n.pt best.pt --imgsz 320 480 640 \\
+        --precisions fp32 int8 --backends pytorch onnx openvino --output benchmark.csv
+"""
+
+import argparse
+import csv
+import importlib.util
+import itertools
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+# 默认的数据集配置
+DATA_PATH = os.path.join("coco_yolo_vehicles", "vehicles.yaml")
+# 导出模型的保存目录
+EXPORT_DIR = os.path.join("benchmarks", "exports")
+
+# 推理后端 → (ultralytics 导出格式, 需要的 Python 包)
+BACKENDS = {
+    'pytorch': (None, 'torch'),
+    'onnx': ('onnx', 'onnxruntime'),
+    'openvino': ('openvino', 'openvino'),
+    'tensorrt': ('engine', 'tensorrt'),
+}
+# 各后端支持的精度
+BACKEND_PRECISIONS = {
+    'pytorch': ('fp32', 'fp16'),
+    'onnx': ('fp32', 'fp16'),
+    'openvino': ('fp32', 'fp16', 'int8'),
+    'tensorrt': ('fp32', 'fp16', 'int8'),
+}
+
+
+def available_backends(requested):
+    """过滤出本机已安装的后端"""
+    return [name for name in requested if importlib.util.find_spec(BACKENDS[name][1]) is not None]
+
+
+def class_names(names):
+    """把 {索引: 名称} 或名称列表统一为按索引排列的名称列表"""
+    if isinstance(names, dict):
+        return [names[i] for i in sorted(names)]
+    return list(names)
+
+
+def dataset_names(data_path):
+    """读取数据集配置中的类别名称"""
+    import yaml
+
+    with open(data_path, encoding='utf-8') as f:
+        return class_names(yaml.safe_load(f)['names'])
+
+
+def class_mapping(model_path, data_path):
+    """
+    按类别名称把数据集的类别对应到模型的类别索引。
+    例如 80 类的 COCO 预训练模型中 bicycle / car / motorcycle / bus / truck 的索引为 1 / 2 / 3 / 5 / 7。
+    :return: (模型类别名称列表, [数据集第 i 类在模型中的索引])，模型缺少数据集中的某个类别时后者为 None
+    """
+    from ultralytics import YOLO
+
+    model_names = class_names(YOLO(model_path).names)
+    index = {name: i for i, name in enumerate(model_names)}
+    names = dataset_names(data_path)
+    if any(name not in index for name in names):
+        return model_names, None
+    return model_names, [index[name] for name in names]
+
+
+def remapped_val_data(data_path, model_names, class_map):
+    """
+    为类别索引与数据集不同的模型生成验证集配置：标注中的类别换成模型中对应类别的索引，类别表使用模型的类别表，
+    mAP 只在数据集包含的类别上计算（ultralytics 只对标注中出现的类别求平均）。
+    图片以硬链接引用，不支持硬链接时复制。生成结果按类别映射缓存，不同模型共用。
+    :return: 生成的数据集配置文件路径
+    """
+    import hashlib
+    import yaml
+    from ultralytics.data.utils import IMG_FORMATS, check_det_dataset, img2label_paths
+
+    digest = hashlib.sha1(json.dumps([model_names, class_map]).encode()).hexdigest()[:10]
+    root = os.path.abspath(os.path.join(os.path.dirname(EXPORT_DIR), f"val_{digest}"))
+    config_path = os.path.join(root, "data.yaml")
+    if os.path.exists(config_path):
+        return config_path
+
+    val = check_det_dataset(data_path)['val']
+    images = []
+    for source in (val if isinstance(val, list) else [val]):
+        if os.path.isdir(source):
+            images.extend(os.path.join(directory, name) for directory, _, files in os.walk(source)
+                          for name in sorted(files) if name.rsplit('.', 1)[-1].lower() in IMG_FORMATS)
+        else:
+            with open(source, encoding='utf-8') as f:
+                images.extend(line.strip() for line in f if line.strip())
+
+    image_dir = os.path.join(root, "images", "val")
+    label_dir = os.path.join(root, "labels", "val")
+    os.makedirs(image_dir, exist_ok=True)
+    os.makedirs(label_dir, exist_ok=True)
+    for number, (image, label) in enumerate(zip(images, img2label_paths(images))):
+        # 不同子目录中可能有同名图片，文件名前加序号
+        name = f"{number:06d}_{os.path.basename(image)}"
+        try:
+            os.link(image, os.path.join(image_dir, name))
+        except OSError:
+            shutil.copy2(image, os.path.join(image_dir, name))
+        lines = []
+        if os.path.exists(label):
+            with open(label, encoding='utf-8') as f:
+                for line in f:
+                    parts = line.split()
+                    if parts:
+                        lines.append(" ".join([str(class_map[int(parts[0])])] + parts[1:]))
+        with open(os.path.join(label_dir, os.path.splitext(name)[0] + ".txt"), 'w', encoding='utf-8') as f:
+            f.write("\n".join(lines))
+
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump({'path': root, 'train': "images/val", 'val': "images/val",
+                        'names': dict(enumerate(model_names))}, f, allow_unicode=True, sort_keys=False)
+    return config_path
+
+
+def build_variants(models, sizes, precisions, backends):
+    """生成所有可测试的变体，跳过后端不支持的精度组合"""
+    import torch
+
+    variants = []
+    for model, imgsz, precision, backend in itertools.product(models, sizes, precisions, backends):
+        if precision not in BACKEND_PRECISIONS[backend]:
+            continue
+        # PyTorch / ONNX 的 FP16 推理需要 GPU
+        if precision == 'fp16' and backend in ('pytorch', 'onnx') and not torch.cuda.is_available():
+            continue
+        variants.append({'model': model, 'imgsz': imgsz, 'precision': precision, 'backend': backend})
+    return variants
+
+
+def export_variant(variant, data_path):
+    """
+    导出变体对应的模型，返回可以直接加载的模型路径。
+    导出结果按 模型_尺寸_精度_后端 单独保存，不同尺寸的导出不会互相覆盖。
+    """
+    export_format = BACKENDS[variant['backend']][0]
+    if export_format is None:
+        return variant['model']
+
+    from ultralytics import YOLO
+
+    stem = os.path.splitext(os.path.basename(variant['model']))[0]
+    # OpenVINO 导出的是目录，ultralytics 根据 _openvino_model 后缀识别后端，必须保留
+    extension = {'onnx': '.onnx', 'engine': '.engine', 'openvino': '_model'}.get(export_format, '')
+    target = os.path.join(EXPORT_DIR,
+                          f"{stem}_{variant['imgsz']}_{variant['precision']}_{variant['backend']}{extension}")
+    if os.path.exists(target):
+        return target
+
+    exported = YOLO(variant['model']).export(
+        format=export_format, imgsz=variant['imgsz'],
+        half=variant['precision'] == 'fp16', int8=variant['precision'] == 'int8',
+        data=data_path if variant['precision'] == 'int8' else None)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    shutil.move(str(exported), target)
+    return target
+
+
+def run_variant(variant):
+    """
+    测试一个变体（在子进程中执行）
+    :param variant: 变体描述，另含 'path'（模型路径）、'video'、'frames'、'data'、'device'，
+                    以及 'class_map'（数据集第 i 类在模型中的索引）
+    :return: 测试结果字典
+    """
+    import cv2
+    import psutil
+    from ultralytics import YOLO
+    from annotation_renderer import AnnotationRenderer
+    from object_tracking import OBJ_LIST, track_frame
+    from tracking_session import TrackingSession
+
+    process = psutil.Process()
+    peak_rss = [process.memory_info().rss]
+    stop = threading.Event()
+
+    def sample_memory():
+        while not stop.wait(0.05):
+            peak_rss[0] = max(peak_rss[0], process.memory_info().rss)
+
+    # 默认在 CPU 上测试；TensorRT 和 FP16 只能在 GPU 上运行
+    device = 0 if variant['backend'] == 'tensorrt' or variant['precision'] == 'fp16' else variant['device']
+    result = {}
+
+    class_map = variant['class_map']
+    # 视频测试中检测的模型类别，以及模型类别 → 数据集类别的对照表
+    track_classes = [class_map[c] for c in OBJ_LIST]
+    to_dataset = np.full(max(class_map) + 1, -1, dtype=np.int64)
+    to_dataset[class_map] = np.arange(len(class_map))
+
+    # 验证集精度（类别索引不同的模型使用换算过标注的验证集，并只检测数据集中的类别）
+    metrics = YOLO(variant['path'], task='detect').val(
+        data=variant['val_data'], split='val', imgsz=variant['imgsz'], device=device,
+        half=variant['precision'] == 'fp16', plots=False, verbose=False,
+        classes=track_classes if variant['val_data'] != variant['data'] else None)
+    result['map50_95'] = float(metrics.box.map)
+    result['map50'] = float(metrics.box.map50)
+
+    # 先把视频帧读入内存，计时不包含解码
+    capture = cv2.VideoCapture(variant['video'])
+    frames = []
+    while len(frames) < variant['frames']:
+        success, frame = capture.read()
+        if not success:
+            break
+        frames.append(frame)
+    capture.release()
+    if not frames:
+        raise RuntimeError(f"无法读取视频: {variant['video']}")
+
+    model = YOLO(variant['path'], task='detect')
+    session = TrackingSession(model=model, renderer=AnnotationRenderer(enabled=False), stats_interval=0)
+    # 预热：前几帧包含模型初始化，不计时
+    for frame in frames[:3]:
+        model.predict(frame, imgsz=variant['imgsz'], device=device, classes=track_classes, verbose=False)
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    times = []
+    try:
+        for frame in frames:
+            start = time.perf_counter()
+            _, detections = track_frame(frame, model, imgsz=variant['imgsz'], classes=track_classes)
+            boxes, track_ids, classes, scores = detections
+            # 区域和警报逻辑按数据集的类别索引判断
+            detections = (boxes, track_ids, to_dataset[classes], scores)
+            session.track(frame, detections)
+            times.append(time.perf_counter() - start)
+    finally:
+        stop.set()
+        sampler.join()
+
+    times = np.array(times) * 1000
+    result.update({
+        'latency_ms': float(np.median(times)),
+        'p90_ms': float(np.percentile(times, 90)),
+        'fps': float(1000 / np.mean(times)),
+        'peak_rss_mb': peak_rss[0] / 1024 ** 2,
+        'frames': len(times),
+    })
+    return result
+
+
+def launch_variant(variant, timeout):
+    """在子进程中测试变体，失败时返回带 error 的结果"""
+    command = [sys.executable, os.path.abspath(__file__), "--variant", json.dumps(variant)]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'error': "超时"}
+    for line in reversed(output.stdout.splitlines()):
+        if line.startswith("VARIANT_RESULT "):
+            return json.loads(line[len("VARIANT_RESULT "):])
+    tail = (output.stderr or output.stdout).strip().splitlines()[-1:] or ["未知错误"]
+    return {'error': tail[0][:200]}
+
+
+def mark_pareto(results):
+    """标记 Pareto 前沿：不存在 mAP 不低且延迟不高（至少一项严格更优）的其他变体"""
+    valid = [r for r in results if 'error' not in r]
+    for r in results:
+        r['pareto'] = False
+    for r in valid:
+        r['pareto'] = not any(
+            other is not r
+            and other['map50_95'] >= r['map50_95'] and other['latency_ms'] <= r['latency_ms']
+            and (other['map50_95'] > r['map50_95'] or other['latency_ms'] < r['latency_ms'])
+            for other in valid)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模型变体的精度-延迟 Pareto 基准测试")
+    parser.add_argument("video", help="示例视频（通过跟踪会话测量端到端延迟）")
+    parser.add_argument("--models", nargs="+", default=["yolov8n.pt", "best.pt"],
+                        help="模型权重（类别不同时按类别名称映射到数据集的类别）")
+    parser.add_argument("--imgsz", nargs="+", type=int, default=[320, 480, 640], help="推理尺寸")
+    parser.add_argument("--precisions", nargs="+", default=["fp32", "int8"], choices=["fp32", "fp16", "int8"],
+                        help="推理精度")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS),
+                        help="推理后端（未安装的后端自动跳过）")
+    parser.add_argument("--data", default=DATA_PATH, help="数据集配置（验证集用于 mAP 和 INT8 校准）")
+    parser.add_argument("--frames", type=int, default=300, help="视频测试的帧数")
+    parser.add_argument("--device", default="cpu", help="测试设备（如 cpu 或 0）")
+    parser.add_argument("--timeout", type=int, default=1800, help="单个变体的超时时间（秒）")
+    parser.add_argument("--output", default="benchmark.csv", help="结果文件（CSV）")
+    parser.add_argument("--variant", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant is not None:
+        # 子进程：测试一个变体并输出结果
+        print("VARIANT_RESULT " + json.dumps(run_variant(json.loads(args.variant))))
+        return
+
+    backends = available_backends(args.backends)
+    skipped = sorted(set(args.backends) - set(backends))
+    if skipped:
+        print(f"未安装的后端已跳过: {', '.join(skipped)}")
+    models = []
+    class_maps = {}
+    val_data = {}
+    for model in args.models:
+        if not (os.path.exists(model) or model.startswith("yolov8")):
+            print(f"模型不存在，已跳过: {model}")
+            continue
+        names, class_map = class_mapping(model, args.data)
+        if class_map is None:
+            print(f"模型缺少数据集中的类别，已跳过: {model}")
+            continue
+        models.append(model)
+        class_maps[model] = class_map
+        if class_map == list(range(len(class_map))) and len(names) == len(class_map):
+            val_data[model] = args.data
+        else:
+            val_data[model] = remapped_val_data(args.data, names, class_map)
+            print(f"{model}: 类别按名称映射到数据集（{len(names)} 类 → {len(class_map)} 类）")
+    variants = build_variants(models, args.imgsz, args.precisions, backends)
+    print(f"共 {len(variants)} 个变体")
+
+    results = []
+    for variant in variants:
+        name = f"{variant['model']} {variant['imgsz']} {variant['precision']} {variant['backend']}"
+        print(f"测试 {name}")
+        try:
+            path = export_variant(variant, args.data)
+        except Exception as e:
+            result = {'error': f"导出失败: {e}"}
+        else:
+            result = launch_variant(dict(variant, path=path, video=args.video, frames=args.frames,
+                                         data=args.data, device=args.device, class_map=class_maps[variant['model']],
+                                         val_data=val_data[variant['model']]), args.timeout)
+        result = dict(variant, **result)
+        results.append(result)
+        if 'error' in result:
+            print(f"  失败: {result['error']}")
+        else:
+            print(f"  mAP50-95 {result['map50_95']:.4f}，单帧 {result['latency_ms']:.1f}ms，"
+                  f"{result['fps']:.1f} FPS，内存峰值 {result['peak_rss_mb']:.0f}MB")
+
+    mark_pareto(results)
+    fields = ['model', 'imgsz', 'precision', 'backend', 'map50_95', 'map50', 'latency_ms', 'p90_ms', 'fps',
+              'peak_rss_mb', 'frames', 'pareto', 'error']
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(sorted(results, key=lambda r: (r.get('latency_ms', float('inf')))))
+
+    print("\nPareto 前沿（按延迟排序）:")
+    for r in sorted((r for r in results if r['pareto']), key=lambda r: r['latency_ms']):
+        print(f"  {r['model']} imgsz={r['imgsz']} {r['precision']} {r['backend']}: "
+              f"mAP50-95 {r['map50_95']:.4f}, {r['latency_ms']:.1f}ms, {r['fps']:.1f} FPS, "
+              f"{r['peak_rss_mb']:.0f}MB")
+    print(f"结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
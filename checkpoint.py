@@ -0,0 +1,122 @@
+"""
+长时间离线任务的断点续处理
+处理数小时的视频文件时定期把完整的处理状态（帧位置、跟踪器、区域/警报状态、计数、速度）保存到一个
+压缩的 .npz 文件中。程序崩溃或手动停止后，可以从断点所在的下一帧继续处理，结果与不中断时一致。
+
+文件格式：
+    各组件 get_state() 返回的 numpy 数组按 "组件/字段" 保存为 npz 中的数组，
+    标量和元数据保存为 JSON（"__meta__" 字段），读取时不需要 pickle。
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+# 断点文件目录
+CHECKPOINT_DIR = "checkpoints"
+# 断点文件格式版本，格式不兼容时递增
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(video_path):
+    """返回视频文件对应的断点文件路径"""
+    return os.path.join(CHECKPOINT_DIR, os.path.basename(video_path) + ".ckpt.npz")
+
+
+def video_signature(video_path):
+    """返回 (文件大小, 修改时间)，用于确认断点对应的视频没有变化（不需要对数 GB 的视频做哈希）"""
+    stat = os.stat(video_path)
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def config_matches(saved, current):
+    """比较断点中保存的处理参数与当前参数（按 JSON 序列化后的值比较，元组和列表视为相同）"""
+    return saved == json.loads(json.dumps(current, ensure_ascii=False))
+
+
+def collect_state(**components):
+    """
+    收集各组件的状态
+    :param components: 名称=组件，组件需要提供 get_state()，为 None 的组件跳过
+    :return: {名称: 状态字典}
+    """
+    return {name: component.get_state() for name, component in components.items() if component is not None}
+
+
+def restore_state(states, **components):
+    """
+    把状态恢复到各组件
+    :param states: load_checkpoint 返回的 {名称: 状态字典}
+    :param components: 名称=组件，组件需要提供 set_state(state)，为 None 的组件跳过
+    :return: 断点中没有保存状态的组件名称列表
+    """
+    missing = []
+    for name, component in components.items():
+        if component is None:
+            continue
+        if name in states:
+            component.set_state(states[name])
+        else:
+            missing.append(name)
+    return missing
+
+
+def save_checkpoint(path, states, meta):
+    """
+    保存断点（先写入临时文件再替换，保存过程中崩溃不会损坏上一个断点）
+    :param path: 断点文件路径
+    :param states: {组件名称: 状态字典}，状态中的值为 numpy 数组或可 JSON 序列化的标量
+    :param meta: 元数据（帧位置、视频和参数签名等）
+    :return: 文件大小（字节）
+    """
+    arrays = {}
+    values = {}
+    for name, state in states.items():
+        for key, value in state.items():
+            field = f"{name}/{key}"
+            if isinstance(value, np.ndarray):
+                arrays[field] = value
+            else:
+                values[field] = value
+    header = {'version': CHECKPOINT_VERSION, 'saved_at': time.time(), 'meta': meta, 'values': values}
+    arrays['__meta__'] = np.frombuffer(json.dumps(header, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(temp_path, path)
+    return os.path.getsize(path)
+
+
+def load_checkpoint(path):
+    """
+    读取断点
+    :param path: 断点文件路径
+    :return: (meta, states)，文件不存在时返回 None
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        header = json.loads(bytes(data['__meta__']).decode('utf-8'))
+        if header.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"断点文件版本不兼容: {header.get('version')}")
+        states = {}
+        for field in data.files:
+            if field != '__meta__':
+                name, key = field.split('/', 1)
+                states.setdefault(name, {})[key] = data[field]
+    for field, value in header['values'].items():
+        name, key = field.split('/', 1)
+        states.setdefault(name, {})[key] = value
+    return header['meta'], states
+
+
+def remove_checkpoint(path):
+    """删除断点文件（视频完整处理完成后不再需要）"""
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,307 @@
+"""
+长视频并行分块处理
+把一个长视频按时间切分为若干相互重叠的分块，每个分块在独立进程中使用各自的模型和跟踪器处理，
+最后利用重叠区间把各分块的跟踪 ID 拼接为全局 ID，并合并计数和警告事件，避免重复计数。
+
+用法：
+    python chunked_processing.py car_test3.mp4 --workers 8 --overlap 2
+"""
+
+import argparse
+import os
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+
+def plan_chunks(frame_count, num_chunks, overlap_frames):
+    """
+    划分时间分块。
+    :param frame_count: 视频总帧数
+    :param num_chunks: 分块数量
+    :param overlap_frames: 相邻分块的重叠帧数
+    :return: [(warmup_start, start, end), ...]，每个分块负责 [start, end) 区间内的事件，
+             [warmup_start, start) 为与上一分块重叠的预热区间，用于跟踪器预热和 ID 拼接
+    """
+    num_chunks = max(1, min(num_chunks, frame_count // max(1, 2 * overlap_frames) or 1))
+    bounds = np.linspace(0, frame_count, num_chunks + 1).astype(int)
+    chunks = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        chunks.append((max(0, int(start) - overlap_frames), int(start), int(end)))
+    return chunks
+
+
+def process_chunk(video_path, model_path, chunk_index, chunk, fps, overlap_frames, warning_folder, threads=None,
+                  dwell_thresholds=None, alert_cooldown=10.0):
+    """
+    在子进程中处理单个分块。
+    :param video_path: 视频文件路径
+    :param model_path: 模型权重路径
+    :param chunk_index: 分块序号
+    :param chunk: (warmup_start, start, end) 区间
+    :param fps: 视频帧率
+    :param overlap_frames: 重叠帧数
+    :param warning_folder: 警告帧保存目录，本分块写入其下的 chunk_<序号> 子目录
+    :param threads: 本进程使用的 torch 线程数
+    :param dwell_thresholds: 各类别在警告区域的停留阈值（秒），为 None 时使用 DWELL_THRESHOLDS
+    :param alert_cooldown: 警报解除后的冷却时间（秒）
+    :return: 分块结果字典，包含本地 ID 事件和首尾重叠区间的检测框
+    """
+    import torch
+    from ultralytics import YOLO
+    from alert_state import AlertStateMachine
+    from annotation_renderer import AnnotationRenderer
+    from dwell_engine import DWELL_THRESHOLDS, DwellTimeEngine
+    from frame_reader import PrefetchFrameReader
+    from object_tracking import OBJ_LIST, TRACK_CONF, extract_detections, warning_frame_name, write_warning_frame
+    from tracking_session import TrackingSession
+
+    if threads:
+        torch.set_num_threads(threads)
+
+    warmup_start, start, end = chunk
+    chunk_folder = os.path.join(warning_folder, f"chunk_{chunk_index}")
+    os.makedirs(chunk_folder, exist_ok=True)
+
+    model = YOLO(model_path)
+    reader = PrefetchFrameReader(video_path, start_time=warmup_start / fps, end_time=end / fps)
+
+    # 分块处理不需要任何绘制
+    session = TrackingSession(model=model, renderer=AnnotationRenderer(enabled=False), stats_interval=0)
+    # 与界面相同的停留计时和警报状态机，按视频时间判断警告，结果与逐帧处理一致
+    thresholds = DWELL_THRESHOLDS if dwell_thresholds is None else dwell_thresholds
+    frame_size = (int(reader.properties[cv2.CAP_PROP_FRAME_WIDTH]),
+                  int(reader.properties[cv2.CAP_PROP_FRAME_HEIGHT]))
+    session.dwell_engine = DwellTimeEngine({'warning_zone': session.polygon_points1}, frame_size, thresholds, fps=fps)
+    session.alert_machine = AlertStateMachine(thresholds, cooldown=alert_cooldown)
+
+    events = []  # (帧序号, 事件类型, 本地 ID, 类别, 警告详情)，警告详情只有 'warn' 事件才有
+    head = {}  # 预热区间每帧的 (ID 数组, 检测框数组)
+    tail = {}  # 末尾重叠区间每帧的 (ID 数组, 检测框数组)
+    seen_ids = set()  # 本分块负责区间内出现过的本地 ID
+    appeared = set()  # 本分块中出现过的本地 ID（包括预热区间）
+    # 第一次出现时已经在警告区域内、之后一直没有离开的本地 ID。这些目标的停留可能在本分块开始之前就已开始，
+    # 它们的警报可能与上一分块的警报属于同一次违规
+    carried = set()
+    frames = 0
+
+    while True:
+        success, frame = reader.read()
+        if not success:
+            break
+        index = reader.frame_index
+
+        results = model.track(frame, persist=True, classes=OBJ_LIST, conf=TRACK_CONF, verbose=False)
+        detections = extract_detections(results[0])
+        if len(detections[1]) > 0:
+            if index < start:
+                head[index] = (detections[1].copy(), detections[0].copy())
+            elif index >= end - overlap_frames:
+                tail[index] = (detections[1].copy(), detections[0].copy())
+
+        _, frame_events = session.track(frame, detections, reader.timestamp)
+        # 每帧最后一个事件是各目标的区域状态
+        _, ids, _, _, _, in_warning_zone, _ = frame_events[-1]
+        for track_id, inside in zip(ids.tolist(), in_warning_zone.tolist()):
+            if track_id not in appeared:
+                appeared.add(track_id)
+                if inside:
+                    carried.add(track_id)
+            elif not inside:
+                carried.discard(track_id)
+        # 预热区间的事件由上一分块负责，这里只用于建立跟踪状态
+        if index < start:
+            continue
+        frames += 1
+        seen_ids.update(detections[1].tolist())
+        for event in frame_events:
+            if event[0] in ('enter', 'exit'):
+                events.append((index, event[0], event[1], event[2], None))
+            elif event[0] == 'violation':
+                # 每次警报事件（包括离开后再次违规的重复警报）都保存警告帧并输出一个 'warn' 事件
+                _, track_id, track_class, _, warning_frame, repeat = event
+                write_warning_frame(chunk_folder, track_id, reader.timestamp, repeat, warning_frame)
+                events.append((index, 'warn', track_id, track_class,
+                               {'file': warning_frame_name(track_id, reader.timestamp, repeat),
+                                'timestamp': reader.timestamp, 'carried': track_id in carried}))
+
+    reader.release()
+    return {
+        'chunk_index': chunk_index,
+        'chunk': chunk,
+        'events': events,
+        'head': head,
+        'tail': tail,
+        'seen_ids': seen_ids,
+        'frames': frames,
+        'warning_folder': chunk_folder,
+    }
+
+
+def match_track_ids(prev_tail, next_head, iou_threshold=0.5):
+    """
+    利用重叠区间把下一分块的本地 ID 匹配到上一分块的本地 ID。
+    每个重叠帧中按 IoU 最大原则投票，最后按票数从高到低贪心地建立一对一映射。
+    :param prev_tail: 上一分块末尾重叠区间的 {帧序号: (ID 数组, 检测框数组)}
+    :param next_head: 下一分块预热区间的 {帧序号: (ID 数组, 检测框数组)}
+    :param iou_threshold: 认为是同一目标的最小 IoU
+    :return: {下一分块本地 ID: 上一分块本地 ID}
+    """
+    from object_tracking import iou_matrix, xywh_to_xyxy
+
+    votes = defaultdict(int)
+    for index in set(prev_tail) & set(next_head):
+        prev_ids, prev_boxes = prev_tail[index]
+        next_ids, next_boxes = next_head[index]
+        if len(prev_ids) == 0 or len(next_ids) == 0:
+            continue
+        ious = iou_matrix(xywh_to_xyxy(prev_boxes), xywh_to_xyxy(next_boxes))
+        best = ious.argmax(axis=0)
+        for j, i in enumerate(best):
+            if ious[i, j] >= iou_threshold:
+                votes[(int(prev_ids[i]), int(next_ids[j]))] += 1
+
+    mapping = {}
+    used_prev = set()
+    for (prev_id, next_id), _ in sorted(votes.items(), key=lambda item: -item[1]):
+        if next_id in mapping or prev_id in used_prev:
+            continue
+        mapping[next_id] = prev_id
+        used_prev.add(prev_id)
+    return mapping
+
+
+def merge_chunk_results(chunk_results, warning_folder):
+    """
+    合并各分块的结果：拼接全局 ID，并按全局 ID 重放进入/离开/警告事件。
+    同一全局 ID 已在区域内时的重复进入会被忽略，因此跨越分块边界的目标不会被重复计数；
+    不在区域内的离开（通常是跨分块没有拼接上的 ID）不计数，只统计其数量。
+    警报状态机的每次警报都保留，只有分块开始时已经在警告区域内的目标、且该全局 ID 已经报警过时，
+    才视为上一分块同一次违规的重复警报而忽略。
+    :param chunk_results: 按分块顺序排列的 process_chunk 返回值列表
+    :param warning_folder: 最终警告帧保存目录
+    :return: 合并后的统计结果字典
+    """
+    from object_tracking import warning_frame_name
+
+    chunk_results = sorted(chunk_results, key=lambda result: result['chunk_index'])
+    next_global_id = 1
+    global_maps = []
+    for k, result in enumerate(chunk_results):
+        local_ids = set(result['seen_ids']) | {event[2] for event in result['events']}
+        for ids, _ in list(result['head'].values()) + list(result['tail'].values()):
+            local_ids.update(int(track_id) for track_id in ids)
+
+        mapping = {}
+        if k > 0:
+            matched = match_track_ids(chunk_results[k - 1]['tail'], result['head'])
+            prev_map = global_maps[k - 1]
+            mapping = {local: prev_map[prev] for local, prev in matched.items() if prev in prev_map}
+        for local_id in sorted(local_ids):
+            if local_id not in mapping:
+                mapping[local_id] = next_global_id
+                next_global_id += 1
+        global_maps.append(mapping)
+
+    # 按帧序号重放所有事件
+    all_events = []
+    for result, mapping in zip(chunk_results, global_maps):
+        for index, kind, local_id, track_class, detail in result['events']:
+            all_events.append((index, kind, mapping[local_id], track_class, detail, result))
+    all_events.sort(key=lambda event: event[0])
+
+    inside = set()
+    warned = set()
+    count_passed = 0
+    count_exited = 0
+    unmatched_exits = 0
+    warnings = []
+    os.makedirs(warning_folder, exist_ok=True)
+    for index, kind, global_id, track_class, detail, result in all_events:
+        if kind == 'enter' and global_id not in inside:
+            inside.add(global_id)
+            count_passed += 1
+        elif kind == 'exit' and global_id in inside:
+            inside.remove(global_id)
+            count_exited += 1
+        elif kind == 'exit':
+            unmatched_exits += 1
+        elif kind == 'warn' and not (detail['carried'] and global_id in warned):
+            target = warning_frame_name(global_id, detail['timestamp'], global_id in warned)
+            warned.add(global_id)
+            warnings.append((index, global_id, track_class))
+            source = os.path.join(result['warning_folder'], detail['file'])
+            if os.path.exists(source):
+                shutil.move(source, os.path.join(warning_folder, target))
+
+    for result in chunk_results:
+        shutil.rmtree(result['warning_folder'], ignore_errors=True)
+
+    return {
+        'count_passed': count_passed,
+        'count_exited': count_exited,
+        'unmatched_exits': unmatched_exits,
+        'total_vehicles': next_global_id - 1,
+        'warnings': warnings,
+        'frames': sum(result['frames'] for result in chunk_results),
+    }
+
+
+def process_video_parallel(video_path, model_path='best.pt', workers=None, overlap_seconds=2.0,
+                           warning_folder='warning_frames', dwell_thresholds=None, alert_cooldown=10.0):
+    """
+    并行处理一个长视频。
+    :param video_path: 视频文件路径
+    :param model_path: 模型权重路径
+    :param workers: 进程数，默认为 CPU 核心数
+    :param overlap_seconds: 相邻分块的重叠时长（秒）
+    :param warning_folder: 警告帧保存目录
+    :param dwell_thresholds: 各类别在警告区域的停留阈值（秒），为 None 时使用 DWELL_THRESHOLDS
+    :param alert_cooldown: 警报解除后的冷却时间（秒）
+    :return: 合并后的统计结果字典
+    """
+    capture = cv2.VideoCapture(video_path)
+    if not capture.isOpened():
+        raise IOError(f"视频打开失败: {video_path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+    capture.release()
+
+    workers = workers or os.cpu_count() or 1
+    overlap_frames = max(1, int(round(overlap_seconds * fps)))
+    chunks = plan_chunks(frame_count, workers, overlap_frames)
+    # 每个进程分到的 torch 线程数，避免进程之间争抢 CPU
+    threads = max(1, (os.cpu_count() or 1) // len(chunks))
+
+    with ProcessPoolExecutor(max_workers=len(chunks)) as executor:
+        futures = [executor.submit(process_chunk, video_path, model_path, k, chunk, fps, overlap_frames,
+                                   warning_folder, threads, dwell_thresholds, alert_cooldown)
+                   for k, chunk in enumerate(chunks)]
+        chunk_results = [future.result() for future in futures]
+
+    return merge_chunk_results(chunk_results, warning_folder)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="长视频并行分块处理")
+    parser.add_argument("video", help="视频文件路径")
+    parser.add_argument("--model", default="best.pt", help="模型权重路径")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核心数")
+    parser.add_argument("--overlap", type=float, default=2.0, help="分块重叠时长（秒）")
+    parser.add_argument("--warning-folder", default="warning_frames", help="警告帧保存目录")
+    args = parser.parse_args()
+
+    start_time = time.time()
+    summary = process_video_parallel(args.video, args.model, args.workers, args.overlap, args.warning_folder)
+    elapsed = time.time() - start_time
+    print(f"处理完成: {summary['frames']}帧, 用时{elapsed:.1f}s")
+    print(f"进入区域: {summary['count_passed']}, 离开区域: {summary['count_exited']}, "
+          f"累计车辆: {summary['total_vehicles']}, 警告: {len(summary['warnings'])}")
+    if summary['unmatched_exits']:
+        print(f"未能跨分块拼接 ID 的离开事件: {summary['unmatched_exits']}（未计入离开区域）")
+    for index, global_id, track_class in summary['warnings']:
+        print(f"- 帧 {index}: ID {global_id} ({track_class})")
@@ -1,47 +1,259 @@
+"""
+数据集完整性检查
+并行检查 images/ 下的图片和 labels/ 下对应的 YOLO 标签文件：
+    - 图片：只打开一次，强制解码全部数据，能发现截断、损坏和解压炸弹
+    - 标签：每行为 "类别 cx cy w h"（或分割格式 "类别 x1 y1 x2 y2 ..."），类别在 [0, nc) 内，坐标在 [0, 1] 内
+检查结果按 (路径, 修改时间, 文件大小) 缓存，再次运行时只检查有变化的文件。
+默认只输出报告，加 --delete 才会删除有问题的图片及其标签。
+
+用法：
+    python Check_image_files.py E:/coco/coco_yolo_vehicles --data vehicles.yaml
+    python Check_image_files.py E:/coco/coco_yolo_vehicles --data vehicles.yaml --delete
+"""
+
+import argparse
+import csv
+import json
 import os
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
 from PIL import Image
 from tqdm import tqdm
 
+# 需要检查的图片格式
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+# 检查结果缓存文件名（保存在数据集根目录下）
+CACHE_NAME = ".integrity_cache.json"
+# 坐标越界容差
+COORD_TOLERANCE = 1e-3
+
+
+def label_path_for(img_path):
+    """根据图片路径得到对应的标签路径：最后一级 images 目录替换为 labels，扩展名替换为 .txt"""
+    parts = img_path.split(os.sep)
+    for i in range(len(parts) - 2, -1, -1):
+        if parts[i] == 'images':
+            parts[i] = 'labels'
+            break
+    return os.path.splitext(os.sep.join(parts))[0] + '.txt'
+
+
+def file_signature(path):
+    """文件签名 [修改时间, 文件大小]，文件不存在时为 None"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def check_image(img_path):
+    """
+    检查图片能否完整解码（只打开一次）
+    :return: 错误信息，图片正常时返回 None
+    """
+    try:
+        with Image.open(img_path) as img:
+            img.load()  # 强制解码全部数据，截断或损坏的文件会在这里报错
+            if img.width == 0 or img.height == 0:
+                return "图片尺寸为 0"
+    except (IOError, OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        return f"图片损坏: {e}"
+    return None
+
+
+def check_label(label_path, nc):
+    """
+    检查 YOLO 标签文件
+    :param label_path: 标签文件路径
+    :param nc: 类别数量，为 None 时不检查类别范围
+    :return: 错误信息，标签正常时返回 None
+    """
+    try:
+        with open(label_path, 'r', encoding='utf-8') as f:
+            lines = [line.split() for line in f if line.strip()]
+    except (IOError, UnicodeDecodeError) as e:
+        return f"标签无法读取: {e}"
+
+    for row, values in enumerate(lines, 1):
+        if len(values) < 5 or (len(values) > 5 and len(values) % 2 == 0):
+            return f"第 {row} 行字段数错误: {len(values)}"
+        try:
+            cls = float(values[0])
+            coords = [float(v) for v in values[1:]]
+        except ValueError:
+            return f"第 {row} 行包含非数字内容"
+        if not cls.is_integer() or cls < 0 or (nc is not None and cls >= nc):
+            return f"第 {row} 行类别无效: {values[0]}"
+        if any(v < -COORD_TOLERANCE or v > 1 + COORD_TOLERANCE for v in coords):
+            return f"第 {row} 行坐标超出 [0, 1]"
+        if len(values) == 5 and (coords[2] <= 0 or coords[3] <= 0):
+            return f"第 {row} 行宽高不为正"
+    return None
+
+
+def check_pair(task):
+    """
+    检查一张图片及其标签（在进程池中运行）
+    :param task: (相对路径, 图片路径, 标签路径, 类别数量)
+    :return: (相对路径, 状态, 信息)，状态为 ok / no_label / bad_image / bad_label
+    """
+    rel_path, img_path, label_path, nc = task
+    error = check_image(img_path)
+    if error:
+        return rel_path, 'bad_image', error
+    if not os.path.exists(label_path):
+        # 没有标签的图片在 YOLO 中视为背景图
+        return rel_path, 'no_label', ''
+    error = check_label(label_path, nc)
+    if error:
+        return rel_path, 'bad_label', error
+    return rel_path, 'ok', ''
+
+
+def load_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (IOError, ValueError) as e:
+        print(f"缓存文件无效，将重新检查全部文件: {e}")
+        return {}
+
 
-def find_and_remove_corrupt_images(data_dir):
-    corrupt_files = []
+def save_cache(cache_path, cache):
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, cache_path)
 
+
+def scan(data_dir, nc=None, workers=None, use_cache=True):
+    """
+    检查数据集中的全部图片和标签
+    :param data_dir: 数据集根目录（包含 images 和 labels 目录）
+    :param nc: 类别数量
+    :param workers: 进程数，None 表示使用全部 CPU
+    :param use_cache: 是否使用并更新检查结果缓存
+    :return: {相对路径: {'image': 图片路径, 'label': 标签路径, 'status': 状态, 'message': 信息}}
+    """
+    cache_path = os.path.join(data_dir, CACHE_NAME)
+    cache = load_cache(cache_path) if use_cache else {}
+    # 类别数量变化后标签的检查结果不再可信
+    if cache.get('nc') != nc:
+        cache = {}
+    entries = cache.get('files', {})
+
+    results = {}
+    tasks = []
     for root, _, files in os.walk(os.path.join(data_dir, 'images')):
-        for file in tqdm(files, desc="Checking images"):
-            if file.lower().endswith(('.jpg', '.png', '.jpeg')):
-                img_path = os.path.join(root, file)
-                try:
-                    # 验证图片完整性
-                    with Image.open(img_path) as img:
-                        img.verify()
-
-                    # 尝试读取图片数据
-                    with Image.open(img_path) as img:
-                        img.load()  # 强制加载所有数据
-                except (IOError, OSError, Image.DecompressionBombError) as e:
-                    corrupt_files.append(img_path)
-
-    # 删除损坏文件及其对应标签
+        for file in files:
+            if not file.lower().endswith(IMAGE_EXTS):
+                continue
+            img_path = os.path.join(root, file)
+            label_path = label_path_for(img_path)
+            rel_path = os.path.relpath(img_path, data_dir)
+            signature = [file_signature(img_path), file_signature(label_path)]
+            cached = entries.get(rel_path)
+            if cached is not None and cached['signature'] == signature:
+                results[rel_path] = dict(cached, image=img_path, label=label_path)
+            else:
+                results[rel_path] = {'image': img_path, 'label': label_path, 'signature': signature}
+                tasks.append((rel_path, img_path, label_path, nc))
+
+    print(f"共 {len(results)} 张图片，其中 {len(results) - len(tasks)} 张未变化（使用缓存），"
+          f"{len(tasks)} 张需要检查")
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for rel_path, status, message in tqdm(executor.map(check_pair, tasks, chunksize=64),
+                                                  total=len(tasks), desc="Checking images"):
+                results[rel_path].update(status=status, message=message)
+
+    if use_cache:
+        save_cache(cache_path, {
+            'nc': nc,
+            'files': {rel_path: {'signature': r['signature'], 'status': r['status'], 'message': r['message']}
+                      for rel_path, r in results.items()},
+        })
+    return results
+
+
+def remove_files(data_dir, problems):
+    """
+    删除有问题的图片及其标签，并从缓存中移除对应记录
+    :return: 删除的 (图片路径, 标签路径或 None) 列表
+    """
     removed = []
-    for img_path in corrupt_files:
-        # 删除图片文件
-        os.remove(img_path)
-
-        # 查找并删除对应标签
-        label_path = img_path.replace('images', 'labels').replace('.jpg', '.txt').replace('.png', '.txt').replace(
-            '.jpeg', '.txt')
-        if os.path.exists(label_path):
-            os.remove(label_path)
-            removed.append((img_path, label_path))
+    for rel_path, result in problems.items():
+        os.remove(result['image'])
+        if os.path.exists(result['label']):
+            os.remove(result['label'])
+            removed.append((result['image'], result['label']))
         else:
-            removed.append((img_path, None))
+            removed.append((result['image'], None))
 
+    cache_path = os.path.join(data_dir, CACHE_NAME)
+    cache = load_cache(cache_path)
+    if cache:
+        for rel_path in problems:
+            cache['files'].pop(rel_path, None)
+        save_cache(cache_path, cache)
     return removed
 
 
-# 使用示例
-corrupt_files = find_and_remove_corrupt_images("E:/coco/coco_yolo_vehicles")
-print(f"\nFound and removed {len(corrupt_files)} corrupt files:")
-for img, lbl in corrupt_files:
-    print(f"- Image: {img}")
-    if lbl: print(f"  Label: {lbl}")
\ No newline at end of file
+def write_report(path, problems):
+    """把有问题的文件写入 CSV 报告"""
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['image', 'label', 'status', 'message'])
+        for result in problems.values():
+            writer.writerow([result['image'], result['label'], result['status'], result['message']])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行、增量的数据集完整性检查")
+    parser.add_argument("data_dir", help="数据集根目录（包含 images 和 labels 目录）")
+    parser.add_argument("--data", default=None, help="数据集配置文件（读取类别数量 nc）")
+    parser.add_argument("--nc", type=int, default=None, help="类别数量，优先于 --data")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认使用全部 CPU")
+    parser.add_argument("--no-cache", action="store_true", help="忽略缓存，重新检查全部文件")
+    parser.add_argument("--report", default=None, help="把有问题的文件写入 CSV 报告")
+    parser.add_argument("--delete", action="store_true", help="删除有问题的图片及其标签（默认只输出报告）")
+    args = parser.parse_args()
+
+    nc = args.nc
+    if nc is None and args.data:
+        with open(args.data, 'r', encoding='utf-8') as f:
+            nc = yaml.safe_load(f).get('nc')
+
+    results = scan(args.data_dir, nc=nc, workers=args.workers, use_cache=not args.no_cache)
+    problems = {rel_path: r for rel_path, r in results.items() if r['status'] in ('bad_image', 'bad_label')}
+    no_label = sum(1 for r in results.values() if r['status'] == 'no_label')
+
+    print(f"\n检查完成: 损坏图片 {sum(1 for r in problems.values() if r['status'] == 'bad_image')} 张, "
+          f"无效标签 {sum(1 for r in problems.values() if r['status'] == 'bad_label')} 个, "
+          f"无标签（背景图） {no_label} 张")
+    for result in problems.values():
+        print(f"- [{result['status']}] {result['image']}: {result['message']}")
+
+    if args.report:
+        write_report(args.report, problems)
+        print(f"报告已保存到: {args.report}")
+
+    if not problems:
+        return
+    if not args.delete:
+        print(f"\n预览模式：以上 {len(problems)} 个文件未被删除，确认后加 --delete 重新运行")
+        return
+
+    removed = remove_files(args.data_dir, problems)
+    print(f"\nFound and removed {len(removed)} corrupt files:")
+    for img, lbl in removed:
+        print(f"- Image: {img}")
+        if lbl: print(f"  Label: {lbl}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+训练集近重复图片去重
+COCO 派生的车辆数据集中有大量几乎相同的帧，只会拉长每轮训练时间而不增加有效信息。
+流程：
+    1. 在进程池中并行计算每张训练图片的感知哈希（pHash，64 位），结果按 (路径, 修改时间, 文件大小) 缓存
+    2. 按标注目标数从多到少处理图片：已保留图片的哈希保存在 BK 树中，按汉明距离做范围查询，避免两两比较
+    3. 与某张已保留图片近重复的图片归入该组并移除，否则保留（代表点聚类，每组保留标注目标最多的那张）
+    4. 写出去重后的训练列表和对应的数据集配置文件，验证集保持不变，保证 mAP 可以直接对比
+
+用法：
+    python dedup_images.py --data vehicles.yaml --threshold 5
+    python train.py  # 训练时把 data 改为生成的 vehicles_dedup.yaml
+"""
+
+import argparse
+import csv
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import yaml
+from PIL import Image
+from tqdm import tqdm
+
+from Check_image_files import IMAGE_EXTS, file_signature, label_path_for
+
+# 哈希缓存文件名（保存在训练图片目录下）
+HASH_CACHE_NAME = ".phash_cache.json"
+# pHash 使用的缩放尺寸和保留的低频系数尺寸
+HASH_SIZE = 8
+IMAGE_SIZE = 32
+
+
+def _dct_matrix(n):
+    """n × n 的 DCT-II 变换矩阵"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+DCT_MATRIX = _dct_matrix(IMAGE_SIZE)
+
+
+def phash(img_path):
+    """
+    计算感知哈希：缩放为 32×32 灰度图，做二维 DCT，取左上角 8×8 低频系数与中位数比较
+    :return: 64 位整数哈希，图片无法读取时返回 None
+    """
+    try:
+        with Image.open(img_path) as img:
+            pixels = np.asarray(img.convert('L').resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR),
+                                dtype=np.float64)
+    except (IOError, OSError, ValueError):
+        return None
+    coeffs = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE].reshape(-1)
+    # 直流分量不参与中位数计算
+    bits = coeffs > np.median(coeffs[1:])
+    return int(np.packbits(bits).view('>u8')[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """按汉明距离组织的 BK 树，支持范围查询"""
+    def __init__(self):
+        self.root = None  # 节点为 [哈希, {距离: 子节点}]
+
+    def add(self, value):
+        if self.root is None:
+            self.root = [value, {}]
+            return
+        node = self.root
+        while True:
+            distance = hamming(value, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = [value, {}]
+                return
+            node = child
+
+    def query(self, value, radius):
+        """返回与 value 的汉明距离不超过 radius 的全部哈希"""
+        found = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node_value, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= radius:
+                found.append(node_value)
+            # 三角不等式：只有距离在 [d - r, d + r] 内的子树可能包含结果
+            for child_distance, child in children.items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def _hash_task(img_path):
+    return img_path, phash(img_path)
+
+
+def compute_hashes(image_paths, cache_path, workers=None):
+    """
+    并行计算图片哈希，未变化的图片直接使用缓存
+    :return: {图片路径: 哈希}，无法读取的图片不在结果中
+    """
+    cache = {}
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (IOError, ValueError) as e:
+            print(f"哈希缓存无效，将重新计算: {e}")
+
+    hashes, signatures, todo = {}, {}, []
+    for path in image_paths:
+        signature = file_signature(path)
+        signatures[path] = signature
+        cached = cache.get(path)
+        if cached is not None and cached[0] == signature:
+            hashes[path] = int(cached[1], 16)
+        else:
+            todo.append(path)
+
+    print(f"共 {len(image_paths)} 张图片，{len(hashes)} 张使用缓存，{len(todo)} 张需要计算哈希")
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, value in tqdm(executor.map(_hash_task, todo, chunksize=64), total=len(todo),
+                                    desc="Hashing images"):
+                if value is not None:
+                    hashes[path] = value
+
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({path: [signatures[path], f"{value:016x}"] for path, value in hashes.items()}, f)
+    os.replace(tmp_path, cache_path)
+    return hashes
+
+
+def find_clusters(hashes, threshold, priority=None):
+    """
+    查找近重复图片组（代表点聚类）
+    图片按优先级从高到低依次处理：与已保留图片的汉明距离都超过阈值时保留该图片并加入 BK 树，
+    否则归入距离最近的已保留图片所在的组。每张被移除的图片都与本组保留的图片直接相似，
+    缓慢平移的连续帧 A~B~…~Z 不会因为逐对相似而被合并成一组（单链接聚类的问题）。
+    :param hashes: {图片路径: 哈希}
+    :param threshold: 汉明距离阈值（位数），不超过该值视为近重复
+    :param priority: {图片路径: 优先级}，优先级高的图片优先保留，为 None 时按路径顺序
+    :return: 图片路径列表的列表，每个列表为一组（只包含多于一张图片的组），第一张为保留的图片
+    """
+    priority = priority or {}
+    order = sorted(hashes, key=lambda path: (-priority.get(path, 0), path))
+
+    tree = BKTree()
+    leaders = {}  # 已保留图片的哈希 → 所在组
+    for path in tqdm(order, desc="Clustering"):
+        value = hashes[path]
+        matches = tree.query(value, threshold)
+        if matches:
+            nearest = min(matches, key=lambda match: (hamming(value, match), leaders[match][0]))
+            leaders[nearest].append(path)
+        else:
+            leaders[value] = [path]
+            tree.add(value)
+    return [paths for paths in leaders.values() if len(paths) > 1]
+
+
+def count_labels(img_path):
+    """图片对应标签中的目标数，没有标签时为 0"""
+    label_path = label_path_for(img_path)
+    if not os.path.exists(label_path):
+        return 0
+    with open(label_path, 'r', encoding='utf-8') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def resolve_split(config, data_path, split):
+    """返回数据集配置中某个划分的图片目录"""
+    root = config.get('path') or os.path.dirname(os.path.abspath(data_path))
+    split_path = config[split]
+    return split_path if os.path.isabs(split_path) else os.path.join(root, split_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练集近重复图片去重")
+    parser.add_argument("--data", default="vehicles.yaml", help="数据集配置文件")
+    parser.add_argument("--threshold", type=int, default=5, help="汉明距离阈值（64 位哈希中不同的位数）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认使用全部 CPU")
+    parser.add_argument("--output", default=None, help="去重后的数据集配置文件，默认为 <data>_dedup.yaml")
+    parser.add_argument("--report", default="dedup_clusters.csv", help="近重复组报告（CSV）")
+    args = parser.parse_args()
+
+    with open(args.data, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    train_dir = resolve_split(config, args.data, 'train')
+    image_paths = sorted(os.path.join(root, file) for root, _, files in os.walk(train_dir)
+                         for file in files if file.lower().endswith(IMAGE_EXTS))
+
+    hashes = compute_hashes(image_paths, os.path.join(train_dir, HASH_CACHE_NAME), args.workers)
+    # 标注目标多的图片优先保留，数量相同时保留路径排序靠前的
+    counts = {path: count_labels(path) for path in hashes}
+    clusters = find_clusters(hashes, args.threshold, counts)
+
+    removed = set()
+    with open(args.report, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['cluster', 'image', 'labels', 'kept'])
+        for index, paths in enumerate(clusters):
+            keep = paths[0]
+            for path in paths:
+                writer.writerow([index, path, counts[path], path == keep])
+                if path != keep:
+                    removed.add(path)
+
+    kept = [path for path in image_paths if path in hashes and path not in removed]
+    output = args.output or os.path.splitext(args.data)[0] + "_dedup.yaml"
+    list_path = os.path.splitext(output)[0] + "_train.txt"
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write("\n".join(os.path.abspath(path) for path in kept) + "\n")
+
+    dedup_config = dict(config, train=os.path.abspath(list_path))
+    with open(output, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(dedup_config, f, allow_unicode=True, sort_keys=False)
+
+    print(f"\n近重复组: {len(clusters)} 组，移除 {len(removed)} 张，"
+          f"训练集 {len(image_paths)} → {len(kept)} 张（{len(kept) / max(len(image_paths), 1):.1%}）")
+    print(f"训练列表: {list_path}")
+    print(f"数据集配置: {output}")
+    print(f"近重复组报告: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+训练后 INT8 量化
+流程：
+    1. 把训练好的模型导出为 OpenVINO FP32 和 INT8（INT8 使用 vehicles.yaml 验证集图片做校准）
+    2. 在验证集上分别评估原始模型和 INT8 模型的 mAP
+    3. 在本机 CPU 上测量各模型的单帧延迟
+    4. 只有 mAP 下降不超过预算、且 INT8 比原始模型更快时，才把 INT8 模型发布到检测系统使用的位置
+
+用法：
+    python quantize.py --weights runs/detect/train/weights/best.pt --map-budget 0.01
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics import YOLO
+
+from dedup_images import IMAGE_EXTS, resolve_split
+
+# 通过精度验证的 INT8 模型发布位置（检测系统在 CPU 上优先加载该模型）
+PROMOTED_MODEL = os.path.join("..", "best_int8_openvino_model")
+
+
+def load_val_images(data_path, limit):
+    """读取验证集中的前 limit 张图片，用于延迟测试"""
+    with open(data_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    val_dir = resolve_split(config, data_path, 'val')
+    paths = sorted(os.path.join(root, file) for root, _, files in os.walk(val_dir)
+                   for file in files if file.lower().endswith(IMAGE_EXTS))[:limit]
+    images = [image for image in (cv2.imread(path) for path in paths) if image is not None]
+    if not images:
+        raise FileNotFoundError(f"验证集目录中没有可读取的图片: {val_dir}")
+    return images
+
+
+def evaluate_map(model_path, data_path, imgsz, device='cpu'):
+    """
+    在验证集上评估模型
+    :return: {'map50_95', 'map50'}
+    """
+    metrics = YOLO(model_path, task='detect').val(data=data_path, split='val', imgsz=imgsz, device=device,
+                                                   plots=False, verbose=False)
+    return {'map50_95': float(metrics.box.map), 'map50': float(metrics.box.map50)}
+
+
+def benchmark_latency(model_path, images, imgsz, runs=100, warmup=10, device='cpu'):
+    """
+    测量单帧推理延迟（包含预处理和后处理）
+    :param model_path: 模型路径（.pt 或导出的模型目录）
+    :param images: 测试图片列表，循环使用
+    :param imgsz: 推理尺寸
+    :param runs: 计时的推理次数
+    :param warmup: 预热次数
+    :return: {'median_ms', 'p90_ms', 'fps'}
+    """
+    model = YOLO(model_path, task='detect')
+    for i in range(warmup):
+        model.predict(images[i % len(images)], imgsz=imgsz, device=device, verbose=False)
+    times = []
+    for i in range(runs):
+        start = time.perf_counter()
+        model.predict(images[i % len(images)], imgsz=imgsz, device=device, verbose=False)
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    return {'median_ms': float(np.median(times)), 'p90_ms': float(np.percentile(times, 90)),
+            'fps': float(1000 / np.mean(times))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练后 INT8 量化与精度验证")
+    parser.add_argument("--weights", default=os.path.join("runs", "detect", "train", "weights", "best.pt"),
+                        help="训练好的模型权重")
+    parser.add_argument("--data", default="vehicles.yaml", help="数据集配置（验证集用于校准和评估）")
+    parser.add_argument("--imgsz", type=int, default=640, help="导出和推理尺寸")
+    parser.add_argument("--map-budget", type=float, default=0.01, help="允许的 mAP50-95 下降（绝对值）")
+    parser.add_argument("--min-speedup", type=float, default=1.0, help="INT8 相对原始模型至少要达到的加速比")
+    parser.add_argument("--latency-images", type=int, default=50, help="延迟测试使用的验证集图片数")
+    parser.add_argument("--latency-runs", type=int, default=100, help="延迟测试的推理次数")
+    parser.add_argument("--promote-to", default=PROMOTED_MODEL, help="INT8 模型的发布位置")
+    parser.add_argument("--report", default="quantization_report.json", help="结果报告")
+    args = parser.parse_args()
+
+    model = YOLO(args.weights)
+    print("导出 OpenVINO FP32 模型...")
+    fp32_path = model.export(format='openvino', imgsz=args.imgsz)
+    print("导出 OpenVINO INT8 模型（使用验证集校准）...")
+    int8_path = model.export(format='openvino', int8=True, data=args.data, imgsz=args.imgsz)
+
+    variants = {'pytorch_fp32': args.weights, 'openvino_fp32': fp32_path, 'openvino_int8': int8_path}
+    images = load_val_images(args.data, args.latency_images)
+    report = {'weights': args.weights, 'imgsz': args.imgsz, 'map_budget': args.map_budget, 'variants': {}}
+    for name, path in variants.items():
+        print(f"评估 {name}: {path}")
+        result = {'path': str(path)}
+        result.update(evaluate_map(path, args.data, args.imgsz))
+        result.update(benchmark_latency(path, images, args.imgsz, runs=args.latency_runs))
+        report['variants'][name] = result
+        print(f"  mAP50-95 {result['map50_95']:.4f}, mAP50 {result['map50']:.4f}, "
+              f"延迟 {result['median_ms']:.1f}ms (p90 {result['p90_ms']:.1f}ms)")
+
+    reference = report['variants']['pytorch_fp32']
+    quantized = report['variants']['openvino_int8']
+    map_drop = reference['map50_95'] - quantized['map50_95']
+    speedup = reference['median_ms'] / quantized['median_ms']
+    promote = map_drop <= args.map_budget and speedup >= args.min_speedup
+    report.update(map_drop=map_drop, speedup=speedup, promoted=promote,
+                  created=time.strftime("%Y-%m-%d %H:%M:%S"))
+
+    if promote:
+        shutil.rmtree(args.promote_to, ignore_errors=True)
+        shutil.copytree(int8_path, args.promote_to)
+        report['promoted_path'] = os.path.abspath(args.promote_to)
+        print(f"\nINT8 模型已发布到 {args.promote_to}：mAP 下降 {map_drop:.4f}（预算 {args.map_budget}），"
+              f"加速 {speedup:.2f}x")
+    else:
+        print(f"\nINT8 模型未发布：mAP 下降 {map_drop:.4f}（预算 {args.map_budget}），"
+              f"加速 {speedup:.2f}x（要求 {args.min_speedup}x）")
+
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已保存到: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
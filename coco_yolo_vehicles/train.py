@@ -1,49 +1,294 @@
+"""
+车辆检测模型训练
+用法：
+    python train.py --tune   # 在本机上做吞吐量调优，把最快且稳定的配置写入 train_config.json
+    python train.py          # 正式训练，使用 train_config.json 中的 device / batch / workers / cache
+没有调优结果时自动选择设备：有 GPU 用 GPU，否则用 CPU。
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
 from ultralytics import YOLO
 import multiprocessing
 
+# 调优结果文件
+TUNED_CONFIG = "train_config.json"
+# 调优试验的输出目录
+TUNE_DIR = os.path.join("runs", "tune")
+
+# 优化后的训练配置（device / batch / workers / cache 由调优结果或自动选择决定）
+TRAIN_ARGS = dict(
+    data="vehicles.yaml",
+    # resume=True,
+    epochs=80,              # 增加训练轮次
+    patience=20,            # 早停耐心值
+    imgsz=640,              # 增大图像尺寸
+    optimizer='AdamW',      # 保持
+    lr0=0.001,             # 降低初始学习率
+    lrf=0.01,              # 最终学习率 = lr0 * lrf
+    weight_decay=0.0005,    # 保持
+    warmup_epochs=3,        # 学习率预热
+    warmup_momentum=0.8,    # 预热期动量
+    warmup_bias_lr=0.1,     # 偏置项学习率
+    box=7.5,                # 增加box loss权重
+    cls=0.5,                # 分类损失权重
+    dfl=1.5,                # 分布焦点损失权重
+    close_mosaic=10,        # 保持
+    hsv_h=0.015,            # 色相增强
+    hsv_s=0.7,              # 饱和度增强
+    hsv_v=0.4,              # 明度增强
+    degrees=10.0,           # 增加旋转角度
+    translate=0.1,          # 平移增强
+    scale=0.5,              # 缩放增强
+    shear=2.0,              # 剪切增强
+    perspective=0.0005,     # 透视变换
+    fliplr=0.5,             # 增加水平翻转概率
+    mosaic=1.0,             # 使用mosaic增强
+    mixup=0.1,              # 轻微mixup增强
+    copy_paste=0.1,         # 小物体复制粘贴增强
+    erasing=0.4,            # 随机擦除
+    crop_fraction=0.9,      # 图像裁剪比例
+    overlap_mask=True,      # 训练时计算mask重叠
+    single_cls=False,       # 多类别训练
+    pretrained=True,        # 使用预训练权重
+    seed=42,                # 固定随机种子
+    deterministic=True      # 确定性训练
+)
+
+
+def default_config():
+    """没有调优结果时的配置：有 GPU 用 GPU，否则回退到 CPU"""
+    import torch
+
+    if torch.cuda.is_available():
+        return {'device': '0', 'batch': 16, 'workers': 4, 'cache': False}
+    return {'device': 'cpu', 'batch': 8, 'workers': min(4, os.cpu_count() or 1), 'cache': False}
+
+
+def load_config(path=TUNED_CONFIG):
+    """读取调优结果，文件不存在或设备已不可用时使用默认配置"""
+    import torch
+
+    config = default_config()
+    if not os.path.exists(path):
+        print("未找到调优结果，使用默认配置（可先运行 python train.py --tune）")
+        return config
+    with open(path, 'r', encoding='utf-8') as f:
+        tuned = json.load(f)['best']
+    if tuned['device'] != 'cpu' and not torch.cuda.is_available():
+        print("调优结果使用 GPU，但当前没有可用的 GPU，使用默认配置")
+        return config
+    config.update({key: tuned[key] for key in ('device', 'batch', 'workers', 'cache')})
+    return config
+
+
+def run_trial(trial):
+    """
+    运行一次计时试验（在子进程中执行，显存不足等错误不会影响调优进程）
+    :param trial: {'device', 'batch', 'workers', 'cache', 'fraction', 'warmup_batches', 'model'}
+    :return: {'images_per_sec', 'peak_rss_mb', 'peak_gpu_mb'}
+    """
+    import psutil
+    import torch
+
+    process = psutil.Process()
+    peak_rss = [0]
+    stop = threading.Event()
+
+    def sample_memory():
+        # 数据加载进程的内存也计算在内（RAM 缓存和多 worker 会显著增加内存占用）
+        while not stop.wait(0.2):
+            try:
+                rss = process.memory_info().rss + sum(
+                    child.memory_info().rss for child in process.children(recursive=True))
+            except psutil.Error:
+                continue
+            peak_rss[0] = max(peak_rss[0], rss)
+
+    batch_times = []
+    model = YOLO(trial['model'])
+    model.add_callback('on_train_batch_end', lambda trainer: batch_times.append(time.perf_counter()))
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    sampler.start()
+    try:
+        model.train(**dict(TRAIN_ARGS, epochs=1, patience=0, fraction=trial['fraction'], val=False, plots=False,
+                           device=trial['device'], batch=trial['batch'], workers=trial['workers'],
+                           cache=trial['cache'], project=TUNE_DIR, name='trial', exist_ok=True))
+    finally:
+        stop.set()
+        sampler.join()
+
+    # 跳过前几个批次（CUDA 初始化、数据加载预热）
+    warmup = trial['warmup_batches']
+    if len(batch_times) <= warmup + 1:
+        raise RuntimeError(f"试验批次数不足（{len(batch_times)}），请增大 --fraction")
+    elapsed = batch_times[-1] - batch_times[warmup]
+    images = (len(batch_times) - 1 - warmup) * trial['batch']
+    return {
+        'images_per_sec': images / elapsed,
+        'peak_rss_mb': peak_rss[0] / 1024 ** 2,
+        # 显存峰值按试验使用的 GPU 统计
+        'peak_gpu_mb': (torch.cuda.max_memory_allocated(int(trial['device'])) / 1024 ** 2
+                        if trial['device'] != 'cpu' else 0.0),
+    }
+
+
+def estimate_cache_ram_mb(data, imgsz, samples=30):
+    """
+    估算把完整训练集缓存到内存（cache='ram'）需要的内存（MB）。
+    抽样读取若干张训练图像，按缩放到 imgsz 后的大小换算到全部图像（与 ultralytics 的缓存方式一致）。
+    """
+    import random
+    import cv2
+    from ultralytics.data.utils import IMG_FORMATS, check_det_dataset
+
+    train = check_det_dataset(data)['train']
+    paths = []
+    for root in (train if isinstance(train, list) else [train]):
+        for directory, _, files in os.walk(root):
+            paths.extend(os.path.join(directory, name) for name in files
+                         if name.rsplit('.', 1)[-1].lower() in IMG_FORMATS)
+    if not paths:
+        return 0.0
+    total = 0
+    sampled = 0
+    for path in random.Random(0).sample(paths, min(samples, len(paths))):
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        ratio = imgsz / max(image.shape[:2])
+        total += image.nbytes * ratio ** 2
+        sampled += 1
+    return total / max(1, sampled) * len(paths) / 1024 ** 2
+
+
+def launch_trial(trial, timeout):
+    """在子进程中运行试验，返回结果；失败（显存不足、超时等）时返回带 error 的结果"""
+    command = [sys.executable, os.path.abspath(__file__), "--trial", json.dumps(trial)]
+    try:
+        output = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return dict(trial, error="超时")
+    for line in reversed(output.stdout.splitlines()):
+        if line.startswith("TRIAL_RESULT "):
+            return dict(trial, **json.loads(line[len("TRIAL_RESULT "):]))
+    tail = (output.stderr or output.stdout).strip().splitlines()[-1:] or ["未知错误"]
+    return dict(trial, error=tail[0][:200])
+
+
+def tune(args):
+    """
+    依次调优 设备 → batch → workers → cache，每一步固定前面已选出的最优值（坐标搜索），
+    比全组合搜索少得多的试验次数即可得到接近最优的配置。
+    试验失败或内存占用超过上限的配置视为不稳定，不会被选中。
+    试验只使用 fraction 比例的训练集，cache='ram' 的内存峰值按完整训练集的缓存大小换算后再与上限比较。
+    """
+    import psutil
+    import torch
+
+    cpu_count = os.cpu_count() or 1
+    memory_limit_mb = psutil.virtual_memory().total / 1024 ** 2 * args.memory_fraction
+    if torch.cuda.is_available():
+        devices = [str(i) for i in range(torch.cuda.device_count())] + (['cpu'] if args.include_cpu else [])
+        batches = [8, 16, 32, 64]
+    else:
+        devices = ['cpu']
+        batches = [4, 8, 16]
+    gpu_limits = {str(i): torch.cuda.get_device_properties(i).total_memory / 1024 ** 2 * args.memory_fraction
+                  for i in range(torch.cuda.device_count())}
+
+    base = {'model': args.model, 'fraction': args.fraction, 'warmup_batches': args.warmup_batches,
+            'device': devices[0], 'batch': 16 if devices[0] != 'cpu' else 8,
+            'workers': min(4, cpu_count), 'cache': False}
+    search = [
+        ('device', devices),
+        ('batch', batches),
+        ('workers', sorted({w for w in (0, 2, 4, 8, 16) if w <= cpu_count})),
+        ('cache', [False, 'disk', 'ram']),
+    ]
+
+    cache_ram_mb = estimate_cache_ram_mb(TRAIN_ARGS['data'], TRAIN_ARGS['imgsz'])
+    print(f"完整训练集的内存缓存预计需要 {cache_ram_mb:.0f}MB")
+
+    results = []
+    best = None
+    for key, values in search:
+        step_best = None
+        for value in values:
+            # 只取试验参数，不带上一步的测量结果
+            trial = dict({name: (best or base)[name] for name in base}, **{key: value})
+            print(f"试验: device={trial['device']} batch={trial['batch']} workers={trial['workers']} "
+                  f"cache={trial['cache']}")
+            result = launch_trial(trial, args.timeout)
+            if 'error' not in result:
+                if result['cache'] == 'ram':
+                    # 试验只缓存了 fraction 比例的图像，加上其余图像的缓存才是正式训练的内存峰值
+                    result['peak_rss_mb'] += cache_ram_mb * (1 - trial['fraction'])
+                if result['peak_rss_mb'] > memory_limit_mb:
+                    result['error'] = f"内存占用过高（{result['peak_rss_mb']:.0f}MB）"
+                elif result['device'] in gpu_limits and result['peak_gpu_mb'] > gpu_limits[result['device']]:
+                    result['error'] = f"显存占用过高（{result['peak_gpu_mb']:.0f}MB）"
+            results.append(result)
+
+            if 'error' in result:
+                print(f"  不稳定: {result['error']}")
+                continue
+            print(f"  {result['images_per_sec']:.1f} 张/秒，内存峰值 {result['peak_rss_mb']:.0f}MB，"
+                  f"显存峰值 {result['peak_gpu_mb']:.0f}MB")
+            if step_best is None or result['images_per_sec'] > step_best['images_per_sec']:
+                step_best = result
+        if step_best is not None:
+            best = step_best
+
+    os.makedirs(TUNE_DIR, exist_ok=True)
+    fields = ['device', 'batch', 'workers', 'cache', 'images_per_sec', 'peak_rss_mb', 'peak_gpu_mb', 'error']
+    with open(os.path.join(TUNE_DIR, "trials.csv"), 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+    if best is None:
+        print("所有试验均失败，未写入调优结果")
+        return
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({'best': {key: best[key] for key in fields if key != 'error'},
+                   'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+                   'trials': len(results)}, f, ensure_ascii=False, indent=2)
+    print(f"\n最优配置: device={best['device']} batch={best['batch']} workers={best['workers']} "
+          f"cache={best['cache']}（{best['images_per_sec']:.1f} 张/秒），已写入 {args.output}")
+
+
 if __name__ == '__main__':
     multiprocessing.freeze_support()
-    # 加载模型（建议使用更大的预训练模型）
-    model = YOLO('yolov8n.pt')  # 改用中等尺寸模型提升性能
-
-    # 优化后的训练配置
-    results = model.train(
-        data="vehicles.yaml",
-        # resume=True,
-        epochs=80,              # 增加训练轮次
-        patience=20,            # 早停耐心值
-        imgsz=640,              # 增大图像尺寸
-        batch=16,               # 减小batch size以获得更好梯度估计
-        device='0',
-        optimizer='AdamW',      # 保持
-        lr0=0.001,             # 降低初始学习率
-        lrf=0.01,              # 最终学习率 = lr0 * lrf
-        weight_decay=0.0005,    # 保持
-        warmup_epochs=3,        # 学习率预热
-        warmup_momentum=0.8,    # 预热期动量
-        warmup_bias_lr=0.1,     # 偏置项学习率
-        box=7.5,                # 增加box loss权重
-        cls=0.5,                # 分类损失权重
-        dfl=1.5,                # 分布焦点损失权重
-        close_mosaic=10,        # 保持
-        hsv_h=0.015,            # 色相增强
-        hsv_s=0.7,              # 饱和度增强
-        hsv_v=0.4,              # 明度增强
-        degrees=10.0,           # 增加旋转角度
-        translate=0.1,          # 平移增强
-        scale=0.5,              # 缩放增强
-        shear=2.0,              # 剪切增强
-        perspective=0.0005,     # 透视变换
-        fliplr=0.5,             # 增加水平翻转概率
-        mosaic=1.0,             # 使用mosaic增强
-        mixup=0.1,              # 轻微mixup增强
-        copy_paste=0.1,         # 小物体复制粘贴增强
-        erasing=0.4,            # 随机擦除
-        crop_fraction=0.9,      # 图像裁剪比例
-        overlap_mask=True,      # 训练时计算mask重叠
-        single_cls=False,       # 多类别训练
-        workers=4,              # 增加数据加载线程
-        pretrained=True,        # 使用预训练权重
-        seed=42,                # 固定随机种子
-        deterministic=True      # 确定性训练
-    )
\ No newline at end of file
+
+    parser = argparse.ArgumentParser(description="车辆检测模型训练")
+    parser.add_argument("--tune", action="store_true", help="运行吞吐量调优并写入最优配置")
+    parser.add_argument("--model", default="yolov8n.pt", help="预训练模型")
+    parser.add_argument("--fraction", type=float, default=0.02, help="每次试验使用的训练集比例")
+    parser.add_argument("--warmup-batches", type=int, default=5, help="每次试验跳过的预热批次数")
+    parser.add_argument("--timeout", type=int, default=900, help="单次试验超时时间（秒）")
+    parser.add_argument("--memory-fraction", type=float, default=0.9, help="内存/显存占用上限（占总量的比例）")
+    parser.add_argument("--include-cpu", action="store_true", help="有 GPU 时也试验 CPU")
+    parser.add_argument("--output", default=TUNED_CONFIG, help="调优结果文件")
+    parser.add_argument("--trial", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trial is not None:
+        # 调优子进程：运行一次试验并输出结果
+        print("TRIAL_RESULT " + json.dumps(run_trial(json.loads(args.trial))))
+    elif args.tune:
+        tune(args)
+    else:
+        # 加载模型（建议使用更大的预训练模型）
+        model = YOLO(args.model)  # 改用中等尺寸模型提升性能
+        config = load_config(args.output)
+        print(f"训练配置: {config}")
+        results = model.train(**TRAIN_ARGS, **config)
@@ -51,7 +51,20 @@ class DBIntegration:
                     fps = 1 / avg_frame_time
             
             # 存储到数据库
-            result = self.db.insert_statistics(
+            return self.store_values(avg_speed, total_vehicles, current_vehicles, frame_count,
+                                     inference_speed, fps)
+        except Exception as e:
+            print(f"存储统计信息失败: {e}")
+            return False
+
+    def store_values(self, avg_speed, total_vehicles, current_vehicles, frame_count, inference_speed, fps):
+        """
+        存储已经计算好的统计数据（供事件总线的后台订阅者调用）
+        :param inference_speed: 平均推理速度（毫秒）
+        :return: 是否存储成功
+        """
+        try:
+            return self.db.insert_statistics(
                 avg_speed=avg_speed,
                 total_vehicles=total_vehicles,
                 current_vehicles=current_vehicles,
@@ -59,8 +72,6 @@ class DBIntegration:
                 inference_speed=inference_speed,
                 fps=fps
             )
-            
-            return result
         except Exception as e:
             print(f"存储统计信息失败: {e}")
             return False
@@ -1,25 +1,142 @@
 import pymysql
+import math
+import threading
 import time
 import datetime
+from collections import OrderedDict
+
+import numpy as np
+
+# 可查询的统计字段及其在时间桶内的聚合方式（字段名不能参数化，只允许白名单中的字段）
+SERIES_FIELDS = {
+    'avg_speed': 'AVG',
+    'total_vehicles': 'MAX',  # 累计值取桶内最大值
+    'current_vehicles': 'AVG',
+    'frame_count': 'MAX',
+    'inference_speed': 'AVG',
+    'fps': 'AVG',
+}
+# 表结构中的全部字段，缺少其中任何字段（source 除外）时重建表
+TABLE_COLUMNS = {'id', 'timestamp', 'source', *SERIES_FIELDS}
+# LTTB 降采样前在数据库中预聚合的倍数：先按 points * LTTB_OVERSAMPLE 个桶聚合，再用 LTTB 选点
+LTTB_OVERSAMPLE = 8
+
+
+def lttb(x, y, points):
+    """
+    Largest-Triangle-Three-Buckets 降采样
+    :param x: 横坐标（升序）
+    :param y: 纵坐标
+    :param points: 目标点数
+    :return: 选中点的下标数组（包含首尾两点）
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)  # 中间 points - 2 个桶的边界
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        # 下一个桶的平均点（最后一个桶使用终点）
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # 选出与上一个选中点、下一个桶平均点构成三角形面积最大的点
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area)) if end > start else start
+        selected[i + 1] = previous
+    return selected
+
+
+class QueryCache:
+    """带过期时间的 LRU 查询缓存，仪表盘重复的查询直接返回缓存结果"""
+    def __init__(self, maxsize=128, ttl=30.0):
+        """
+        :param maxsize: 最多缓存的查询数
+        :param ttl: 缓存有效期（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # 键 → (过期时间, 结果)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回缓存结果，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def to_datetime(value):
+    """把 datetime、日期字符串或 Unix 时间戳（秒）转换为 datetime"""
+    if isinstance(value, datetime.datetime):
+        return value
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return datetime.datetime.fromtimestamp(value)
+
+
+def floor_datetime(value, seconds):
+    """把时间向下取整到 seconds 秒的整数倍（按 Unix 时间对齐）"""
+    return datetime.datetime.fromtimestamp(math.floor(value.timestamp() / seconds) * seconds, value.tzinfo)
+
 
 class DatabaseUtils:
-    def __init__(self, host='localhost', user='root', password='123456', db='traffic_stats'):
+    def __init__(self, host='localhost', user='root', password='123456', db='traffic_stats', source='default',
+                 cache_size=128, cache_ttl=30.0):
         """
         初始化数据库连接
         :param host: 数据库主机地址
         :param user: 数据库用户名
         :param password: 数据库密码
         :param db: 数据库名称
+        :param source: 写入数据的视频源名称（摄像头或视频文件），查询时可按视频源过滤
+        :param cache_size: 历史查询缓存的最大条数
+        :param cache_ttl: 历史查询缓存的有效期（秒）
         """
         self.host = host
         self.user = user
         self.password = password
         self.db = db
+        self.source = source
         self.connection = None
         self.cursor = None
+        # 写入（后台订阅者线程）和查询（界面或仪表盘）共用一个连接，游标操作需要加锁
+        self._lock = threading.RLock()
+        self.query_cache = QueryCache(cache_size, cache_ttl)
         self.latest_data = None  # 最新数据
         self.last_write_time = time.time()  # 上次写入时间
         self.write_interval = 5  # 写入间隔（秒）
+        self.writes_completed = 0  # 成功写入次数
+        self.last_write_lag = 0.0  # 最近一次写入的延迟（数据产生到提交完成，秒）
+        self.last_batch_size = 0  # 最近一次写入的记录条数
+        self.write_callback = None  # 每次写入成功后调用 write_callback(延迟秒数, 记录条数)，在写入所在的线程中执行
         self.connect()
         self.create_table()
     
@@ -47,24 +164,43 @@ class DatabaseUtils:
     
     def create_table(self):
         """
-        创建流量统计表（先删除旧表再创建新表，确保字段结构正确）
+        创建流量统计表。表已存在且字段完整时保留历史数据；
+        旧表只缺少 source 字段时原地添加，缺少其他字段时删除重建，确保字段结构正确
         """
         try:
+            self.cursor.execute(
+                "SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+                (self.db, 'traffic_statistics'))
+            columns = {row['COLUMN_NAME'] for row in self.cursor.fetchall()}
+            if columns and TABLE_COLUMNS - columns == {'source'}:
+                self.cursor.execute(
+                    "ALTER TABLE traffic_statistics "
+                    "ADD COLUMN source VARCHAR(128) NOT NULL DEFAULT 'default' COMMENT '视频源' AFTER timestamp, "
+                    "ADD INDEX idx_source_time (source, timestamp), ADD INDEX idx_time (timestamp)")
+                self.connection.commit()
+                print("表结构已升级（添加视频源字段）")
+                return
+            if columns and TABLE_COLUMNS <= columns:
+                return
+
             # 先删除旧表（如果存在）
             drop_sql = "DROP TABLE IF EXISTS traffic_statistics"
             self.cursor.execute(drop_sql)
             
-            # 创建新表，添加中文注释
+            # 创建新表，添加中文注释；按 (视频源, 时间) 和时间建立索引，支持按时间范围查询
             create_sql = """
             CREATE TABLE traffic_statistics (
                 id INT AUTO_INCREMENT PRIMARY KEY COMMENT '记录ID',
                 timestamp DATETIME NOT NULL COMMENT '时间戳',
+                source VARCHAR(128) NOT NULL DEFAULT 'default' COMMENT '视频源',
                 avg_speed FLOAT NOT NULL COMMENT '平均车速',
                 total_vehicles INT NOT NULL COMMENT '累计车辆数',
                 current_vehicles INT NOT NULL COMMENT '当前车辆数',
                 frame_count INT NOT NULL COMMENT '处理帧数',
                 inference_speed FLOAT NOT NULL COMMENT '推理速度',
-                fps FLOAT NOT NULL COMMENT '帧率'
+                fps FLOAT NOT NULL COMMENT '帧率',
+                INDEX idx_source_time (source, timestamp),
+                INDEX idx_time (timestamp)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
             """
             self.cursor.execute(create_sql)
@@ -87,6 +223,7 @@ class DatabaseUtils:
         # 只保存最新的数据
         self.latest_data = {
             'timestamp': timestamp,
+            'source': self.source,
             'avg_speed': avg_speed,
             'total_vehicles': total_vehicles,
             'current_vehicles': current_vehicles,
@@ -117,27 +254,34 @@ class DatabaseUtils:
         try:
             sql = """
             INSERT INTO traffic_statistics 
-            (timestamp, avg_speed, total_vehicles, current_vehicles, frame_count, inference_speed, fps) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            (timestamp, source, avg_speed, total_vehicles, current_vehicles, frame_count, inference_speed, fps) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
             """
             # 写入最新数据
-            self.cursor.execute(sql, (
-                self.latest_data['timestamp'],
-                self.latest_data['avg_speed'],
-                self.latest_data['total_vehicles'],
-                self.latest_data['current_vehicles'],
-                self.latest_data['frame_count'],
-                self.latest_data['inference_speed'],
-                self.latest_data['fps']
-            ))
-            self.connection.commit()
+            with self._lock:
+                self.cursor.execute(sql, (
+                    self.latest_data['timestamp'],
+                    self.latest_data['source'],
+                    self.latest_data['avg_speed'],
+                    self.latest_data['total_vehicles'],
+                    self.latest_data['current_vehicles'],
+                    self.latest_data['frame_count'],
+                    self.latest_data['inference_speed'],
+                    self.latest_data['fps']
+                ))
+                self.connection.commit()
             
             # 更新上次写入时间
             self.last_write_time = time.time()
-            return True
+            self.last_write_lag = (datetime.datetime.now() - self.latest_data['timestamp']).total_seconds()
+            self.last_batch_size = 1
+            self.writes_completed += 1
         except Exception as e:
             print(f"数据写入失败: {e}")
             return False
+        if self.write_callback is not None:
+            self.write_callback(self.last_write_lag, self.last_batch_size)
+        return True
     
     def get_statistics(self, limit=10):
         """
@@ -146,13 +290,93 @@ class DatabaseUtils:
         :return: 统计数据列表
         """
         try:
-            sql = f"SELECT * FROM traffic_statistics ORDER BY timestamp DESC LIMIT {limit}"
-            self.cursor.execute(sql)
-            results = self.cursor.fetchall()
+            sql = "SELECT * FROM traffic_statistics ORDER BY timestamp DESC LIMIT %s"
+            with self._lock:
+                self.cursor.execute(sql, (int(limit),))
+                results = self.cursor.fetchall()
             return results
         except Exception as e:
             print(f"获取数据失败: {e}")
             return []
+
+    def get_sources(self):
+        """返回数据库中出现过的全部视频源"""
+        try:
+            with self._lock:
+                self.cursor.execute("SELECT DISTINCT source FROM traffic_statistics ORDER BY source")
+                return [row['source'] for row in self.cursor.fetchall()]
+        except Exception as e:
+            print(f"获取视频源失败: {e}")
+            return []
+
+    def query_series(self, start, end, source=None, fields=('avg_speed', 'current_vehicles'), points=500,
+                     method='bucket', use_cache=True):
+        """
+        查询任意时间范围的统计序列，在数据库中按时间桶聚合降采样，不把全部记录读入 Python
+        :param start: 起始时间（datetime、ISO 日期字符串或 Unix 时间戳），包含
+        :param end: 结束时间，不包含。起止时间会按时间桶宽度（不短于缓存有效期）向下取整
+        :param source: 视频源，为 None 时查询全部视频源
+        :param fields: 查询的字段（见 SERIES_FIELDS）
+        :param points: 返回的最大点数
+        :param method: bucket：每个时间桶一个点（均值或最大值）；
+                       lttb：先在数据库中按 points * LTTB_OVERSAMPLE 个桶预聚合，再用 LTTB 按第一个字段选点，
+                       保留峰值和形状
+        :param use_cache: 是否使用查询缓存
+        :return: {'timestamp': [...], 'samples': [...], 字段: [...]}，samples 为每个点聚合的原始记录数
+        """
+        fields = tuple(fields)
+        unknown = [field for field in fields if field not in SERIES_FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"不支持的统计字段: {unknown or fields}")
+        if method not in ('bucket', 'lttb'):
+            raise ValueError(f"未知的降采样方法: {method}")
+        start, end = to_datetime(start), to_datetime(end)
+        points = max(3, int(points))
+
+        buckets = points * LTTB_OVERSAMPLE if method == 'lttb' else points
+        bucket_seconds = max(1, math.ceil((end - start).total_seconds() / buckets))
+        # 起止时间按桶宽的整数倍（不短于缓存有效期）向下取整，“最近 N 分钟到现在”这类每次结束时间都不同的查询
+        # 在取整周期内使用同一个缓存键，刷新时时间桶的边界也保持不变。范围短于一个周期时不取整
+        step = bucket_seconds * max(1, math.ceil(self.query_cache.ttl / bucket_seconds))
+        if (end - start).total_seconds() >= step:
+            start, end = floor_datetime(start, step), floor_datetime(end, step)
+
+        key = (start, end, source, fields, points, method)
+        if use_cache:
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                return cached
+
+        aggregates = ", ".join(f"{SERIES_FIELDS[field]}({field}) AS {field}" for field in fields)
+        sql = f"""
+        SELECT FLOOR((UNIX_TIMESTAMP(timestamp) - UNIX_TIMESTAMP(%s)) / %s) AS bucket,
+               FROM_UNIXTIME(AVG(UNIX_TIMESTAMP(timestamp))) AS timestamp,
+               COUNT(*) AS samples, {aggregates}
+        FROM traffic_statistics
+        WHERE timestamp >= %s AND timestamp < %s{" AND source = %s" if source is not None else ""}
+        GROUP BY bucket
+        ORDER BY bucket
+        """
+        params = [start, bucket_seconds, start, end] + ([source] if source is not None else [])
+        try:
+            with self._lock:
+                self.cursor.execute(sql, params)
+                rows = self.cursor.fetchall()
+        except Exception as e:
+            print(f"查询统计序列失败: {e}")
+            return {'timestamp': [], 'samples': [], **{field: [] for field in fields}}
+
+        if method == 'lttb' and len(rows) > points:
+            x = [row['timestamp'].timestamp() for row in rows]
+            rows = [rows[i] for i in lttb(x, [float(row[fields[0]]) for row in rows], points)]
+
+        result = {'timestamp': [row['timestamp'] for row in rows],
+                  'samples': [int(row['samples']) for row in rows]}
+        for field in fields:
+            result[field] = [float(row[field]) for row in rows]
+        if use_cache:
+            self.query_cache.put(key, result)
+        return result
     
     def close(self):
         """
@@ -162,6 +386,7 @@ class DatabaseUtils:
             # 写入最新数据
             if self.latest_data:
                 self.write_latest_data()
+            self.query_cache.clear()
             
             if self.cursor:
                 self.cursor.close()
@@ -0,0 +1,326 @@
+"""
+检测结果录制/回放缓存
+把 model.track 的逐帧输出（检测框、ID、类别、置信度）按列存储为可内存映射的二进制文件，
+缓存键由 (视频哈希, 权重哈希, 置信度阈值, 类别列表) 决定。调整区域、阈值或速度参数后，
+可以直接从缓存回放跟踪会话（TrackingSession.track）的后续逻辑，完全不需要再做推理。
+
+用法：
+    python detection_cache.py car_test3.mp4 --model best.pt
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+# 缓存根目录
+CACHE_DIR = "detection_cache"
+
+# 各列的文件名、数据类型和每行的元素个数
+COLUMNS = {
+    'frame_index': (np.int64, 1),  # 每帧一行：帧序号
+    'timestamp': (np.float64, 1),  # 每帧一行：视频时间（秒）
+    'offsets': (np.int64, 1),  # 每帧一行：该帧检测结果在检测列中的结束位置
+    'boxes': (np.float32, 4),  # 每个检测一行：中心点格式 (x, y, w, h)
+    'ids': (np.int32, 1),  # 每个检测一行：跟踪 ID
+    'classes': (np.int16, 1),  # 每个检测一行：类别
+    'scores': (np.float32, 1),  # 每个检测一行：置信度
+}
+
+
+def file_hash(path, block_size=4 * 1024 * 1024, sampled=False):
+    """
+    计算文件哈希。
+    :param path: 文件路径
+    :param block_size: 读取块大小
+    :param sampled: 为 True 时只对文件大小以及开头、中间、结尾各一块做哈希，适用于数 GB 的视频文件
+    :return: 十六进制哈希字符串
+    """
+    sha1 = hashlib.sha1()
+    size = os.path.getsize(path)
+    sha1.update(str(size).encode())
+    with open(path, 'rb') as f:
+        if sampled and size > 3 * block_size:
+            for offset in (0, size // 2, size - block_size):
+                f.seek(offset)
+                sha1.update(f.read(block_size))
+        else:
+            for block in iter(lambda: f.read(block_size), b''):
+                sha1.update(block)
+    return sha1.hexdigest()
+
+
+def path_hash(path):
+    """计算文件哈希；目录（如导出的 OpenVINO 模型）按文件名和内容一起计算"""
+    if not os.path.isdir(path):
+        return file_hash(path)
+    sha1 = hashlib.sha1()
+    for root, _, files in sorted(os.walk(path)):
+        for name in sorted(files):
+            file_path = os.path.join(root, name)
+            sha1.update(os.path.relpath(file_path, path).encode())
+            sha1.update(file_hash(file_path).encode())
+    return sha1.hexdigest()
+
+
+def cache_key(video_path, weights_path, conf, classes, **extra):
+    """
+    计算缓存键。
+    :param video_path: 视频文件路径
+    :param weights_path: 模型权重路径
+    :param conf: 跟踪置信度阈值
+    :param classes: 跟踪的类别列表
+    :param extra: 其他会影响跟踪输出的参数（如处理间隔、处理区间）
+    :return: 缓存键字符串
+    """
+    payload = {
+        'video': file_hash(video_path, sampled=True),
+        'weights': path_hash(weights_path) if os.path.exists(weights_path) else str(weights_path),
+        'conf': float(conf),
+        'classes': sorted(int(c) for c in classes),
+        'extra': {k: v for k, v in sorted(extra.items()) if v is not None},
+    }
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def tracking_cache_key(video_path, weights_path, conf, classes, tracker=None, stride=1, start_time=None,
+                       end_time=None, motion_gate=None):
+    """
+    按跟踪配置计算缓存键。界面、录制和参数搜索都通过这里计算，相同的配置总是得到相同的键。
+    :param video_path: 视频文件路径
+    :param weights_path: 模型权重路径
+    :param conf: 跟踪置信度阈值
+    :param classes: 跟踪的类别列表
+    :param tracker: 使用内置跟踪器时为 'builtin'，为 None 时表示 model.track(persist=True)
+    :param stride: 处理间隔
+    :param start_time: 处理区间起始时间（秒）
+    :param end_time: 处理区间结束时间（秒）
+    :param motion_gate: 运动门控参数签名（MotionGate.signature），为 None 时表示不使用门控
+    :return: 缓存键字符串
+    """
+    return cache_key(video_path, weights_path, conf, classes, tracker=tracker,
+                     stride=stride if stride != 1 else None, start_time=start_time, end_time=end_time,
+                     motion_gate=motion_gate)
+
+
+class DetectionCacheWriter:
+    """
+    检测结果录制器
+    逐帧把检测结果追加写入各列的二进制文件，内存占用与视频长度无关；
+    调用 close() 后才写入元数据并把临时目录改名为正式目录，中途崩溃的缓存不会被误用。
+    """
+    def __init__(self, key, cache_dir=CACHE_DIR, **meta):
+        """
+        :param key: 缓存键
+        :param cache_dir: 缓存根目录
+        :param meta: 需要随缓存保存的元数据（如帧尺寸、帧率）
+        """
+        self.path = os.path.join(cache_dir, key)
+        self.tmp_path = self.path + ".tmp"
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        os.makedirs(self.tmp_path)
+        self.meta = dict(meta, key=key)
+        self.files = {name: open(os.path.join(self.tmp_path, f"{name}.bin"), 'wb') for name in COLUMNS}
+        self.frames = 0
+        self.rows = 0
+
+    def append(self, frame_index, timestamp, detections):
+        """
+        追加一帧的检测结果
+        :param frame_index: 帧序号
+        :param timestamp: 视频时间（秒）
+        :param detections: extract_detections 的返回值
+        """
+        if detections is not None and len(detections[1]) > 0:
+            boxes, track_ids, track_classes, scores = detections
+            self.files['boxes'].write(np.asarray(boxes, dtype=np.float32).reshape(-1, 4).tobytes())
+            self.files['ids'].write(np.asarray(track_ids, dtype=np.int32).tobytes())
+            self.files['classes'].write(np.asarray(track_classes, dtype=np.int16).tobytes())
+            self.files['scores'].write(np.asarray(scores, dtype=np.float32).tobytes())
+            self.rows += len(track_ids)
+        self.files['frame_index'].write(np.int64(frame_index).tobytes())
+        self.files['timestamp'].write(np.float64(timestamp).tobytes())
+        self.files['offsets'].write(np.int64(self.rows).tobytes())
+        self.frames += 1
+
+    def close(self):
+        """完成录制，写入元数据"""
+        for f in self.files.values():
+            f.close()
+        self.meta.update(frames=self.frames, rows=self.rows, created=time.strftime("%Y-%m-%d %H:%M:%S"))
+        with open(os.path.join(self.tmp_path, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """放弃录制，删除临时文件"""
+        for f in self.files.values():
+            f.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class DetectionCache:
+    """
+    检测结果缓存（只读）
+    各列以 np.memmap 方式打开，按需从磁盘读取，打开数小时视频的缓存也几乎不占内存。
+    """
+    def __init__(self, path):
+        """
+        :param path: 缓存目录
+        """
+        self.path = path
+        with open(os.path.join(path, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.frames = self.meta['frames']
+        self.rows = self.meta['rows']
+
+        self.columns = {}
+        for name, (dtype, width) in COLUMNS.items():
+            length = self.frames if name in ('frame_index', 'timestamp', 'offsets') else self.rows
+            shape = (length, width) if width > 1 else (length,)
+            if length == 0:
+                self.columns[name] = np.empty(shape, dtype=dtype)
+            else:
+                self.columns[name] = np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype,
+                                               mode='r', shape=shape)
+
+    @classmethod
+    def open(cls, key, cache_dir=CACHE_DIR):
+        """按缓存键打开已完成的缓存，不存在时返回 None"""
+        path = os.path.join(cache_dir, key)
+        if not os.path.exists(os.path.join(path, "meta.json")):
+            return None
+        return cls(path)
+
+    def __len__(self):
+        return self.frames
+
+    def get(self, position):
+        """
+        按录制顺序返回第 position 帧的数据
+        :return: (frame_index, timestamp, detections)，detections 格式同 extract_detections
+        """
+        from object_tracking import empty_detections
+
+        offsets = self.columns['offsets']
+        end = int(offsets[position])
+        start = int(offsets[position - 1]) if position > 0 else 0
+        frame_index = int(self.columns['frame_index'][position])
+        timestamp = float(self.columns['timestamp'][position])
+        if end == start:
+            return frame_index, timestamp, empty_detections()
+        detections = (np.asarray(self.columns['boxes'][start:end]),
+                      np.asarray(self.columns['ids'][start:end]),
+                      np.asarray(self.columns['classes'][start:end]),
+                      np.asarray(self.columns['scores'][start:end]))
+        return frame_index, timestamp, detections
+
+    def find(self, frame_index):
+        """按帧序号查找录制位置，找不到时返回 None"""
+        indices = self.columns['frame_index']
+        position = int(np.searchsorted(indices, frame_index))
+        if position < self.frames and indices[position] == frame_index:
+            return position
+        return None
+
+    def __iter__(self):
+        for position in range(self.frames):
+            yield self.get(position)
+
+
+def replay(cache, polygon_points=None, polygon_points1=None, line_counter=None, params=None, dwell_engine=None,
+           alert_machine=None):
+    """
+    不做推理也不解码视频，直接用缓存的检测结果重跑跟踪会话的后续逻辑。
+    :param cache: DetectionCache 实例
+    :param polygon_points: 统计区域，为 None 时使用 initialize_tracking 的默认值
+    :param polygon_points1: 警告区域，为 None 时使用 initialize_tracking 的默认值
+    :param line_counter: 可选的虚拟计数线计数器
+    :param params: 过滤和预警参数（见 object_tracking.DEFAULT_PARAMS）
+    :param dwell_engine: 可选的停留时间引擎（DwellTimeEngine），提供时按各类别阈值判断警告
+    :param alert_machine: 可选的警报状态机（AlertStateMachine），提供时按警报事件计数
+    :return: 统计结果字典
+    """
+    from annotation_renderer import AnnotationRenderer
+    from tracking_session import TrackingSession
+
+    session = TrackingSession(polygon_points=polygon_points, polygon_points1=polygon_points1,
+                              renderer=AnnotationRenderer(enabled=False), line_counter=line_counter, params=params,
+                              dwell_engine=dwell_engine, alert_machine=alert_machine, stats_interval=0)
+    frame_shape = (cache.meta['frame_height'], cache.meta['frame_width'])
+
+    for _, timestamp, detections in cache:
+        session.track(None, detections, timestamp, frame_shape)
+
+    warned_ids = session.warned_ids
+    return {
+        'frames': cache.frames,
+        'count_passed': session.count_passed,
+        'count_exited': session.count_exited,
+        'warned_ids': sorted(warned_ids),
+        'alert_episodes': alert_machine.episodes if alert_machine is not None else len(warned_ids),
+        'line_counts': line_counter.get_counts() if line_counter is not None else None,
+    }
+
+
+def record(video_path, model_path, cache_dir=CACHE_DIR, conf=None):
+    """
+    对整个视频做一次推理并录制检测结果。
+    :param video_path: 视频文件路径
+    :param model_path: 模型权重路径
+    :param cache_dir: 缓存根目录
+    :param conf: 跟踪置信度阈值，为 None 时使用 TRACK_CONF
+    :return: 录制完成的 DetectionCache
+    """
+    import cv2
+    from ultralytics import YOLO
+    from frame_reader import PrefetchFrameReader
+    from object_tracking import OBJ_LIST, TRACK_CONF, extract_detections
+
+    conf = TRACK_CONF if conf is None else conf
+    model = YOLO(model_path)
+    reader = PrefetchFrameReader(video_path)
+    key = tracking_cache_key(video_path, model_path, conf, OBJ_LIST)
+    writer = DetectionCacheWriter(key, cache_dir, video=os.path.basename(video_path), fps=reader.fps, conf=conf,
+                                  frame_width=int(reader.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                  frame_height=int(reader.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    try:
+        while True:
+            success, frame = reader.read()
+            if not success:
+                break
+            results = model.track(frame, persist=True, classes=OBJ_LIST, conf=conf, verbose=False)
+            writer.append(reader.frame_index, reader.timestamp, extract_detections(results[0]))
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        reader.release()
+    writer.close()
+    return DetectionCache(writer.path)
+
+
+if __name__ == "__main__":
+    from object_tracking import OBJ_LIST, TRACK_CONF
+
+    parser = argparse.ArgumentParser(description="检测结果录制/回放")
+    parser.add_argument("video", help="视频文件路径")
+    parser.add_argument("--model", default="best.pt", help="模型权重路径")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="缓存根目录")
+    args = parser.parse_args()
+
+    cache = DetectionCache.open(tracking_cache_key(args.video, args.model, TRACK_CONF, OBJ_LIST), args.cache_dir)
+    if cache is None:
+        print("未找到缓存，开始推理录制...")
+        cache = record(args.video, args.model, args.cache_dir)
+
+    start_time = time.time()
+    summary = replay(cache)
+    print(f"回放完成: {summary['frames']}帧, 用时{time.time() - start_time:.2f}s")
+    print(f"进入区域: {summary['count_passed']}, 离开区域: {summary['count_exited']}, "
+          f"警告: {len(summary['warned_ids'])}")
@@ -0,0 +1,171 @@
+import cv2
+import numpy as np
+
+# 各类别在警告区域内允许停留的时间（秒），未列出的类别不参与警告
+DWELL_THRESHOLDS = {0: 2.0, 2: 2.0}
+
+
+class DwellTimeEngine:
+    """
+    基于视频时间的区域停留时间引擎
+    作用：
+        代替 process_frame 中 entry_time[track_id] = time.time() 的墙上时钟计时。停留时间按视频时间
+        （源时间戳或 帧序号 / fps）计算，离线处理无论快于还是慢于实时，警告结果都与实时运行一致。
+    实现：
+        1. 所有区域预先栅格化为一张位掩码图（每个区域占一位，最多 8 个区域），
+           每帧所有目标的区域判断只需一次数组查表，不再逐个调用 cv2.pointPolygonTest
+        2. 目标状态（进入时间、最近在区域内的时间、最近出现时间）保存在按 ID 排序的数组中
+        3. 按 区域 × 类别 累计停留时长和进入次数
+        4. 每个类别可以设置不同的停留阈值
+    """
+    def __init__(self, zones, frame_size, thresholds=None, num_classes=5, fps=30,
+                 exit_grace=0.5, max_age=5.0):
+        """
+        :param zones: {区域名称: 多边形顶点数组}，最多 8 个区域
+        :param frame_size: 帧尺寸 (width, height)
+        :param thresholds: {类别: 停留阈值（秒）}，为 None 时使用 DWELL_THRESHOLDS
+        :param num_classes: 类别数量
+        :param fps: 只提供帧序号时用于换算视频时间的帧率
+        :param exit_grace: 离开区域超过该时长（秒）才清除进入时间，避免检测框抖动导致计时重置
+        :param max_age: 目标超过该时长（秒）未出现时清除其状态
+        """
+        if len(zones) > 8:
+            raise ValueError("DwellTimeEngine 最多支持 8 个区域")
+        self.zone_names = list(zones)
+        width, height = frame_size
+        self.zone_mask = np.zeros((height, width), dtype=np.uint8)
+        for bit, name in enumerate(self.zone_names):
+            layer = np.zeros((height, width), dtype=np.uint8)
+            cv2.fillPoly(layer, [np.asarray(zones[name], dtype=np.int32)], 1)
+            self.zone_mask |= layer << bit
+        self._bits = np.arange(len(self.zone_names), dtype=np.uint8)
+
+        self.num_classes = num_classes
+        self.thresholds = np.full(num_classes, np.inf)
+        for cls, seconds in (DWELL_THRESHOLDS if thresholds is None else thresholds).items():
+            self.thresholds[int(cls)] = seconds
+        self.fps = fps
+        self.exit_grace = exit_grace
+        self.max_age = max_age
+
+        zone_count = len(self.zone_names)
+        # 按 (区域, 类别) 统计的累计停留时长（秒）、进入次数和当前在区域内的目标数
+        self.dwell_totals = np.zeros((zone_count, num_classes), dtype=np.float64)
+        self.visits = np.zeros((zone_count, num_classes), dtype=np.int64)
+        self.occupancy = np.zeros((zone_count, num_classes), dtype=np.int64)
+        self.evicted = 0  # 因超过 max_age 未出现而被清除的目标数
+
+        self._ids = np.empty(0, dtype=np.int64)
+        self._entry = np.empty((0, zone_count), dtype=np.float64)  # 进入时间，不在区域内为 nan
+        self._last_inside = np.empty((0, zone_count), dtype=np.float64)
+        self._last_seen = np.empty(0, dtype=np.float64)
+        self._last_time = None
+
+    def zone_index(self, name):
+        """返回区域序号"""
+        return self.zone_names.index(name)
+
+    def _slots(self, ids, now):
+        """查找目标在状态数组中的位置，新目标插入后保持按 ID 排序"""
+        zone_count = len(self.zone_names)
+        new_ids = np.setdiff1d(ids, self._ids)
+        if len(new_ids) > 0:
+            self._ids = np.concatenate([self._ids, new_ids])
+            self._entry = np.concatenate([self._entry, np.full((len(new_ids), zone_count), np.nan)])
+            self._last_inside = np.concatenate([self._last_inside, np.full((len(new_ids), zone_count), np.nan)])
+            self._last_seen = np.concatenate([self._last_seen, np.full(len(new_ids), now)])
+            order = np.argsort(self._ids, kind='stable')
+            self._ids, self._entry = self._ids[order], self._entry[order]
+            self._last_inside, self._last_seen = self._last_inside[order], self._last_seen[order]
+        return np.searchsorted(self._ids, ids)
+
+    def update(self, track_ids, points, track_classes, timestamp=None, frame_index=None):
+        """
+        用当前帧的目标位置更新停留时间
+        :param track_ids: 当前帧各目标的 ID
+        :param points: 当前帧各目标用于区域判断的坐标，形状为 (N, 2)
+        :param track_classes: 当前帧各目标的类别
+        :param timestamp: 当前帧的视频时间（秒）
+        :param frame_index: 当前帧序号，未提供 timestamp 时按 frame_index / fps 计算视频时间
+        :return: (inside, dwell, exceeded)，形状均为 (N, 区域数)：是否在区域内、已停留秒数、是否超过类别阈值
+        """
+        now = float(timestamp) if timestamp is not None else frame_index / self.fps
+        step = 0.0 if self._last_time is None else max(0.0, now - self._last_time)
+        self._last_time = now
+
+        ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        classes = np.clip(np.asarray(track_classes, dtype=np.int64).reshape(-1), 0, self.num_classes - 1)
+
+        # 一次查表得到所有目标所在的区域
+        height, width = self.zone_mask.shape
+        xs = np.clip(points[:, 0].astype(np.int64), 0, width - 1)
+        ys = np.clip(points[:, 1].astype(np.int64), 0, height - 1)
+        inside = ((self.zone_mask[ys, xs][:, None] >> self._bits) & 1).astype(bool)
+
+        slots = self._slots(ids, now)
+        entry = self._entry[slots]
+        last_inside = self._last_inside[slots]
+
+        entering = inside & np.isnan(entry)
+        entry[entering] = now
+        last_inside[inside] = now
+        leaving = ~inside & ~np.isnan(entry) & (now - last_inside > self.exit_grace)
+        entry[leaving] = np.nan
+
+        self._entry[slots] = entry
+        self._last_inside[slots] = last_inside
+        self._last_seen[slots] = now
+
+        # 按 (区域, 类别) 累计
+        track_index, zone_index = np.nonzero(entering)
+        np.add.at(self.visits, (zone_index, classes[track_index]), 1)
+        track_index, zone_index = np.nonzero(inside)
+        np.add.at(self.dwell_totals, (zone_index, classes[track_index]), step)
+        self.occupancy[:] = 0
+        np.add.at(self.occupancy, (zone_index, classes[track_index]), 1)
+
+        dwell = np.where(np.isnan(entry), 0.0, now - entry)
+        exceeded = inside & (dwell > self.thresholds[classes][:, None])
+
+        # 清除长时间未出现的目标
+        alive = now - self._last_seen <= self.max_age
+        if not alive.all():
+            self.evicted += int((~alive).sum())
+            self._ids, self._entry = self._ids[alive], self._entry[alive]
+            self._last_inside, self._last_seen = self._last_inside[alive], self._last_seen[alive]
+
+        return inside, dwell, exceeded
+
+    def get_state(self):
+        """返回停留计时状态和累计统计（用于断点续处理）"""
+        return {'dwell_totals': self.dwell_totals, 'visits': self.visits, 'occupancy': self.occupancy,
+                'ids': self._ids, 'entry': self._entry, 'last_inside': self._last_inside,
+                'last_seen': self._last_seen, 'evicted': self.evicted, 'last_time': self._last_time}
+
+    def set_state(self, state):
+        """从 get_state 的结果恢复，区域数量或类别数不一致时抛出 ValueError"""
+        if np.shape(state['visits']) != self.visits.shape:
+            raise ValueError(f"停留区域配置与断点不一致: {np.shape(state['visits'])} != {self.visits.shape}")
+        zone_count = len(self.zone_names)
+        self.dwell_totals = np.array(state['dwell_totals'], dtype=np.float64)
+        self.visits = np.array(state['visits'], dtype=np.int64)
+        self.occupancy = np.array(state['occupancy'], dtype=np.int64)
+        self._ids = np.array(state['ids'], dtype=np.int64)
+        self._entry = np.array(state['entry'], dtype=np.float64).reshape(-1, zone_count)
+        self._last_inside = np.array(state['last_inside'], dtype=np.float64).reshape(-1, zone_count)
+        self._last_seen = np.array(state['last_seen'], dtype=np.float64)
+        self.evicted = int(state['evicted'])
+        self._last_time = None if state['last_time'] is None else float(state['last_time'])
+
+    def reset(self):
+        """清空所有状态和统计"""
+        zone_count = len(self.zone_names)
+        self.dwell_totals[:] = 0
+        self.visits[:] = 0
+        self.occupancy[:] = 0
+        self._ids = np.empty(0, dtype=np.int64)
+        self._entry = np.empty((0, zone_count), dtype=np.float64)
+        self._last_inside = np.empty((0, zone_count), dtype=np.float64)
+        self._last_seen = np.empty(0, dtype=np.float64)
+        self._last_time = None
@@ -0,0 +1,264 @@
+import queue
+import threading
+import time
+
+import cv2
+
+
+class PrefetchFrameReader:
+    """
+    预取式视频解码器
+    作用：
+        在独立线程中解码视频帧并放入有界缓冲区，主循环读取时无需等待解码，
+        解码耗时与推理耗时相互重叠。
+    跳帧与区间处理：
+        1. stride：每 stride 帧处理 1 帧
+        2. sample_fps：按目标帧率抽样（与 stride 二选一，同时给出时以 sample_fps 为准）
+        3. 不需要处理的帧只调用 grab() 推进解码位置，不调用 retrieve()，省去像素格式转换和拷贝
+        4. start_time / end_time（秒）：打开后直接定位到起始时间，到达结束时间后停止，
+           长视频可以只处理感兴趣的区间
+    接口与 cv2.VideoCapture 保持一致（read / get / isOpened / release），可直接替换。
+    """
+    def __init__(self, source, stride=1, sample_fps=None, start_time=None, end_time=None, buffer_size=8,
+                 start_frame=None):
+        """
+        :param source: 视频文件路径（或已打开的 cv2.VideoCapture）
+        :param stride: 处理间隔，1 表示处理每一帧
+        :param sample_fps: 抽样帧率，为 None 时使用 stride
+        :param start_time: 起始时间（秒），为 None 时从头开始
+        :param end_time: 结束时间（秒），为 None 时处理到视频结尾
+        :param buffer_size: 预取缓冲区可容纳的帧数
+        :param start_frame: 起始帧序号，提供时代替 start_time（如从断点继续处理）
+        """
+        self.capture = source if isinstance(source, cv2.VideoCapture) else cv2.VideoCapture(source)
+        self._opened = self.capture.isOpened()
+
+        # 在启动解码线程前读取视频属性，之后不再从主线程访问 capture
+        self.properties = {}
+        for prop in (cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT,
+                     cv2.CAP_PROP_FRAME_COUNT):
+            self.properties[prop] = self.capture.get(prop) if self._opened else 0
+        self.fps = self.properties[cv2.CAP_PROP_FPS] or 30
+        self.frame_count = int(self.properties[cv2.CAP_PROP_FRAME_COUNT])
+
+        # 处理间隔：按累计相位决定是否保留当前帧，支持非整数倍抽样
+        if sample_fps:
+            self.keep_ratio = min(1.0, sample_fps / self.fps)
+        else:
+            self.keep_ratio = 1.0 / max(1, int(stride))
+
+        if start_frame is not None:
+            self.start_frame = int(start_frame)
+        else:
+            self.start_frame = int(round(start_time * self.fps)) if start_time else 0
+        self.end_frame = int(round(end_time * self.fps)) if end_time is not None else None
+
+        self.frame_index = -1  # 最近一次 read() 返回帧的帧序号
+        self.timestamp = 0.0  # 最近一次 read() 返回帧的视频时间（秒）
+        self.frames_decoded = 0  # 完整解码（grab + retrieve）的帧数
+        self.frames_skipped = 0  # 只 grab 未解码的帧数
+
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._stop = threading.Event()
+        self._thread = None
+        if self._opened:
+            self._thread = threading.Thread(target=self._run, name='frame-reader', daemon=True)
+            self._thread.start()
+
+    def _seek(self):
+        """定位到起始帧，返回实际所在的帧序号"""
+        if self.start_frame <= 0:
+            return 0
+        self.capture.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+        position = int(self.capture.get(cv2.CAP_PROP_POS_FRAMES))
+        # 部分后端不支持按帧定位，此时退回到逐帧 grab
+        while position < self.start_frame:
+            if not self.capture.grab():
+                break
+            position += 1
+        return position
+
+    def _put(self, item):
+        """阻塞放入缓冲区，停止时立即返回"""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        """解码线程主循环"""
+        index = self._seek()
+        phase = 1.0  # 保证区间的第一帧总被处理
+        try:
+            while not self._stop.is_set():
+                if self.end_frame is not None and index >= self.end_frame:
+                    break
+
+                keep = phase >= 1.0
+                if keep:
+                    phase -= 1.0
+                phase += self.keep_ratio
+
+                if not self.capture.grab():
+                    break
+                if not keep:
+                    self.frames_skipped += 1
+                    index += 1
+                    continue
+
+                success, frame = self.capture.retrieve()
+                if not success:
+                    break
+                self.frames_decoded += 1
+                timestamp_ms = self.capture.get(cv2.CAP_PROP_POS_MSEC)
+                timestamp = timestamp_ms / 1000.0 if timestamp_ms > 0 else index / self.fps
+                if not self._put((index, timestamp, frame)):
+                    break
+                index += 1
+        finally:
+            self._put(None)
+
+    def read(self):
+        """
+        读取下一帧需要处理的帧（与 cv2.VideoCapture.read 接口一致）
+        :return: (success, frame)
+        """
+        if self._thread is None:
+            return False, None
+        item = self._queue.get()
+        if item is None:
+            # 保留结束标记，之后的 read() 仍然返回失败
+            self._thread = None
+            return False, None
+        self.frame_index, self.timestamp, frame = item
+        return True, frame
+
+    def get(self, prop):
+        """返回打开时缓存的视频属性"""
+        return self.properties.get(prop, 0)
+
+    def isOpened(self):
+        return self._opened
+
+    def release(self):
+        """停止解码线程并释放视频"""
+        self._stop.set()
+        if self._thread is not None:
+            # 清空缓冲区，避免解码线程阻塞在 put 上
+            while self._thread.is_alive():
+                try:
+                    self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._thread = None
+        self.capture.release()
+        self._opened = False
+
+
+class LatestFrameReader:
+    """
+    只保留最新帧的实时读取器（低延迟模式）
+    作用：
+        摄像头由 QTimer 定时读取时，处理速度一旦慢于摄像头帧率，帧就会堆积在驱动缓冲区中，
+        显示结果和警报会落后实际画面数秒。抓帧线程持续读取视频源，只保留最新的一帧，
+        read() 总是返回尚未处理过的最新帧，来不及处理的旧帧直接丢弃。
+    延迟统计：
+        每帧记录抓取时刻（capture_time，time.perf_counter()），处理完成后用 latency() 得到
+        从抓取到出结果的延迟。
+    接口与 cv2.VideoCapture 保持一致（read / get / isOpened / release），可直接替换。
+    """
+    def __init__(self, source, timeout=1.0):
+        """
+        :param source: 摄像头索引、视频流地址（或已打开的 cv2.VideoCapture）
+        :param timeout: read() 等待新帧的最长时间（秒），超时视为读取失败
+        """
+        self.capture = source if isinstance(source, cv2.VideoCapture) else cv2.VideoCapture(source)
+        self._opened = self.capture.isOpened()
+        self.timeout = timeout
+
+        # 在启动抓帧线程前读取属性，之后不再从主线程访问 capture
+        self.properties = {}
+        if self._opened:
+            # 部分后端支持缩小驱动缓冲区，进一步减少排队的旧帧
+            self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        for prop in (cv2.CAP_PROP_FPS, cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            self.properties[prop] = self.capture.get(prop) if self._opened else 0
+
+        self.frame_index = -1  # 最近一次 read() 返回帧的帧序号（按抓取顺序）
+        self.timestamp = 0.0  # 最近一次 read() 返回帧的抓取时间（time.time()）
+        self.capture_time = None  # 最近一次 read() 返回帧的抓取时刻（time.perf_counter()）
+        self.frames_grabbed = 0  # 抓取的帧数
+        self.frames_dropped = 0  # 被更新的帧覆盖、没有处理的帧数
+
+        self._latest = None  # (帧序号, 抓取时间, 抓取时刻, 帧)
+        self._finished = not self._opened
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        if self._opened:
+            self._thread = threading.Thread(target=self._run, name='latest-frame-reader', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """抓帧线程：持续读取，只保留最新一帧"""
+        index = 0
+        try:
+            while not self._stop.is_set():
+                success, frame = self.capture.read()
+                if not success:
+                    break
+                item = (index, time.time(), time.perf_counter(), frame)
+                with self._condition:
+                    if self._latest is not None:
+                        self.frames_dropped += 1
+                    self._latest = item
+                    self.frames_grabbed += 1
+                    self._condition.notify()
+                index += 1
+        finally:
+            with self._condition:
+                self._finished = True
+                self._condition.notify_all()
+
+    def read(self):
+        """
+        读取最新的一帧，没有新帧时最多等待 timeout 秒
+        :return: (success, frame)
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._latest is not None or self._finished, self.timeout):
+                return False, None
+            if self._latest is None:
+                return False, None
+            item, self._latest = self._latest, None
+        self.frame_index, self.timestamp, self.capture_time, frame = item
+        return True, frame
+
+    @property
+    def finished(self):
+        """抓帧线程已经退出（视频源断开或读取结束）且没有未读的帧，之后的 read() 都会立即失败"""
+        with self._condition:
+            return self._finished and self._latest is None
+
+    def latency(self):
+        """最近一次 read() 返回的帧从抓取到现在的时间（秒）"""
+        return time.perf_counter() - self.capture_time if self.capture_time is not None else None
+
+    def get(self, prop):
+        """返回打开时缓存的属性"""
+        return self.properties.get(prop, 0)
+
+    def isOpened(self):
+        return self._opened
+
+    def release(self):
+        """停止抓帧线程并释放视频源"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        self.capture.release()
+        self._opened = False
@@ -0,0 +1,160 @@
+import numpy as np
+
+# 穿越方向：0 表示从计数线左侧到右侧（沿 起点→终点 方向看），1 表示反方向
+DIRECTION_NAMES = ('forward', 'backward')
+
+
+class LineCrossingCounter:
+    """
+    方向感知的虚拟计数线
+    作用：
+        代替基于多边形进出（entered_ids）的计数方式。每帧把所有目标上一帧到当前帧的位移向量
+        与所有计数线一次性做向量化的线段相交判断，得到按 计数线 × 方向 × 类别 统计的过线数量。
+    状态：
+        所有目标的状态保存在按 ID 排序的 numpy 数组中（位置、最近出现帧、已计数标记），
+        同一目标对同一计数线的同一方向只计数一次，目标在线附近抖动或 ID 切换都不会重复计数。
+    """
+    def __init__(self, lines, num_classes=5, max_age=30):
+        """
+        :param lines: 计数线列表，每项为 {'name': 名称, 'points': [[x1, y1], [x2, y2]]}
+        :param num_classes: 类别数量
+        :param max_age: 目标连续多少帧未出现后清除其状态
+        """
+        self.lines = [dict(line) for line in lines]
+        self.names = [line.get('name', f'line{i}') for i, line in enumerate(self.lines)]
+        points = np.array([line['points'] for line in self.lines], dtype=np.float32).reshape(-1, 2, 2)
+        self.starts = points[:, 0]  # (L, 2)
+        self.vectors = points[:, 1] - points[:, 0]  # (L, 2)
+        self.num_classes = num_classes
+        self.max_age = max_age
+
+        # 计数结果：(计数线, 方向, 类别)
+        self.counts = np.zeros((len(self.lines), 2, num_classes), dtype=np.int64)
+
+        # 目标状态数组，按 ID 升序排列
+        self._ids = np.empty(0, dtype=np.int64)
+        self._positions = np.empty((0, 2), dtype=np.float32)
+        self._last_seen = np.empty(0, dtype=np.int64)
+        self._counted = np.empty((0, len(self.lines), 2), dtype=bool)
+        self._frame = 0
+
+    def update(self, track_ids, positions, track_classes):
+        """
+        用当前帧的目标位置更新计数
+        :param track_ids: 当前帧各目标的 ID
+        :param positions: 当前帧各目标的位置（与区域判断相同的参考点，见 object_tracking.anchor_points），形状为 (N, 2)
+        :param track_classes: 当前帧各目标的类别
+        :return: 本帧新增的过线事件列表 [(计数线名称, track_id, 类别, 方向名称), ...]
+        """
+        self._frame += 1
+        ids = np.asarray(track_ids, dtype=np.int64).reshape(-1)
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+        classes = np.asarray(track_classes, dtype=np.int64).reshape(-1)
+
+        events = []
+        if len(ids) > 0 and len(self._ids) > 0 and len(self.lines) > 0:
+            slots = np.minimum(np.searchsorted(self._ids, ids), len(self._ids) - 1)
+            known = self._ids[slots] == ids
+            slots = slots[known]
+            prev = self._positions[slots]  # (T, 2)
+            curr = positions[known]  # (T, 2)
+            moves = curr - prev  # (T, 2)
+
+            # 起点和终点相对计数线的位置：叉积符号表示在计数线的哪一侧，形状为 (T, L)
+            side_prev = self._cross(self.vectors[None], prev[:, None] - self.starts[None]) >= 0
+            side_curr = self._cross(self.vectors[None], curr[:, None] - self.starts[None]) >= 0
+            # 计数线两个端点相对位移向量的位置，两端异侧说明交点落在计数线线段内
+            end_a = self._cross(moves[:, None], self.starts[None] - prev[:, None])
+            end_b = self._cross(moves[:, None], self.starts[None] + self.vectors[None] - prev[:, None])
+            crossed = (side_prev != side_curr) & (end_a * end_b <= 0)
+
+            # 叉积由负变为非负（图像坐标系中从计数线左侧到右侧）记为 forward
+            direction = np.where(side_curr, 0, 1)
+            track_index, line_index = np.nonzero(crossed)
+            if len(track_index) > 0:
+                dirs = direction[track_index, line_index]
+                state_slots = slots[track_index]
+                fresh = ~self._counted[state_slots, line_index, dirs]
+                track_index, line_index, dirs, state_slots = (
+                    track_index[fresh], line_index[fresh], dirs[fresh], state_slots[fresh])
+                self._counted[state_slots, line_index, dirs] = True
+
+                cls = np.clip(classes[known][track_index], 0, self.num_classes - 1)
+                np.add.at(self.counts, (line_index, dirs, cls), 1)
+                crossed_ids = ids[known][track_index]
+                for line, track_id, track_class, d in zip(line_index, crossed_ids, cls, dirs):
+                    events.append((self.names[line], int(track_id), int(track_class), DIRECTION_NAMES[d]))
+
+        self._store(ids, positions)
+        return events
+
+    @staticmethod
+    def _cross(a, b):
+        """二维叉积，支持广播"""
+        return a[..., 0] * b[..., 1] - a[..., 1] * b[..., 0]
+
+    def _store(self, ids, positions):
+        """更新目标位置，加入新目标并清除过期目标"""
+        if len(ids) > 0:
+            slots = np.minimum(np.searchsorted(self._ids, ids), max(len(self._ids) - 1, 0))
+            known = (self._ids[slots] == ids) if len(self._ids) > 0 else np.zeros(len(ids), dtype=bool)
+            self._positions[slots[known]] = positions[known]
+            self._last_seen[slots[known]] = self._frame
+
+            new = ~known
+            if new.any():
+                self._ids = np.concatenate([self._ids, ids[new]])
+                self._positions = np.concatenate([self._positions, positions[new]])
+                self._last_seen = np.concatenate([self._last_seen, np.full(new.sum(), self._frame)])
+                self._counted = np.concatenate(
+                    [self._counted, np.zeros((new.sum(), len(self.lines), 2), dtype=bool)])
+
+        alive = self._frame - self._last_seen <= self.max_age
+        order = np.argsort(self._ids[alive], kind='stable')
+        self._ids = self._ids[alive][order]
+        self._positions = self._positions[alive][order]
+        self._last_seen = self._last_seen[alive][order]
+        self._counted = self._counted[alive][order]
+
+    def get_state(self):
+        """返回计数和目标状态（用于断点续处理）"""
+        return {'counts': self.counts, 'ids': self._ids, 'positions': self._positions,
+                'last_seen': self._last_seen, 'counted': self._counted, 'frame': self._frame}
+
+    def set_state(self, state):
+        """从 get_state 的结果恢复计数和目标状态，计数线数量或类别数不一致时抛出 ValueError"""
+        if np.shape(state['counts']) != self.counts.shape:
+            raise ValueError(f"计数线配置与断点不一致: {np.shape(state['counts'])} != {self.counts.shape}")
+        self.counts = np.array(state['counts'], dtype=np.int64)
+        self._ids = np.array(state['ids'], dtype=np.int64)
+        self._positions = np.array(state['positions'], dtype=np.float32).reshape(-1, 2)
+        self._last_seen = np.array(state['last_seen'], dtype=np.int64)
+        self._counted = np.array(state['counted'], dtype=bool).reshape(-1, len(self.lines), 2)
+        self._frame = int(state['frame'])
+
+    def reset(self):
+        """清空计数和目标状态"""
+        self.counts[:] = 0
+        self._ids = self._ids[:0]
+        self._positions = self._positions[:0]
+        self._last_seen = self._last_seen[:0]
+        self._counted = self._counted[:0]
+        self._frame = 0
+
+    def get_counts(self):
+        """
+        返回按计数线和方向汇总的结果
+        :return: {计数线名称: {'forward': {类别: 数量}, 'backward': {类别: 数量}}}
+        """
+        summary = {}
+        for i, name in enumerate(self.names):
+            summary[name] = {
+                direction: {cls: int(n) for cls, n in enumerate(self.counts[i, d]) if n > 0}
+                for d, direction in enumerate(DIRECTION_NAMES)
+            }
+        return summary
+
+    def get_totals(self):
+        """返回每条计数线两个方向的总数 {计数线名称: (forward, backward)}"""
+        totals = self.counts.sum(axis=2)
+        return {name: (int(totals[i, 0]), int(totals[i, 1])) for i, name in enumerate(self.names)}
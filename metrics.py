@@ -0,0 +1,288 @@
+"""
+运行指标（Prometheus 文本格式，仅依赖标准库）
+所有指标带 stream 标签，同一进程中的多路视频共享一个注册表，
+由 MonitorServer 的 /metrics 接口输出，可以直接被 Prometheus 抓取。
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 阶段耗时直方图的分桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+# 数据库写入延迟的分桶（秒）
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 数据库批量写入条数的分桶
+BATCH_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return "{" + ",".join(f'{n}="{v}"' for (n, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    """指标基类：按标签值保存子指标"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames, lock):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+        self._children = {}
+
+    def labels(self, **labels):
+        """返回指定标签值的子指标，不存在时创建"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+        return child
+
+    def remove(self, **labels):
+        """删除指定标签值的子指标（视频流结束时使用）"""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._children.pop(key, None)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, child in self._children.items():
+                lines.extend(child.render(self.name, self.labelnames, key))
+        return lines
+
+
+class _Value:
+    def __init__(self, lock):
+        self._lock = lock
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value):
+        """直接设置数值（用于仪表；计数器只能用 inc() 增加，保证单调递增）"""
+        with self._lock:
+            self.value = float(value)
+
+    def render(self, name, labelnames, key):
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value(self._lock)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value(self._lock)
+
+
+class _HistogramValue:
+    def __init__(self, lock, buckets):
+        self._lock = lock
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+
+    def render(self, name, labelnames, key):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, [('le', _format_value(bound))])} "
+                         f"{cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(self.total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames, lock, buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self._lock, self.buckets)
+
+
+class MetricsRegistry:
+    """指标注册表，同名指标只创建一次"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, threading.Lock(), **kwargs)
+        return metric
+
+    def counter(self, name, documentation, labelnames=('stream',)):
+        return self._get(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=('stream',)):
+        return self._get(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=('stream',), buckets=LATENCY_BUCKETS):
+        return self._get(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """输出 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共享的默认注册表
+REGISTRY = MetricsRegistry()
+
+
+class PipelineMetrics:
+    """
+    单路视频流的处理指标
+    使用：
+        metrics = PipelineMetrics(stream="car_test3.mp4")
+        with metrics.stage('detect'):
+            ...
+        metrics.frame_done(active_tracks=len(ids))
+    """
+    STAGES = ('read', 'detect', 'process', 'encode', 'display')
+
+    def __init__(self, stream, registry=REGISTRY):
+        """
+        :param stream: 视频流名称，作为所有指标的 stream 标签
+        :param registry: 指标注册表
+        """
+        self.stream = stream
+        self.registry = registry
+        self._frames_processed = registry.counter(
+            "traffic_frames_processed_total", "已处理的帧数").labels(stream=stream)
+        self._frames_dropped = registry.counter(
+            "traffic_frames_dropped_total", "被丢弃的帧数（encoder: 编码队列满，monitor: 远程观看跳帧，live: 实时模式来不及处理的旧帧）",
+            ('stream', 'reason'))
+        self._stage_latency = registry.histogram(
+            "traffic_stage_latency_seconds", "各处理阶段的耗时（秒）", ('stream', 'stage'))
+        self._stage_children = {name: self._stage_latency.labels(stream=stream, stage=name) for name in self.STAGES}
+        self._active_tracks = registry.gauge("traffic_active_tracks", "当前帧的跟踪目标数").labels(stream=stream)
+        self._evicted_tracks = registry.counter(
+            "traffic_evicted_tracks_total", "因长时间未出现而被清除的目标数").labels(stream=stream)
+        self._capture_latency = registry.histogram(
+            "traffic_capture_latency_seconds", "从抓取帧到得出结果的延迟（秒，实时模式）").labels(stream=stream)
+        self._inference_skipped = registry.counter(
+            "traffic_inference_skipped_total", "运动门控跳过推理的帧数").labels(stream=stream)
+        self._alert_queue = registry.gauge(
+            "traffic_alert_queue_depth", "等待播放的语音警报数").labels(stream=stream)
+        self._encoder_backlog = registry.gauge(
+            "traffic_encoder_backlog", "编码队列中等待写入的帧数").labels(stream=stream)
+        self._db_write_lag = registry.histogram(
+            "traffic_db_write_lag_seconds", "统计数据产生到写入数据库的延迟（秒）",
+            buckets=LAG_BUCKETS).labels(stream=stream)
+        self._db_batch_size = registry.histogram(
+            "traffic_db_write_batch_size", "每次写入数据库的记录条数",
+            buckets=BATCH_BUCKETS).labels(stream=stream)
+        # 上次同步时各组件的累计值。组件每次处理都会重新创建，同一视频流的计数器子项却会复用，
+        # 因此只把两次同步之间的增量加到计数器上，避免再次处理同一视频时计数器倒退
+        self._synced = {}
+
+    @contextmanager
+    def stage(self, name):
+        """统计一个处理阶段的耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(name, time.perf_counter() - start)
+
+    def observe_stage(self, name, seconds):
+        child = self._stage_children.get(name)
+        if child is None:
+            child = self._stage_children[name] = self._stage_latency.labels(stream=self.stream, stage=name)
+        child.observe(seconds)
+
+    def frame_done(self, active_tracks):
+        """一帧处理完成"""
+        self._frames_processed.inc()
+        self._active_tracks.set(active_tracks)
+
+    def baseline_totals(self, **totals):
+        """
+        记录跨多次处理保留的组件（如监控服务）当前的累计值，之后只统计新增的部分
+        :param totals: 与 sync_totals 相同的参数
+        """
+        self._synced.update({name: total for name, total in totals.items() if total is not None})
+
+    def _sync(self, name, total, child=None, reason=None):
+        """
+        把组件累计值相对上次同步的增量加到计数器上；累计值变小说明组件已重新创建，从 0 开始计算
+        :param child: 计数器子项，为 None 时使用 traffic_frames_dropped_total 中 reason 对应的子项
+        """
+        if total is None:
+            return
+        if child is None:
+            child = self._frames_dropped.labels(stream=self.stream, reason=reason)
+        previous = self._synced.get(name, 0)
+        delta = total - previous if total >= previous else total
+        self._synced[name] = total
+        if delta > 0:
+            child.inc(delta)
+
+    def sync_totals(self, evicted_tracks=None, encoder_dropped=None, monitor_skipped=None, inference_skipped=None,
+                    live_dropped=None):
+        """同步其他组件中已有的累计值（按增量累加，计数器不会倒退）"""
+        self._sync('evicted_tracks', evicted_tracks, self._evicted_tracks)
+        self._sync('encoder_dropped', encoder_dropped, reason='encoder')
+        self._sync('monitor_skipped', monitor_skipped, reason='monitor')
+        self._sync('inference_skipped', inference_skipped, self._inference_skipped)
+        self._sync('live_dropped', live_dropped, reason='live')
+
+    def set_queue_depths(self, alert_queue=None, encoder_backlog=None):
+        if alert_queue is not None:
+            self._alert_queue.set(alert_queue)
+        if encoder_backlog is not None:
+            self._encoder_backlog.set(encoder_backlog)
+
+    def observe_capture_latency(self, seconds):
+        """记录一帧从抓取到得出结果的延迟"""
+        self._capture_latency.observe(seconds)
+
+    def observe_db_write(self, lag_seconds, batch_size):
+        """记录一次数据库写入"""
+        self._db_write_lag.observe(lag_seconds)
+        self._db_batch_size.observe(batch_size)
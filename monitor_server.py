@@ -0,0 +1,355 @@
+"""
+本地监控服务（仅依赖标准库和 OpenCV）
+在后台线程中运行 asyncio 事件循环，提供：
+    /              简单的监控页面
+    /stream        标注后画面的 MJPEG 流
+    /snapshot.jpg  最新一帧
+    /stats         最新统计信息（JSON）
+    /ws            WebSocket，推送实时统计和警告事件
+    /metrics       运行指标（Prometheus 文本格式，需要提供指标注册表）
+每帧只做一次 JPEG 编码（在线程池中进行），编码结果由所有客户端共享；
+每个客户端独立发送，慢客户端只会跳过中间帧，不会拖慢检测流程。
+
+启用方式：
+    python traffic_detection_system.py --monitor-port 8765
+    或设置环境变量 TRAFFIC_MONITOR_PORT=8765
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+
+import cv2
+
+# 启用监控服务的环境变量，值为监听端口
+MONITOR_PORT_ENV = "TRAFFIC_MONITOR_PORT"
+# WebSocket 握手使用的固定 GUID（RFC 6455）
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>智慧交通检测系统 - 实时监控</title></head>
+<body style="font-family: 'Microsoft YaHei'; background: #f8f9fa; color: #343a40;">
+<h3>实时画面</h3>
+<img src="/stream" style="max-width: 960px; width: 100%;">
+<h3>实时统计</h3>
+<pre id="stats"></pre>
+<h3>警告</h3>
+<pre id="events"></pre>
+<script>
+const ws = new WebSocket("ws://" + location.host + "/ws");
+ws.onmessage = (e) => {
+    const msg = JSON.parse(e.data);
+    if (msg.type === "stats") {
+        document.getElementById("stats").textContent = JSON.stringify(msg.data, null, 2);
+    } else {
+        const box = document.getElementById("events");
+        box.textContent = "[" + msg.time + "] " + msg.message + "\\n" + box.textContent;
+    }
+};
+</script>
+</body></html>
+"""
+
+
+class MonitorServer:
+    """
+    本地 HTTP / WebSocket 监控服务
+    使用：
+        monitor = MonitorServer(port=8765)
+        monitor.start()
+        monitor.publish_frame(annotated_frame)  # 没有观看者时立即返回
+        monitor.publish_stats({...})
+        monitor.publish_event("警告：...")
+        monitor.stop()
+    publish_* 可以在任意线程调用，只把数据交给事件循环，不做任何阻塞操作。
+    """
+    def __init__(self, host="127.0.0.1", port=8765, jpeg_quality=80, max_buffer=1024 * 1024,
+                 event_queue_size=100, metrics_registry=None):
+        """
+        :param host: 监听地址，默认只监听本机
+        :param port: 监听端口
+        :param jpeg_quality: MJPEG 的 JPEG 压缩质量
+        :param max_buffer: 每个客户端的发送缓冲上限（字节），超过后该客户端跳过新帧直到缓冲排空
+        :param event_queue_size: 每个 WebSocket 客户端的消息队列长度，队列满时丢弃最旧的消息
+        :param metrics_registry: 指标注册表（metrics.MetricsRegistry），提供时启用 /metrics
+        """
+        self.host = host
+        self.port = port
+        self.jpeg_quality = jpeg_quality
+        self.max_buffer = max_buffer
+        self.event_queue_size = event_queue_size
+
+        # 路径 → 处理函数，处理函数签名为 handler(reader, writer, headers)
+        self.routes = {
+            '/': self._serve_index,
+            '/stream': self._serve_mjpeg,
+            '/snapshot.jpg': self._serve_snapshot,
+            '/stats': self._serve_stats,
+            '/ws': self._serve_websocket,
+        }
+        self.metrics_registry = metrics_registry
+        if metrics_registry is not None:
+            self.routes['/metrics'] = self._serve_metrics
+
+        self.loop = None
+        self.thread = None
+        self.error = None
+        self._started = threading.Event()
+
+        # 以下状态只在事件循环线程中修改
+        self.mjpeg_clients = 0
+        self.ws_clients = set()
+        self._jpeg = None
+        self._frame_seq = 0
+        self._frame_event = None
+        self._pending_frame = None
+        self._encoding = False
+        self._stats = {}
+
+        # 运行统计
+        self.frames_encoded = 0
+        self.frames_skipped = 0  # 所有 MJPEG 客户端因发送过慢而跳过的帧数之和
+        self.messages_dropped = 0  # 所有 WebSocket 客户端因队列满而丢弃的消息数之和
+
+    @property
+    def has_viewers(self):
+        """是否有客户端正在观看画面"""
+        return self.mjpeg_clients > 0
+
+    def start(self):
+        """在后台线程中启动服务，返回是否启动成功"""
+        self.thread = threading.Thread(target=self._run, name="monitor-server", daemon=True)
+        self.thread.start()
+        self._started.wait(timeout=5)
+        return self.error is None and self.loop is not None
+
+    def stop(self):
+        """停止服务并等待后台线程退出"""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+            self.thread = None
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            self._frame_event = asyncio.Event()
+            server = loop.run_until_complete(asyncio.start_server(self._handle_client, self.host, self.port))
+        except Exception as e:
+            self.error = e
+            print(f"监控服务启动失败: {e}")
+            loop.close()
+            self._started.set()
+            return
+
+        self.loop = loop
+        self._started.set()
+        try:
+            loop.run_forever()
+        finally:
+            server.close()
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(server.wait_closed())
+            loop.close()
+            self.loop = None
+
+    # ---------- 供处理线程调用的接口 ----------
+
+    def publish_frame(self, frame):
+        """提交一帧标注后的画面；没有观看者时不做任何处理"""
+        if self.loop is None or frame is None or not self.has_viewers:
+            return
+        self.loop.call_soon_threadsafe(self._submit_frame, frame)
+
+    def publish_stats(self, stats):
+        """推送最新统计信息"""
+        if self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(self._update_stats, dict(stats))
+
+    def publish_event(self, message, **fields):
+        """推送一条警告/日志事件"""
+        if self.loop is None:
+            return
+        event = dict(fields, type='warning', message=message, time=time.strftime("%H:%M:%S"))
+        self.loop.call_soon_threadsafe(self._broadcast, event)
+
+    # ---------- 事件循环线程内部 ----------
+
+    def _submit_frame(self, frame):
+        # 编码期间到达的帧只保留最新一帧
+        self._pending_frame = frame
+        if not self._encoding:
+            self._encoding = True
+            self.loop.create_task(self._encode_pending())
+
+    async def _encode_pending(self):
+        try:
+            while self._pending_frame is not None:
+                frame, self._pending_frame = self._pending_frame, None
+                success, buffer = await self.loop.run_in_executor(
+                    None, cv2.imencode, '.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                if success:
+                    self._jpeg = buffer.tobytes()
+                    self._frame_seq += 1
+                    self.frames_encoded += 1
+                    # 唤醒所有等待新帧的客户端
+                    event, self._frame_event = self._frame_event, asyncio.Event()
+                    event.set()
+        finally:
+            self._encoding = False
+
+    def _update_stats(self, stats):
+        self._stats = stats
+        self._broadcast({'type': 'stats', 'data': stats})
+
+    def _broadcast(self, message):
+        # 每条消息只序列化一次，所有客户端共享
+        payload = self._ws_frame(json.dumps(message, ensure_ascii=False, default=str).encode('utf-8'))
+        for queue in self.ws_clients:
+            if queue.full():
+                queue.get_nowait()
+                self.messages_dropped += 1
+            queue.put_nowait(payload)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.decode('latin-1').split("\r\n")
+            method, target, _ = lines[0].split(" ", 2)
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            handler = self.routes.get(target.split("?", 1)[0])
+            if method != "GET":
+                await self._send_response(writer, 405, b"Method Not Allowed", "text/plain")
+            elif handler is None:
+                await self._send_response(writer, 404, b"Not Found", "text/plain")
+            else:
+                await handler(reader, writer, headers)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.CancelledError,
+                ConnectionError, ValueError):
+            # 客户端断开或服务停止
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send_response(writer, status, body, content_type):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}.get(status, "")
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n"
+                     .encode('latin-1') + body)
+        await writer.drain()
+
+    async def _serve_index(self, reader, writer, headers):
+        await self._send_response(writer, 200, INDEX_HTML.encode('utf-8'), "text/html; charset=utf-8")
+
+    async def _serve_stats(self, reader, writer, headers):
+        body = json.dumps(self._stats, ensure_ascii=False, default=str).encode('utf-8')
+        await self._send_response(writer, 200, body, "application/json; charset=utf-8")
+
+    async def _serve_metrics(self, reader, writer, headers):
+        body = self.metrics_registry.render().encode('utf-8')
+        await self._send_response(writer, 200, body, "text/plain; version=0.0.4; charset=utf-8")
+
+    async def _serve_snapshot(self, reader, writer, headers):
+        if self._jpeg is None:
+            await self._send_response(writer, 503, b"No frame yet", "text/plain")
+        else:
+            await self._send_response(writer, 200, self._jpeg, "image/jpeg")
+
+    async def _serve_mjpeg(self, reader, writer, headers):
+        writer.transport.set_write_buffer_limits(high=self.max_buffer)
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: multipart/x-mixed-replace; boundary=frame\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        self.mjpeg_clients += 1
+        try:
+            seq = self._frame_seq if self._jpeg is None else self._frame_seq - 1
+            while True:
+                event = self._frame_event
+                if self._frame_seq == seq:
+                    await event.wait()
+                    continue
+                # 上一次发送期间到达的帧直接跳过，只发送最新一帧
+                self.frames_skipped += max(0, self._frame_seq - seq - 1)
+                seq, jpeg = self._frame_seq, self._jpeg
+                writer.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                             + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                await writer.drain()
+        finally:
+            self.mjpeg_clients -= 1
+
+    async def _serve_websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key')
+        if key is None or 'websocket' not in headers.get('upgrade', '').lower():
+            await self._send_response(writer, 400, b"Bad Request", "text/plain")
+            return
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+
+        queue = asyncio.Queue(maxsize=self.event_queue_size)
+        if self._stats:
+            queue.put_nowait(self._ws_frame(json.dumps({'type': 'stats', 'data': self._stats},
+                                                       ensure_ascii=False, default=str).encode('utf-8')))
+        self.ws_clients.add(queue)
+        sender = self.loop.create_task(self._ws_sender(writer, queue))
+        try:
+            # 读取客户端帧，只处理 ping 和 close
+            while not sender.done():
+                opcode, payload = await self._ws_read(reader)
+                if opcode == 0x8:
+                    break
+                if opcode == 0x9:
+                    writer.write(self._ws_frame(payload, opcode=0xA))
+        finally:
+            self.ws_clients.discard(queue)
+            sender.cancel()
+
+    @staticmethod
+    async def _ws_sender(writer, queue):
+        while True:
+            payload = await queue.get()
+            writer.write(payload)
+            await writer.drain()
+
+    @staticmethod
+    async def _ws_read(reader):
+        """读取一个客户端帧，返回 (opcode, payload)"""
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", await reader.readexactly(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", await reader.readexactly(8))[0]
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(length)
+        if mask is not None:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return first & 0x0F, payload
+
+    @staticmethod
+    def _ws_frame(payload, opcode=0x1):
+        """构造一个不分片、不加掩码的服务端帧"""
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        return header + payload
@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    运动门控
+    作用：
+        夜间和平峰时段摄像头大部分时间对着空旷的道路，每帧仍然做完整的 YOLO 推理。
+        运动门控在缩小的灰度图上只对区域 ROI 做帧差分，场景中没有运动且没有跟踪目标时跳过推理，
+        只按心跳间隔偶尔推理一次（发现静止进入的目标），一旦检测到运动，当前帧立即恢复推理。
+    实现：
+        1. 帧缩小到宽 width 像素再转灰度，差分的开销与原始分辨率无关
+        2. 与参考帧做差分，参考帧每隔 reference_interval 秒更新一次：缓慢的光照变化和停下的车辆
+           很快被吸收，目标驶离后也不会像滑动平均背景那样留下残影
+        3. 只统计区域掩码内变化的像素，区域外的树叶、行人道等不会唤醒推理
+    """
+    def __init__(self, zones, frame_size, width=160, threshold=25, min_fraction=0.002,
+                 reference_interval=0.2, heartbeat=2.0, hold=1.0):
+        """
+        :param zones: 需要监视的区域多边形列表（原始帧坐标）
+        :param frame_size: 帧尺寸 (width, height)
+        :param width: 差分使用的缩小宽度（像素）
+        :param threshold: 灰度差超过该值的像素视为变化
+        :param min_fraction: 变化像素占区域面积的比例超过该值时视为有运动
+        :param reference_interval: 参考帧的更新间隔（秒）
+        :param heartbeat: 没有运动时的推理间隔（秒）
+        :param hold: 运动消失后继续推理的时长（秒），避免目标减速时立刻停止推理
+        """
+        frame_width, frame_height = frame_size
+        self.scale = width / frame_width
+        self.size = (width, max(1, int(round(frame_height * self.scale))))
+        self.mask = np.zeros((self.size[1], self.size[0]), dtype=np.uint8)
+        for zone in zones:
+            points = np.round(np.asarray(zone, dtype=np.float32).reshape(-1, 2) * self.scale).astype(np.int32)
+            cv2.fillPoly(self.mask, [points], 1)
+        self.mask = self.mask.astype(bool)
+        self.zone_pixels = max(1, int(self.mask.sum()))
+        self.threshold = threshold
+        self.min_fraction = min_fraction
+        self.reference_interval = reference_interval
+        self.heartbeat = heartbeat
+        self.hold = hold
+
+        self.reference = None
+        self.reference_time = None
+        self.last_motion = None
+        self.last_inference = None
+        self.motion = 0.0  # 最近一帧区域内变化像素的比例
+        self.frames_checked = 0
+        self.frames_skipped = 0
+
+    @property
+    def signature(self):
+        """影响推理结果的参数（用于检测缓存的键）"""
+        return [self.size[0], self.threshold, self.min_fraction, self.reference_interval, self.heartbeat, self.hold]
+
+    def measure(self, frame, timestamp):
+        """
+        返回区域内相对参考帧变化的像素比例，并按间隔更新参考帧
+        :param frame: BGR 帧图像
+        :param timestamp: 当前帧时间（秒）
+        """
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        if self.reference is None:
+            # 第一帧没有参考帧，由 should_infer 保证推理
+            self.reference, self.reference_time = gray, timestamp
+            return 0.0
+        changed = cv2.absdiff(gray, self.reference) > self.threshold
+        if timestamp - self.reference_time >= self.reference_interval:
+            self.reference, self.reference_time = gray, timestamp
+        return float(np.count_nonzero(changed & self.mask)) / self.zone_pixels
+
+    def should_infer(self, frame, timestamp, active_tracks=0):
+        """
+        判断当前帧是否需要推理
+        :param frame: BGR 帧图像
+        :param timestamp: 当前帧时间（秒）
+        :param active_tracks: 上一次推理得到的跟踪目标数，有目标时始终推理
+        :return: 是否需要推理
+        """
+        self.frames_checked += 1
+        self.motion = self.measure(frame, timestamp)
+        if self.motion >= self.min_fraction:
+            self.last_motion = timestamp
+
+        infer = (active_tracks > 0
+                 or (self.last_motion is not None and timestamp - self.last_motion <= self.hold)
+                 or self.last_inference is None
+                 or timestamp - self.last_inference >= self.heartbeat)
+        if infer:
+            self.last_inference = timestamp
+        else:
+            self.frames_skipped += 1
+        return infer
+
+    def get_state(self):
+        """返回参考帧和计时状态（用于断点续处理）"""
+        state = {'reference_time': self.reference_time, 'last_motion': self.last_motion,
+                 'last_inference': self.last_inference, 'motion': self.motion,
+                 'frames_checked': self.frames_checked, 'frames_skipped': self.frames_skipped}
+        if self.reference is not None:
+            state['reference'] = self.reference
+        return state
+
+    def set_state(self, state):
+        """从 get_state 的结果恢复，差分尺寸不一致时丢弃参考帧（下一帧重新建立）"""
+        reference = state.get('reference')
+        if reference is not None and reference.shape == (self.size[1], self.size[0]):
+            self.reference = np.array(reference, dtype=np.uint8)
+            self.reference_time = state['reference_time']
+        else:
+            self.reference = None
+            self.reference_time = None
+        self.last_motion = state['last_motion']
+        self.last_inference = state['last_inference']
+        self.motion = float(state['motion'])
+        self.frames_checked = int(state['frames_checked'])
+        self.frames_skipped = int(state['frames_skipped'])
+
+    @property
+    def skip_ratio(self):
+        """被跳过推理的帧比例"""
+        return self.frames_skipped / self.frames_checked if self.frames_checked else 0.0
+
+    def reset(self):
+        """清空参考帧和计时状态（如切换视频源或跳转后）"""
+        self.reference = None
+        self.reference_time = None
+        self.last_motion = None
+        self.last_inference = None
+        self.motion = 0.0
@@ -2,6 +2,7 @@ import cv2
 import numpy as np
 from collections import defaultdict
 import time
+import lap
 from voice_alert import play_voice_alert
 import os
 
@@ -30,17 +31,73 @@ def calculate_iou(box1, box2):
     return intersection_area / float(box1_area + box2_area - intersection_area) if (box1_area + box2_area) > 0 else 0
 
 
+def xywh_to_xyxy(boxes):
+    """
+    将中心点格式的检测框 (cx, cy, w, h)（即 boxes.xywh）转换为角点格式 (x1, y1, x2, y2)。
+    :param boxes: 检测框数组，形状为 (N, 4)
+    :return: 角点格式的检测框数组，形状为 (N, 4)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    half = boxes[:, 2:] / 2
+    return np.concatenate([boxes[:, :2] - half, boxes[:, :2] + half], axis=1)
+
+
+def anchor_points(boxes):
+    """
+    计算区域判断、停留计时、警报和计数线共用的目标参考点 (x + w/2, y + h/2)。
+    检测框是中心点格式，这个点实际是检测框的右下角；统计区域、警告区域和计数线都是按这个参考点标定的，
+    因此所有判断统一使用它，而不是检测框中心（轨迹 track_history 仍记录检测框中心，只用于绘制）。
+    :param boxes: 中心点格式的检测框数组，形状为 (N, 4)
+    :return: 参考点数组，形状为 (N, 2)
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return boxes[:, :2] + boxes[:, 2:] / 2
+
+
+def iou_matrix(boxes1, boxes2):
+    """
+    向量化计算两组边界框两两之间的交并比，代替逐对调用 calculate_iou。
+    :param boxes1: 第一组边界框，格式为 (x1, y1, x2, y2)，形状为 (N, 4)
+    :param boxes2: 第二组边界框，格式为 (x1, y1, x2, y2)，形状为 (M, 4)
+    :return: 交并比矩阵，形状为 (N, M)
+    """
+    boxes1 = np.asarray(boxes1, dtype=np.float32).reshape(-1, 4)
+    boxes2 = np.asarray(boxes2, dtype=np.float32).reshape(-1, 4)
+    # 利用广播计算交集区域的左上角和右下角坐标
+    top_left = np.maximum(boxes1[:, None, :2], boxes2[None, :, :2])
+    bottom_right = np.minimum(boxes1[:, None, 2:], boxes2[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+
+    area1 = np.prod(boxes1[:, 2:] - boxes1[:, :2], axis=1)
+    area2 = np.prod(boxes2[:, 2:] - boxes2[:, :2], axis=1)
+    union = area1[:, None] + area2[None, :] - intersection
+    # 避免除零错误
+    return np.where(union > 0, intersection / np.maximum(union, 1e-9), 0.0)
+
+
 # 定义需要跟踪的目标类别列表
 OBJ_LIST = [0, 1, 2, 3, 4]
 # 定义需要发出警报的目标类别列表
 ALERT_OBJ_LIST = [0, 2]
-
-def initialize_tracking(video_path, result_path, warning_folder):
+# 跟踪时使用的置信度阈值
+TRACK_CONF = 0.5
+# 检测结果过滤和预警的默认参数
+DEFAULT_PARAMS = {
+    'conf': TRACK_CONF,  # 置信度阈值（低于 TRACK_CONF 时不起作用）
+    'area_fraction': 1 / 5,  # 检测框面积上限（占整帧面积的比例）
+    'iou_threshold': 0.4,  # NMS 的交并比阈值
+    'min_aspect': 0.2,  # 宽高比下限
+    'max_aspect': 5.0,  # 宽高比上限
+    'dwell_seconds': 2.0,  # 在警告区域停留多少秒后发出警告
+}
+
+def initialize_tracking(video_path, result_path, warning_folder, calibration=None):
     """
     初始化跟踪所需的资源和变量。
     :param video_path: 输入视频文件的路径
     :param result_path: 输出处理后视频文件的路径
     :param warning_folder: 用于保存警告帧图像的文件夹路径
+    :param calibration: 场景标定（SceneCalibration），提供时使用其中已按帧尺寸缩放的区域
     :return: 包含初始化后各变量的元组
     """
     # 初始化视频写入器为None，后续根据需要创建
@@ -62,9 +119,15 @@ def initialize_tracking(video_path, result_path, warning_folder):
     polygon_points = np.array([[0, 500], [0, 670], [1918, 630], [1918, 463]], np.int32)
     # 定义警告区域的多边形顶点坐标
     polygon_points1 = np.array([[120, 470], [1731, 428], [1918, 133], [1918, 0], [1350, 0]], np.int32)
+    frame_width, frame_height = 1920, 1080
+
+    if calibration is not None:
+        polygon_points = calibration.get_zone('count_zone', polygon_points)
+        polygon_points1 = calibration.get_zone('warning_zone', polygon_points1)
+        frame_width, frame_height = calibration.frame_size
 
     return (videowriter, track_history, entered_ids, entry_time, warned_ids, count_passed,
-            count_exited, polygon_points, polygon_points1, 30, 1920, 1080)
+            count_exited, polygon_points, polygon_points1, 30, frame_width, frame_height)
 
 
 def nms(boxes, scores, iou_threshold=0.3):
@@ -119,158 +182,291 @@ def nms(boxes, scores, iou_threshold=0.3):
     return keep
 
 
+def linear_assignment(cost_matrix, threshold):
+    """
+    使用 lap.lapjv 求解线性分配问题。
+    :param cost_matrix: 代价矩阵，形状为 (N, M)
+    :param threshold: 代价上限，超过该值的配对视为不匹配
+    :return: (matches, unmatched_rows, unmatched_cols)，matches 形状为 (K, 2)
+    """
+    rows, cols = cost_matrix.shape
+    if cost_matrix.size == 0:
+        return np.empty((0, 2), dtype=np.int64), np.arange(rows), np.arange(cols)
+    _, x, y = lap.lapjv(cost_matrix, extend_cost=True, cost_limit=threshold)
+    matched_rows = np.nonzero(x >= 0)[0]
+    matches = np.stack([matched_rows, x[matched_rows]], axis=1).astype(np.int64)
+    return matches, np.nonzero(x < 0)[0], np.nonzero(y < 0)[0]
+
+
+class ByteTracker:
+    """
+    内置的向量化多目标跟踪器（ByteTrack 思路）
+    作用：
+        代替 model.track(persist=True)，只需要普通检测结果（model.predict 的输出）即可完成跟踪，
+        跟踪状态不再绑定在模型对象上，检测可以跨帧、跨视频流批量推理后再逐帧跟踪。
+    算法：
+        1. 用匀速运动模型预测所有轨迹的位置
+        2. 高分检测与全部轨迹按 IoU 矩阵做线性分配（lap.lapjv）
+        3. 低分检测再与上一帧仍被跟踪、但本帧未匹配的轨迹做第二次分配，找回被遮挡的目标
+        4. 未匹配的高分检测创建新轨迹，连续 max_age 帧未匹配的轨迹被删除
+    状态：
+        所有轨迹的 ID、检测框、速度、类别和计数都保存在 numpy 数组中，每帧只做数组运算。
+    """
+    def __init__(self, high_thresh=0.5, low_thresh=0.1, new_track_thresh=0.6, match_thresh=0.8,
+                 second_match_thresh=0.5, max_age=30, min_hits=2, velocity_smoothing=0.5):
+        """
+        :param high_thresh: 高分检测的置信度阈值
+        :param low_thresh: 参与第二次匹配的低分检测的置信度下限
+        :param new_track_thresh: 创建新轨迹所需的最低置信度
+        :param match_thresh: 第一次匹配的代价上限（代价为 1 - IoU）
+        :param second_match_thresh: 第二次匹配的代价上限
+        :param max_age: 轨迹连续多少帧未匹配后删除
+        :param min_hits: 轨迹至少匹配多少次后才输出（跟踪开始的前 min_hits 帧除外）
+        :param velocity_smoothing: 速度更新的平滑系数
+        """
+        self.high_thresh = high_thresh
+        self.low_thresh = low_thresh
+        self.new_track_thresh = new_track_thresh
+        self.match_thresh = match_thresh
+        self.second_match_thresh = second_match_thresh
+        self.max_age = max_age
+        self.min_hits = min_hits
+        self.velocity_smoothing = velocity_smoothing
+        self.reset()
+
+    def reset(self):
+        """清空全部轨迹"""
+        self.frame_id = 0
+        self.next_id = 1
+        self.ids = np.empty(0, dtype=np.int64)
+        self.boxes = np.empty((0, 4), dtype=np.float32)  # 角点格式 (x1, y1, x2, y2)
+        self.velocities = np.empty((0, 4), dtype=np.float32)
+        self.scores = np.empty(0, dtype=np.float32)
+        self.classes = np.empty(0, dtype=np.int64)
+        self.hits = np.empty(0, dtype=np.int64)
+        self.time_since_update = np.empty(0, dtype=np.int64)
+        self.evicted = 0  # 累计删除的轨迹数量
+
+    def __len__(self):
+        return len(self.ids)
+
+    # 断点文件中保存的轨迹数组
+    STATE_ARRAYS = ('ids', 'boxes', 'velocities', 'scores', 'classes', 'hits', 'time_since_update')
+
+    def get_state(self):
+        """返回全部跟踪状态（用于断点续处理）"""
+        state = {name: getattr(self, name) for name in self.STATE_ARRAYS}
+        state.update(frame_id=self.frame_id, next_id=self.next_id, evicted=self.evicted)
+        return state
+
+    def set_state(self, state):
+        """从 get_state 的结果恢复跟踪状态"""
+        for name in self.STATE_ARRAYS:
+            setattr(self, name, np.array(state[name], dtype=getattr(self, name).dtype))
+        self.frame_id = int(state['frame_id'])
+        self.next_id = int(state['next_id'])
+        self.evicted = int(state['evicted'])
+
+    def update(self, boxes, scores, classes):
+        """
+        用一帧的检测结果更新跟踪器
+        :param boxes: 检测框，中心点格式 (x, y, w, h)（即 boxes.xywh），形状为 (N, 4)
+        :param scores: 置信度分数
+        :param classes: 类别
+        :return: 本帧匹配成功的轨迹，格式同 extract_detections 的返回值；其中的分数是轨迹的置信度
+                 （最近一次高分匹配的分数），只由低分检测维持的轨迹不会被后续的置信度过滤丢弃
+        """
+        self.frame_id += 1
+        det_boxes = xywh_to_xyxy(boxes)
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        classes = np.asarray(classes, dtype=np.int64).reshape(-1)
+
+        # 1. 匀速运动预测
+        previous = self.boxes.copy()
+        self.boxes = self.boxes + self.velocities
+        was_tracked = self.time_since_update == 0
+        matched = np.zeros(len(self.ids), dtype=bool)
+
+        high = np.nonzero(scores >= self.high_thresh)[0]
+        low = np.nonzero((scores >= self.low_thresh) & (scores < self.high_thresh))[0]
+
+        # 2. 高分检测与全部轨迹匹配
+        cost = 1.0 - iou_matrix(self.boxes, det_boxes[high])
+        matches, unmatched_tracks, unmatched_high = linear_assignment(cost, self.match_thresh)
+        self._apply(matches[:, 0], high[matches[:, 1]], det_boxes, scores, classes, previous)
+        matched[matches[:, 0]] = True
+
+        # 3. 低分检测与上一帧仍被跟踪的未匹配轨迹匹配
+        candidates = unmatched_tracks[was_tracked[unmatched_tracks]]
+        cost = 1.0 - iou_matrix(self.boxes[candidates], det_boxes[low])
+        matches, _, _ = linear_assignment(cost, self.second_match_thresh)
+        self._apply(candidates[matches[:, 0]], low[matches[:, 1]], det_boxes, scores, classes, previous,
+                    update_score=False)
+        matched[candidates[matches[:, 0]]] = True
+
+        # 4. 未匹配轨迹老化，过期轨迹删除
+        self.time_since_update[~matched] += 1
+        keep = self.time_since_update <= self.max_age
+        self.evicted += int((~keep).sum())
+        for name in ('ids', 'boxes', 'velocities', 'scores', 'classes', 'hits', 'time_since_update'):
+            setattr(self, name, getattr(self, name)[keep])
+        matched = matched[keep]
+
+        # 5. 未匹配的高分检测创建新轨迹
+        new = unmatched_high[scores[high[unmatched_high]] >= self.new_track_thresh]
+        new = high[new]
+        if len(new) > 0:
+            count = len(new)
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + count)])
+            self.next_id += count
+            self.boxes = np.concatenate([self.boxes, det_boxes[new]])
+            self.velocities = np.concatenate([self.velocities, np.zeros((count, 4), dtype=np.float32)])
+            self.scores = np.concatenate([self.scores, scores[new]])
+            self.classes = np.concatenate([self.classes, classes[new]])
+            self.hits = np.concatenate([self.hits, np.ones(count, dtype=np.int64)])
+            self.time_since_update = np.concatenate([self.time_since_update, np.zeros(count, dtype=np.int64)])
+            matched = np.concatenate([matched, np.ones(count, dtype=bool)])
+
+        output = matched & ((self.hits >= self.min_hits) | (self.frame_id <= self.min_hits))
+        out_boxes = self.boxes[output]
+        centers = np.concatenate([(out_boxes[:, :2] + out_boxes[:, 2:]) / 2, out_boxes[:, 2:] - out_boxes[:, :2]], axis=1)
+        return (centers.astype(np.float32), self.ids[output].astype(np.int32),
+                self.classes[output].astype(np.int32), self.scores[output])
+
+    def _apply(self, track_index, det_index, det_boxes, scores, classes, previous, update_score=True):
+        """用匹配的检测结果更新轨迹状态，低分匹配（update_score=False）保留轨迹原有的置信度"""
+        if len(track_index) == 0:
+            return
+        new_boxes = det_boxes[det_index]
+        # 只有上一帧被匹配的轨迹才用位移更新速度，避免长时间丢失后速度突变
+        fresh = self.time_since_update[track_index] == 0
+        motion = new_boxes - previous[track_index]
+        smoothing = self.velocity_smoothing
+        self.velocities[track_index] = np.where(
+            fresh[:, None], smoothing * self.velocities[track_index] + (1 - smoothing) * motion, 0.0)
+        self.boxes[track_index] = new_boxes
+        if update_score:
+            self.scores[track_index] = scores[det_index]
+        self.classes[track_index] = classes[det_index]
+        self.hits[track_index] += 1
+        self.time_since_update[track_index] = 0
+
+
+def empty_detections():
+    """返回不含任何目标的检测数据，格式同 extract_detections"""
+    return (np.empty((0, 4), dtype=np.float32), np.empty(0, dtype=np.int32),
+            np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+
+
+def extract_detections(result):
+    """
+    从 YOLO 跟踪结果中提取检测数据。
+    :param result: model.track 返回结果中的单帧结果（results[0]）
+    :return: (boxes, track_ids, track_classes, scores) 元组，boxes 为中心点格式 (x, y, w, h)；
+             没有带 ID 的检测结果时返回空数组
+    """
+    if result is None or result.boxes is None or result.boxes.id is None:
+        return empty_detections()
+    boxes = result.boxes.xywh.cpu().numpy()
+    track_ids = result.boxes.id.int().cpu().numpy()
+    track_classes = result.boxes.cls.int().cpu().numpy()
+    scores = result.boxes.conf.cpu().numpy()
+    return boxes, track_ids, track_classes, scores
+
+
+def track_frame(frame, model, tracker=None, conf=TRACK_CONF, imgsz=None, classes=None):
+    """
+    对单帧做检测和跟踪。
+    :param frame: 帧图像
+    :param model: YOLO 模型
+    :param tracker: 内置跟踪器（ByteTracker），为 None 时使用 model.track(persist=True)
+    :param conf: 置信度阈值（使用内置跟踪器时检测阈值取 tracker.low_thresh，以便保留低分检测）
+    :param imgsz: 推理尺寸，为 None 时使用模型默认值（导出为固定尺寸的模型必须与导出时一致）
+    :param classes: 检测的类别索引（模型中的索引），为 None 时使用 OBJ_LIST
+    :return: (results, detections)，detections 格式同 extract_detections
+    """
+    size = {'imgsz': imgsz} if imgsz else {}
+    classes = OBJ_LIST if classes is None else classes
+    if tracker is None:
+        results = model.track(frame, persist=True, classes=classes, conf=conf, verbose=False, **size)
+        return results, extract_detections(results[0])
+    results = model.predict(frame, classes=classes, conf=min(conf, tracker.low_thresh), verbose=False, **size)
+    boxes = results[0].boxes
+    return results, tracker.update(boxes.xywh.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.int().cpu().numpy())
+
+
+def track_batch(frames, model, tracker, conf=TRACK_CONF):
+    """
+    批量检测多帧后再逐帧跟踪（仅适用于内置跟踪器）。
+    :param frames: 帧图像列表（同一视频流的连续帧）
+    :param model: YOLO 模型
+    :param tracker: 内置跟踪器（ByteTracker）
+    :param conf: 置信度阈值
+    :return: 每帧的 detections 列表
+    """
+    results = model.predict(frames, classes=OBJ_LIST, conf=min(conf, tracker.low_thresh), verbose=False)
+    detections = []
+    for result in results:
+        boxes = result.boxes
+        detections.append(tracker.update(boxes.xywh.cpu().numpy(), boxes.conf.cpu().numpy(),
+                                         boxes.cls.int().cpu().numpy()))
+    return detections
+
+
+def warning_frame_name(track_id, timestamp, repeat=False):
+    """警告帧文件名，同一目标再次报警时带上时间，不覆盖之前的警告帧"""
+    return f"warning_frame_{track_id}_{timestamp:.0f}.jpg" if repeat else f"warning_frame_{track_id}.jpg"
+
+
+def encode_warning_frame(frame):
+    """
+    把不含标注的警告帧编码为 JPEG（与 cv2.imwrite 保存的 .jpg 相同）
+    :return: JPEG 数据（bytes），frame 为 None（回放检测缓存）或编码失败时返回 None
+    """
+    if frame is None:
+        return None
+    success, buffer = cv2.imencode('.jpg', frame)
+    return buffer.tobytes() if success else None
+
+
+def write_warning_frame(warning_folder, track_id, timestamp, repeat, data):
+    """把 encode_warning_frame 编码好的警告帧写入警告帧目录"""
+    with open(os.path.join(warning_folder, warning_frame_name(track_id, timestamp, repeat)), 'wb') as f:
+        f.write(data)
+
+
 def process_frame(frame, model, videowriter, track_history, entered_ids, entry_time,
                   warned_ids, count_passed, count_exited, polygon_points, polygon_points1,
                   play_voice_alert, warning_folder, warning_display=None):
     """
     处理视频的每一帧，进行目标跟踪和预警处理。
+    跟踪状态和渲染器、计数线、停留时间引擎、警报状态机等组件由 tracking_session.TrackingSession 保存，
+    这里只保留原来的调用方式：用传入的状态处理一帧，直接保存警告帧、播放语音和更新警告显示控件。
     """
-    # 使用模块级定义的目标类别列表
-
-    # 记录已经显示过警告信息的ID
-    displayed_warning_ids = set()
-
-    # 使用 YOLO 模型对当前帧进行目标跟踪，只跟踪指定类别的目标，并设置置信度阈值
-    results = model.track(frame, persist=True, classes=OBJ_LIST, conf=0.5)
+    from tracking_session import TrackingSession
 
-    # 如果有检测结果，绘制检测框；否则使用原始帧图像
-    a_frame = results[0].plot(line_width=2) if results[0] is not None else frame
-
-    # 创建一个与帧图像相同大小的掩码，用于绘制特定区域
-    mask = np.zeros_like(frame)
-    # 在掩码上填充特定区域
-    cv2.fillPoly(mask, [polygon_points], (0, 255, 255))
-    # 将掩码与帧图像叠加，使特定区域半透明显示
-    a_frame = cv2.addWeighted(a_frame, 1, mask, 0.1, 0)
+    session = TrackingSession(model=model, polygon_points=polygon_points, polygon_points1=polygon_points1,
+                              stats_interval=0)
+    session.track_history, session.entered_ids, session.entry_time, session.warned_ids = (
+        track_history, entered_ids, entry_time, warned_ids)
+    session.count_passed, session.count_exited = count_passed, count_exited
+    now = time.time()
+    a_frame, events = session.track(frame, timestamp=now)
 
     # 存储当前帧的警告信息
     current_warnings = []
-
-    # 如果检测结果不为空且包含边界框和ID信息
-    if results[0] is not None and results[0].boxes is not None and results[0].boxes.id is not None:
-        # 获取检测到的目标的边界框信息
-        boxes = results[0].boxes.xywh.cpu()
-        # 获取检测到的目标的 ID
-        track_ids = results[0].boxes.id.int().cpu().tolist()
-        # 获取检测到的目标的类别
-        track_classes = results[0].boxes.cls.int().cpu().tolist()
-        # 获取每个检测框的置信度分数
-        scores = results[0].boxes.conf.cpu().numpy()
-
-        # 将检测框信息转换为 numpy 数组
-        boxes = boxes.cpu().numpy()
-
-        # 过滤掉过大的检测框
-        valid_indices = []
-        for i, box in enumerate(boxes):
-            x, y, w, h = box
-            frame_area = frame.shape[0] * frame.shape[1]
-            box_area = w * h
-            # 过滤条件：检测框面积不超过视频面积的五分之一
-            if box_area < frame_area / 5:
-                valid_indices.append(i)
-
-        boxes = boxes[valid_indices]
-        scores = scores[valid_indices]
-        track_ids = [track_ids[i] for i in valid_indices]
-        track_classes = [track_classes[i] for i in valid_indices]
-
-
-        keep_indices = nms(boxes, scores, iou_threshold=0.4)
-
-        filtered_boxes = boxes[keep_indices]
-        filtered_ids = [track_ids[i] for i in keep_indices]
-        filtered_classes = [track_classes[i] for i in keep_indices]
-
-        # 确保每个框只包含一个主要目标
-        final_boxes = []
-        final_ids = []
-        final_classes = []
-
-        for box, track_id, track_class in zip(filtered_boxes, filtered_ids, filtered_classes):
-            x, y, w, h = box
-            aspect_ratio = w / h
-
-            # 过滤掉不合理的宽高比 (0.2-5.0是合理范围)
-            if 0.2 < aspect_ratio < 5.0:
-                final_boxes.append(box)
-                final_ids.append(track_id)
-                final_classes.append(track_class)
-
-        # 使用最终过滤后的结果进行后续处理
-        for box, track_id, track_class in zip(final_boxes, final_ids, final_classes):
-            x, y, w, h = box
-            # 计算边界框的中心点坐标
-            center = np.array([x + w / 2, y + h / 2], dtype=np.float32)
-
-            # 获取该目标的跟踪历史
-            track = track_history[track_id]
-            # 将当前中心点添加到跟踪历史中
-            track.append((float(x), float(y)))
-            # 只保留最近的 30 个跟踪点，避免内存占用过大
-            if len(track) > 30:
-                track.pop(0)
-
-            # 将跟踪点转换为适合 OpenCV 绘制的格式
-            points = np.hstack(track).astype(np.int32).reshape(-1, 1, 2)
-            # 在帧图像上绘制目标的跟踪轨迹
-            cv2.polylines(a_frame, [points], isClosed=False, color=(0, 0, 255), thickness=2)
-
-            # 如果目标还未进入特定区域且当前位于特定区域内
-            if track_id not in entered_ids and cv2.pointPolygonTest(polygon_points, center, False) >= 0:
-                # 进入特定区域的目标数量加 1
-                count_passed += 1
-                # 将该目标的 ID 添加到已进入集合中
-                entered_ids.add(track_id)
-
-            # 如果目标位于警告区域内
-            if cv2.pointPolygonTest(polygon_points1, center, False) >= 0:
-                if track_class in ALERT_OBJ_LIST:
-                    if track_id not in entry_time:
-                        # 记录目标进入警告区域的时间
-                        entry_time[track_id] = time.time()
-                    else:
-                        # 如果目标在警告区域内停留超过 2 秒
-                        if time.time() - entry_time[track_id] > 2:
-                            # 创建一个与帧图像相同大小的掩码，用于绘制警告区域
-                            mask1 = np.zeros_like(frame)
-                            # 在掩码上填充警告区域
-                            cv2.fillPoly(mask1, [polygon_points1], (0, 0, 255))
-                            # 将掩码与帧图像叠加，使警告区域半透明显示
-                            a_frame = cv2.addWeighted(a_frame, 1, mask1, 0.2, 0)
-                            # 在帧图像上显示警告信息
-                            cv2.putText(a_frame, f'warn: ID {track_id}', (int(center[0]), int(center[1] - 10)),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
-
-                            # 只有当ID不在已显示集合中时才记录警告信息
-                            if track_id not in displayed_warning_ids:
-                                warning_msg = f"警告：物体 ID {track_id} ({track_class}) 进入了警告区域！"
-                                print(warning_msg)
-                                current_warnings.append(warning_msg)
-                                displayed_warning_ids.add(track_id)  # 标记该ID已显示警告
-
-                            if track_id not in warned_ids:
-                                # 保存当前帧图像作为警告帧
-                                cv2.imwrite(os.path.join(warning_folder, f"warning_frame_{track_id}.jpg"), frame)
-                                # 启动一个新线程播放语音警报
-                                import threading
-                                voice_thread = threading.Thread(target=play_voice_alert)
-                                voice_thread.start()
-                                # 将该目标的 ID 添加到已警告集合中
-                                warned_ids.add(track_id)
-                else:
-                    # 如果目标类别不在需要警报的列表中，移除其进入警告区域的时间记录
-                    if track_id in entry_time:
-                        del entry_time[track_id]
-            # 如果目标已经进入特定区域且当前不在特定区域内
-            elif track_id in entered_ids and cv2.pointPolygonTest(polygon_points, center, True) < 0:
-                # 离开特定区域的目标数量加 1
-                count_exited += 1
-                # 从已进入集合中移除该目标的 ID
-                entered_ids.remove(track_id)
-                # 如果该目标有进入警告区域的时间记录，移除该记录
-                if track_id in entry_time:
-                    del entry_time[track_id]
+    for kind, track_id, _, *extra in events:
+        if kind != 'violation':
+            continue
+        warning_msg, warning_frame, repeat = extra
+        current_warnings.append(warning_msg)
+        # 保存当前帧图像作为警告帧
+        if warning_frame is not None:
+            write_warning_frame(warning_folder, track_id, now, repeat, warning_frame)
+        # 启动一个新线程播放语音警报
+        import threading
+        voice_thread = threading.Thread(target=play_voice_alert)
+        voice_thread.start()
 
     # 如果提供了警告显示控件，则更新显示
     if warning_display is not None and current_warnings:
@@ -280,6 +476,6 @@ def process_frame(frame, model, videowriter, track_history, entered_ids, entry_t
         for warning in current_warnings:
             warning_display.append(f"[{current_time}] {warning}")
 
-    return (a_frame, count_passed, count_exited, entered_ids, entry_time, warned_ids,
+    return (a_frame, session.count_passed, session.count_exited, entered_ids, entry_time, warned_ids,
             track_history)
 
\ No newline at end of file
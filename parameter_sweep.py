@@ -0,0 +1,175 @@
+"""
+计数与预警参数的并行网格搜索
+在录制好的检测缓存上（见 detection_cache.py）用进程池并行回放所有参数组合，
+输出每组参数的计数、警告数量，以及与人工标注真值的误差。全程不做推理，CPU 上几分钟即可完成。
+
+用法：
+    python parameter_sweep.py car_test3.mp4 --conf 0.4 0.5 0.6 --area-fraction 0.1 0.2 0.3 \\
+        --iou 0.3 0.4 0.5 --dwell 1 2 3 --ground-truth gt.json --output sweep.csv
+
+真值文件（JSON）示例，只需给出已标注的项：
+    {"count_passed": 42, "count_exited": 40, "warnings": 3}
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from object_tracking import DEFAULT_PARAMS, OBJ_LIST, initialize_tracking
+from alert_state import AlertStateMachine
+from dwell_engine import DWELL_THRESHOLDS, DwellTimeEngine
+from detection_cache import CACHE_DIR, DetectionCache, record, replay, tracking_cache_key
+from scene_calibration import SceneCalibration, find_calibration_file
+
+# 每个工作进程各自打开一次缓存（内存映射，多个进程共享操作系统页缓存）
+_worker_cache = None
+_worker_zones = None
+_worker_cooldown = None
+
+
+def _init_worker(cache_path, zones, cooldown):
+    global _worker_cache, _worker_zones, _worker_cooldown
+    _worker_cache = DetectionCache(cache_path)
+    if zones[0] is None or zones[1] is None:
+        # 停留时间引擎需要警告区域的坐标，未给出的区域使用默认值
+        (_, _, _, _, _, _, _, default_zone, default_warning_zone, _, _, _) = initialize_tracking(None, None, None)
+        zones = (default_zone if zones[0] is None else zones[0],
+                 default_warning_zone if zones[1] is None else zones[1])
+    _worker_zones = zones
+    _worker_cooldown = cooldown
+
+
+def _evaluate(params):
+    """在工作进程中回放一组参数，每组参数使用新的停留时间引擎和警报状态机（与界面的警告逻辑一致）"""
+    polygon_points, polygon_points1 = _worker_zones
+    meta = _worker_cache.meta
+    # 网格中的停留时间作为所有报警类别的阈值
+    thresholds = {track_class: params['dwell_seconds'] for track_class in DWELL_THRESHOLDS}
+    dwell_engine = DwellTimeEngine({'warning_zone': polygon_points1}, (meta['frame_width'], meta['frame_height']),
+                                   thresholds, fps=meta.get('fps', 30))
+    alert_machine = AlertStateMachine(thresholds, cooldown=_worker_cooldown)
+    summary = replay(_worker_cache, polygon_points, polygon_points1, params=params,
+                     dwell_engine=dwell_engine, alert_machine=alert_machine)
+    return {
+        **params,
+        'count_passed': summary['count_passed'],
+        'count_exited': summary['count_exited'],
+        'warnings': len(summary['warned_ids']),
+        'alert_episodes': summary['alert_episodes'],
+    }
+
+
+def build_grid(**values):
+    """
+    生成参数网格
+    :param values: {参数名: 取值列表}，取值为空的参数使用默认值
+    :return: 参数字典列表
+    """
+    names = list(DEFAULT_PARAMS)
+    choices = [values.get(name) or [DEFAULT_PARAMS[name]] for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*choices)]
+
+
+def score_result(result, ground_truth):
+    """
+    计算与真值的误差
+    :param result: 单组参数的回放结果
+    :param ground_truth: 真值字典
+    :return: 各项的绝对误差及相对误差之和（error 越小越好）
+    """
+    errors = {}
+    total = 0.0
+    for name in ('count_passed', 'count_exited', 'warnings'):
+        if name in ground_truth:
+            error = abs(result[name] - ground_truth[name])
+            errors[f"{name}_error"] = error
+            total += error / max(1, ground_truth[name])
+    errors['error'] = round(total, 4)
+    return errors
+
+
+def run_sweep(cache, grid, workers=None, zones=(None, None), ground_truth=None, cooldown=10.0):
+    """
+    并行评估参数网格
+    :param cache: DetectionCache 实例
+    :param grid: build_grid 生成的参数列表
+    :param workers: 进程数，默认为 CPU 核心数
+    :param zones: (统计区域, 警告区域)，为 None 时使用默认区域
+    :param ground_truth: 真值字典，提供时为每组结果计算误差并按误差排序
+    :param cooldown: 警报解除后的冷却时间（秒）
+    :return: 结果字典列表
+    """
+    # 宽高比上下限颠倒的组合没有意义，直接跳过
+    grid = [params for params in grid if params['min_aspect'] < params['max_aspect']]
+    chunksize = max(1, len(grid) // (4 * (workers or os.cpu_count() or 1)))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cache.path, zones, cooldown)) as executor:
+        results = list(executor.map(_evaluate, grid, chunksize=chunksize))
+
+    if ground_truth:
+        for result in results:
+            result.update(score_result(result, ground_truth))
+        results.sort(key=lambda result: result['error'])
+    return results
+
+
+def write_report(results, path):
+    """把结果写入 CSV 文件"""
+    if not results:
+        return
+    fieldnames = list(results[0].keys())
+    with open(path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="计数与预警参数的并行网格搜索")
+    parser.add_argument("video", help="视频文件路径")
+    parser.add_argument("--model", default="best.pt", help="模型权重路径")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="检测缓存根目录")
+    parser.add_argument("--conf", type=float, nargs='+', help="置信度阈值候选值")
+    parser.add_argument("--area-fraction", type=float, nargs='+', help="检测框面积上限（占整帧比例）候选值")
+    parser.add_argument("--iou", type=float, nargs='+', help="NMS 交并比阈值候选值")
+    parser.add_argument("--min-aspect", type=float, nargs='+', help="宽高比下限候选值")
+    parser.add_argument("--max-aspect", type=float, nargs='+', help="宽高比上限候选值")
+    parser.add_argument("--dwell", type=float, nargs='+', help="警告区域停留时间（秒）候选值")
+    parser.add_argument("--cooldown", type=float, default=10.0, help="警报解除后的冷却时间（秒）")
+    parser.add_argument("--calibration", help="场景标定文件，默认按视频文件名查找")
+    parser.add_argument("--ground-truth", help="真值 JSON 文件")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核心数")
+    parser.add_argument("--output", default="sweep.csv", help="结果 CSV 文件")
+    args = parser.parse_args()
+
+    grid = build_grid(conf=args.conf, area_fraction=args.area_fraction, iou_threshold=args.iou,
+                      min_aspect=args.min_aspect, max_aspect=args.max_aspect, dwell_seconds=args.dwell)
+
+    # 缓存以最低的候选置信度录制，更高的阈值在回放时过滤
+    record_conf = min(params['conf'] for params in grid)
+    cache = DetectionCache.open(tracking_cache_key(args.video, args.model, record_conf, OBJ_LIST), args.cache_dir)
+    if cache is None:
+        print(f"未找到 conf={record_conf} 的检测缓存，开始推理录制...")
+        cache = record(args.video, args.model, args.cache_dir, conf=record_conf)
+
+    zones = (None, None)
+    calibration_path = args.calibration or find_calibration_file(args.video)
+    if calibration_path:
+        calibration = SceneCalibration.load(calibration_path, cache.meta['frame_width'], cache.meta['frame_height'])
+        zones = (calibration.get_zone('count_zone'), calibration.get_zone('warning_zone'))
+
+    ground_truth = None
+    if args.ground_truth:
+        with open(args.ground_truth, 'r', encoding='utf-8') as f:
+            ground_truth = json.load(f)
+
+    start_time = time.time()
+    results = run_sweep(cache, grid, args.workers, zones, ground_truth, args.cooldown)
+    write_report(results, args.output)
+    print(f"评估 {len(results)} 组参数, 用时{time.time() - start_time:.1f}s, 结果已保存到 {args.output}")
+    for result in results[:10]:
+        print(result)
@@ -0,0 +1,239 @@
+"""
+处理循环的性能分析
+对处理循环的前 N 帧同时做：
+    1. cProfile 分析，保存为 .prof 文件和按累计耗时排序的文本报告
+    2. 采样分析：后台线程按固定间隔采样处理线程的调用栈，输出折叠栈（collapsed stacks），
+       可以直接用 flamegraph.pl 或 speedscope 生成火焰图
+    3. 周期性 tracemalloc 快照：保存快照文件、相对第一份快照的内存增长（按代码行），
+       并统计 track_history、SpeedAnalyzer.tracks 等被监视结构的元素数和占用字节数
+所有结果保存在带时间戳的目录中，供离线分析。
+
+启用方式：
+    python traffic_detection_system.py --profile 300
+    或设置环境变量 TRAFFIC_PROFILE=300
+"""
+
+import cProfile
+import csv
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# 启用性能分析的环境变量，值为分析的帧数
+PROFILE_ENV = "TRAFFIC_PROFILE"
+# 分析结果根目录
+PROFILE_DIR = "profiles"
+
+
+def deep_sizeof(obj, seen=None):
+    """
+    估算对象及其包含的所有元素占用的字节数
+    :param obj: 待统计的对象
+    :param seen: 已统计对象的 id 集合，避免重复统计共享对象
+    :return: 字节数
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        # numpy 数组的 getsizeof 已包含自身持有的数据
+        total += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            stack.extend(item)
+        elif isinstance(item, np.ndarray) and item.base is not None:
+            stack.append(item.base)
+    return total
+
+
+class ProcessingProfiler:
+    """
+    处理循环性能分析器
+    使用：
+        profiler = ProcessingProfiler(frames=300)
+        profiler.watch('track_history', lambda: app.track_history)
+        profiler.start()
+        while profiler.active:
+            with profiler.frame():
+                process_one_frame()
+    分析满 frames 帧后自动结束并写出结果，也可以提前调用 finish()。
+    """
+    def __init__(self, frames=300, output_root=PROFILE_DIR, snapshot_interval=100, sample_interval=0.005,
+                 trace_depth=25, use_cprofile=True):
+        """
+        :param frames: 分析的帧数
+        :param output_root: 结果根目录，实际结果保存在其下以时间戳命名的子目录中
+        :param snapshot_interval: 每隔多少帧做一次 tracemalloc 快照
+        :param sample_interval: 调用栈采样间隔（秒）
+        :param trace_depth: tracemalloc 记录的调用栈深度
+        :param use_cprofile: 是否同时使用 cProfile（开销较大，只需要火焰图时可以关闭）
+        """
+        self.frames = frames
+        self.output_dir = os.path.join(output_root, time.strftime("%Y%m%d_%H%M%S"))
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.sample_interval = sample_interval
+        self.trace_depth = trace_depth
+        self.use_cprofile = use_cprofile
+
+        self.watched = {}  # {名称: 返回被监视结构的函数}
+        self.active = False
+        self.frames_done = 0
+        self.profile = None
+        self.stack_counts = Counter()
+        self.baseline = None
+        self.memory_rows = []
+        self.start_time = None
+
+        self._in_frame = False
+        self._target_thread = None
+        self._stop_sampling = threading.Event()
+        self._sampler = None
+
+    def watch(self, name, getter):
+        """
+        添加被监视的数据结构，每次快照时统计其元素数和占用字节数
+        :param name: 名称（如 'track_history'）
+        :param getter: 返回该结构当前对象的函数（结构可能在运行中被整体替换）
+        """
+        self.watched[name] = getter
+
+    def start(self):
+        """开始分析，必须在处理线程中调用"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_depth)
+        self.baseline = self._take_snapshot()
+        self.profile = cProfile.Profile() if self.use_cprofile else None
+        self._target_thread = threading.get_ident()
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._sampler.start()
+        self.start_time = time.perf_counter()
+        self.active = True
+        self._record_memory(0, self.baseline)
+
+    @contextmanager
+    def frame(self):
+        """分析一帧的处理过程"""
+        if not self.active:
+            yield
+            return
+
+        self._in_frame = True
+        if self.profile is not None:
+            self.profile.enable()
+        try:
+            yield
+        finally:
+            if self.profile is not None:
+                self.profile.disable()
+            self._in_frame = False
+            # 处理过程中可能已经调用了 finish()（如视频结束）
+            if self.active:
+                self.frames_done += 1
+                if self.frames_done % self.snapshot_interval == 0:
+                    self._snapshot()
+                if self.frames_done >= self.frames:
+                    self.finish()
+
+    def _sample_loop(self):
+        """后台采样处理线程的调用栈，只在处理帧期间采样"""
+        while not self._stop_sampling.wait(self.sample_interval):
+            if not self._in_frame:
+                continue
+            frame = sys._current_frames().get(self._target_thread)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stack_counts[";".join(reversed(stack))] += 1
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+        ))
+
+    def _snapshot(self):
+        """保存快照，输出相对第一份快照的内存增长"""
+        snapshot = self._take_snapshot()
+        snapshot.dump(os.path.join(self.output_dir, f"snapshot_{self.frames_done:06d}.tracemalloc"))
+        with open(os.path.join(self.output_dir, f"memory_growth_{self.frames_done:06d}.txt"), 'w',
+                  encoding='utf-8') as f:
+            f.write(f"第 {self.frames_done} 帧相对开始时的内存增长（按代码行，前 30 项）\n\n")
+            for stat in snapshot.compare_to(self.baseline, 'lineno')[:30]:
+                f.write(f"{stat}\n")
+        self._record_memory(self.frames_done, snapshot)
+
+    def _record_memory(self, frame_index, snapshot):
+        current, peak = tracemalloc.get_traced_memory()
+        row = {'frame': frame_index, 'traced_current': current, 'traced_peak': peak,
+               'snapshot_total': sum(stat.size for stat in snapshot.statistics('filename'))}
+        for name, getter in self.watched.items():
+            try:
+                obj = getter()
+            except Exception as e:
+                print(f"性能分析：无法获取 {name}: {e}")
+                obj = None
+            row[f"{name}_len"] = len(obj) if hasattr(obj, '__len__') else 0
+            row[f"{name}_bytes"] = deep_sizeof(obj) if obj is not None else 0
+        self.memory_rows.append(row)
+
+    def finish(self):
+        """结束分析并写出全部结果"""
+        if not self.active:
+            return
+        self.active = False
+        elapsed = time.perf_counter() - self.start_time
+        self._stop_sampling.set()
+        self._sampler.join(timeout=1)
+
+        if self.frames_done % self.snapshot_interval != 0:
+            self._snapshot()
+        tracemalloc.stop()
+
+        if self.profile is not None and self.frames_done > 0:
+            self.profile.dump_stats(os.path.join(self.output_dir, "cpu.prof"))
+            report = io.StringIO()
+            pstats.Stats(self.profile, stream=report).sort_stats('cumulative').print_stats(60)
+            with open(os.path.join(self.output_dir, "cpu_cumulative.txt"), 'w', encoding='utf-8') as f:
+                f.write(report.getvalue())
+
+        with open(os.path.join(self.output_dir, "stacks.collapsed"), 'w', encoding='utf-8') as f:
+            for stack, count in self.stack_counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+        with open(os.path.join(self.output_dir, "memory.csv"), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.memory_rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(self.memory_rows)
+
+        with open(os.path.join(self.output_dir, "summary.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"分析帧数: {self.frames_done}\n")
+            f.write(f"用时: {elapsed:.2f}s, 平均每帧 {elapsed / max(self.frames_done, 1) * 1000:.1f}ms\n")
+            f.write(f"调用栈采样数: {sum(self.stack_counts.values())}\n")
+            first, last = self.memory_rows[0], self.memory_rows[-1]
+            f.write(f"tracemalloc 当前内存: {first['traced_current'] / 1024:.1f}KB → "
+                    f"{last['traced_current'] / 1024:.1f}KB\n")
+            for name in self.watched:
+                f.write(f"{name}: {first[f'{name}_len']} 项 / {first[f'{name}_bytes'] / 1024:.1f}KB → "
+                        f"{last[f'{name}_len']} 项 / {last[f'{name}_bytes'] / 1024:.1f}KB\n")
+        print(f"性能分析结果已保存到: {self.output_dir}")
@@ -0,0 +1,123 @@
+import os
+
+import cv2
+import numpy as np
+import yaml
+
+# 标定文件目录
+CALIBRATION_DIR = "calibration"
+
+
+def find_calibration_file(source_name, calibration_dir=CALIBRATION_DIR):
+    """
+    查找视频源对应的标定文件，找不到时返回默认标定文件。
+    :param source_name: 视频文件路径，或摄像头名称（如 camera_0）
+    :param calibration_dir: 标定文件目录
+    :return: 标定文件路径，目录中没有任何标定文件时返回 None
+    """
+    stem = os.path.splitext(os.path.basename(str(source_name)))[0]
+    for name in (stem, 'default'):
+        path = os.path.join(calibration_dir, f"{name}.yaml")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+class SceneCalibration:
+    """
+    场景标定
+    作用：
+        从标定文件读取区域多边形、计数线和地面参考点（或单应矩阵），按实际帧尺寸自动缩放，
+        并在加载时一次性生成 像素 → 地面坐标（米）的查找表。
+    使用：
+        calibration = SceneCalibration.load(path, frame_width, frame_height)
+        ground = calibration.to_ground(centers)  # 每帧只需一次数组查表
+    """
+    def __init__(self, image_size, zones, lines=None, homography=None, reference_points=None,
+                 frame_size=None, lut_step=1):
+        """
+        :param image_size: 标定时的图像分辨率 (width, height)
+        :param zones: {区域名称: 多边形顶点列表}
+        :param lines: 虚拟计数线列表
+        :param homography: 标定分辨率下的单应矩阵（像素 → 地面坐标）
+        :param reference_points: {'image': 像素坐标列表, 'ground': 地面坐标列表}，未给出单应矩阵时使用
+        :param frame_size: 实际帧尺寸 (width, height)，为 None 时与标定分辨率一致
+        :param lut_step: 查找表采样间隔（像素），大于 1 时以精度换取内存
+        """
+        self.image_size = tuple(int(v) for v in image_size)
+        self.frame_size = tuple(int(v) for v in frame_size) if frame_size else self.image_size
+        scale_x = self.frame_size[0] / self.image_size[0]
+        scale_y = self.frame_size[1] / self.image_size[1]
+        scale = np.array([scale_x, scale_y], dtype=np.float32)
+
+        # 区域和计数线按实际帧尺寸缩放
+        self.zones = {name: np.round(np.array(points, dtype=np.float32) * scale).astype(np.int32)
+                      for name, points in (zones or {}).items()}
+        self.lines = [{'name': line.get('name', f'line{i}'),
+                       'points': (np.array(line['points'], dtype=np.float32) * scale).tolist()}
+                      for i, line in enumerate(lines or [])]
+
+        # 单应矩阵换算到实际分辨率：H' = H · diag(1/sx, 1/sy, 1)
+        self.homography = None
+        if homography is not None:
+            base = np.array(homography, dtype=np.float64).reshape(3, 3)
+        elif reference_points:
+            image_points = np.array(reference_points['image'], dtype=np.float32)
+            ground_points = np.array(reference_points['ground'], dtype=np.float32)
+            if len(image_points) == 4:
+                base = cv2.getPerspectiveTransform(image_points, ground_points).astype(np.float64)
+            else:
+                base, _ = cv2.findHomography(image_points, ground_points)
+        else:
+            base = None
+        if base is not None:
+            self.homography = base @ np.diag([1.0 / scale_x, 1.0 / scale_y, 1.0])
+
+        self.lut_step = max(1, int(lut_step))
+        self.ground_lut = self._build_ground_lut() if self.homography is not None else None
+
+    @classmethod
+    def load(cls, path, frame_width=None, frame_height=None, lut_step=1):
+        """
+        从 YAML 标定文件加载并缩放到实际帧尺寸。
+        :param path: 标定文件路径
+        :param frame_width: 实际帧宽度
+        :param frame_height: 实际帧高度
+        :param lut_step: 查找表采样间隔（像素）
+        :return: SceneCalibration 实例
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+        frame_size = (frame_width, frame_height) if frame_width and frame_height else None
+        return cls(config['image_size'], config.get('zones', {}), config.get('lines'),
+                   config.get('homography'), config.get('reference_points'), frame_size, lut_step)
+
+    def _build_ground_lut(self):
+        """生成查找表：lut[y // step, x // step] 为该像素对应的地面坐标（米）"""
+        width, height = self.frame_size
+        xs = np.arange(0, width, self.lut_step, dtype=np.float32) + (self.lut_step - 1) / 2
+        ys = np.arange(0, height, self.lut_step, dtype=np.float32) + (self.lut_step - 1) / 2
+        grid = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 1, 2)
+        ground = cv2.perspectiveTransform(grid, self.homography)
+        return ground.reshape(len(ys), len(xs), 2).astype(np.float32)
+
+    @property
+    def has_ground_plane(self):
+        """是否有可用的地面坐标映射"""
+        return self.ground_lut is not None
+
+    def get_zone(self, name, default=None):
+        """返回缩放后的区域多边形"""
+        return self.zones.get(name, default)
+
+    def to_ground(self, points):
+        """
+        把像素坐标批量映射为地面坐标（米）。
+        :param points: 像素坐标数组，形状为 (N, 2)
+        :return: 地面坐标数组，形状为 (N, 2)
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        rows, cols = self.ground_lut.shape[:2]
+        ix = np.clip(points[:, 0].astype(np.int64) // self.lut_step, 0, cols - 1)
+        iy = np.clip(points[:, 1].astype(np.int64) // self.lut_step, 0, rows - 1)
+        return self.ground_lut[iy, ix]
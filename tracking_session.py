@@ -0,0 +1,581 @@
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from object_tracking import (ALERT_OBJ_LIST, DEFAULT_PARAMS, anchor_points, encode_warning_frame,
+                             initialize_tracking, nms, track_frame)
+
+
+class Event:
+    """事件基类：所有事件都带有视频时间和帧序号"""
+    __slots__ = ('timestamp', 'frame_index')
+
+    def __init__(self, timestamp, frame_index):
+        self.timestamp = timestamp
+        self.frame_index = frame_index
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self._fields()
+                           if name not in ('frame', 'jpeg'))
+        return f"{type(self).__name__}({fields})"
+
+    @classmethod
+    def _fields(cls):
+        return [name for klass in reversed(cls.__mro__) for name in getattr(klass, '__slots__', ())]
+
+
+class FrameProcessed(Event):
+    """一帧处理完成"""
+    __slots__ = ('frame', 'active_tracks', 'tracks')
+
+    def __init__(self, timestamp, frame_index, frame, active_tracks, tracks=None):
+        super().__init__(timestamp, frame_index)
+        self.frame = frame  # 标注后的帧
+        self.active_tracks = active_tracks
+        # 过滤后的最终目标 {'ids', 'classes', 'boxes'（中心点格式）, 'in_zone', 'in_warning_zone', 'violating'}，
+        # 各项为长度相同的数组
+        self.tracks = tracks
+
+
+class ZoneEvent(Event):
+    """统计区域事件，订阅该类型可同时接收进入和离开事件"""
+    __slots__ = ('track_id', 'track_class')
+
+    def __init__(self, timestamp, frame_index, track_id, track_class):
+        super().__init__(timestamp, frame_index)
+        self.track_id = track_id
+        self.track_class = track_class
+
+
+class ZoneEnter(ZoneEvent):
+    """目标进入统计区域"""
+    __slots__ = ()
+
+
+class ZoneExit(ZoneEvent):
+    """目标离开统计区域"""
+    __slots__ = ()
+
+
+class Violation(Event):
+    """警报事件（每次警报事件只发布一次）"""
+    __slots__ = ('track_id', 'track_class', 'message', 'jpeg', 'repeat')
+
+    def __init__(self, timestamp, frame_index, track_id, track_class, message, jpeg, repeat):
+        super().__init__(timestamp, frame_index)
+        self.track_id = track_id
+        self.track_class = track_class
+        self.message = message
+        # 不含标注的警告帧（JPEG 数据），回放缓存时为 None。订阅者的队列中只保存编码后的数据，不保存整帧
+        self.jpeg = jpeg
+        self.repeat = repeat  # 该目标之前是否已经报过警
+
+
+class StatsTick(Event):
+    """定期发布的统计数据"""
+    __slots__ = ('stats',)
+
+    def __init__(self, timestamp, frame_index, stats):
+        super().__init__(timestamp, frame_index)
+        self.stats = stats
+
+
+class Subscription:
+    """
+    一个订阅者
+    模式：
+        inline：在发布线程中直接调用，只适合非常轻量的回调
+        thread：独立线程从有界队列中取事件调用，回调再慢也不会阻塞检测
+        queue：事件放入有界队列，由订阅者在自己的线程中调用 drain() 处理（如 Qt 主线程更新界面）
+    队列已满时丢弃最旧的事件，保证订阅者拿到的总是最新的数据。
+    """
+    def __init__(self, event_type, callback, mode='inline', maxsize=64, name=None):
+        if mode not in ('inline', 'thread', 'queue'):
+            raise ValueError(f"未知的订阅模式: {mode}")
+        self.event_type = event_type
+        self.callback = callback
+        self.mode = mode
+        self.name = name or getattr(callback, '__name__', 'subscriber')
+        self.delivered = 0  # 已处理的事件数
+        self.dropped = 0  # 因队列已满丢弃的事件数
+        self.errors = 0  # 回调抛出异常的次数
+        self._queue = queue.Queue(maxsize=maxsize) if mode != 'inline' else None
+        self._thread = None
+        if mode == 'thread':
+            self._thread = threading.Thread(target=self._run, name=f"subscriber-{self.name}", daemon=True)
+            self._thread.start()
+
+    @property
+    def backlog(self):
+        """等待处理的事件数"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def deliver(self, event):
+        """把事件交给订阅者（非阻塞）"""
+        if self.mode == 'inline':
+            self._call(event)
+            return
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def drain(self, limit=None):
+        """处理队列中等待的事件（queue 模式），返回处理的事件数"""
+        count = 0
+        while limit is None or count < limit:
+            try:
+                event = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._call(event)
+            count += 1
+        return count
+
+    def _call(self, event):
+        try:
+            self.callback(event)
+            self.delivered += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"事件处理错误（{self.name}）: {e}")
+
+    def _run(self):
+        while True:
+            event = self._queue.get()
+            if event is None:
+                break
+            self._call(event)
+
+    def close(self):
+        """停止订阅：thread 模式等待队列中剩余的事件处理完成"""
+        if self._thread is not None:
+            while True:
+                try:
+                    self._queue.put(None, timeout=0.1)
+                    break
+                except queue.Full:
+                    if not self._thread.is_alive():
+                        break
+            self._thread.join()
+            self._thread = None
+
+
+class EventBus:
+    """
+    发布/订阅事件总线
+    作用：
+        处理每帧时原来直接更新界面控件、保存警告帧、播放语音，所有消费者都在检测循环中同步执行。
+        通过事件总线，数据库、界面、语音和录制各自订阅需要的事件，在自己的线程或队列中处理，不会拖慢检测。
+    """
+    def __init__(self):
+        self.subscriptions = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type, callback, mode='inline', maxsize=64, name=None):
+        """
+        订阅事件
+        :param event_type: 事件类型（Event 的子类），订阅 Event 表示接收全部事件
+        :param callback: 回调函数，参数为事件对象
+        :param mode: inline / thread / queue，见 Subscription
+        :param maxsize: thread / queue 模式的队列长度
+        :return: Subscription 实例
+        """
+        subscription = Subscription(event_type, callback, mode, maxsize, name)
+        with self._lock:
+            self.subscriptions = self.subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions = [s for s in self.subscriptions if s is not subscription]
+        subscription.close()
+
+    def publish(self, event):
+        """发布事件给所有订阅了该类型的订阅者"""
+        for subscription in self.subscriptions:
+            if isinstance(event, subscription.event_type):
+                subscription.deliver(event)
+
+    def drain(self, limit=None):
+        """在调用线程中处理所有 queue 模式订阅者等待的事件"""
+        return sum(s.drain(limit) for s in self.subscriptions if s.mode == 'queue')
+
+    def close(self):
+        """停止所有订阅者"""
+        with self._lock:
+            subscriptions, self.subscriptions = self.subscriptions, []
+        for subscription in subscriptions:
+            subscription.close()
+
+
+class TrackingSession:
+    """
+    跟踪会话
+    作用：
+        代替 process_frame 的 14 个位置参数和 7 元组返回值，把一路视频的跟踪状态和各项组件保存在一个紧凑对象中，
+        track() 完成一帧的过滤、区域统计和预警判断，process() 在此基础上把 帧处理完成 / 进入区域 / 离开区域 / 警报 / 统计 事件发布到事件总线。
+        会话本身不更新界面、不写文件、不播放语音，这些都由订阅者完成。
+    """
+    __slots__ = ('bus', 'model', 'renderer', 'line_counter', 'params', 'tracker', 'dwell_engine',
+                 'alert_machine', 'polygon_points', 'polygon_points1', 'track_history', 'entered_ids',
+                 'entry_time', 'warned_ids', 'count_passed', 'count_exited', 'frame_index',
+                 'stats_interval', 'stats_provider')
+
+    def __init__(self, bus=None, model=None, polygon_points=None, polygon_points1=None, renderer=None,
+                 line_counter=None, params=None, tracker=None, dwell_engine=None, alert_machine=None,
+                 stats_interval=5, stats_provider=None):
+        """
+        :param bus: 事件总线，为 None 时创建新的 EventBus
+        :param model: YOLO 模型，只在 process 未提供 detections 时使用
+        :param polygon_points: 统计区域，为 None 时使用 initialize_tracking 的默认值
+        :param polygon_points1: 警告区域，为 None 时使用 initialize_tracking 的默认值
+        :param renderer: 标注渲染器（AnnotationRenderer）
+        :param line_counter: 虚拟计数线计数器
+        :param params: 过滤和预警参数（见 object_tracking.DEFAULT_PARAMS）
+        :param tracker: 内置跟踪器
+        :param dwell_engine: 停留时间引擎
+        :param alert_machine: 警报状态机
+        :param stats_interval: 每隔多少帧发布一次 StatsTick
+        :param stats_provider: 返回额外统计数据（字典）的函数，结果合并到 StatsTick 中
+        """
+        (_, self.track_history, self.entered_ids, self.entry_time, self.warned_ids, self.count_passed,
+         self.count_exited, default_zone, default_warning_zone, _, _, _) = initialize_tracking(None, None, None)
+        self.polygon_points = default_zone if polygon_points is None else polygon_points
+        self.polygon_points1 = default_warning_zone if polygon_points1 is None else polygon_points1
+        self.bus = EventBus() if bus is None else bus
+        self.model = model
+        self.renderer = renderer
+        self.line_counter = line_counter
+        self.params = params
+        self.tracker = tracker
+        self.dwell_engine = dwell_engine
+        self.alert_machine = alert_machine
+        self.frame_index = 0
+        self.stats_interval = stats_interval
+        self.stats_provider = stats_provider
+
+    @property
+    def current_vehicles(self):
+        """当前在统计区域内的目标数"""
+        return self.count_passed - self.count_exited
+
+    def track(self, frame, detections=None, timestamp=None, frame_shape=None):
+        """
+        处理一帧：过滤检测结果，更新轨迹、区域计数和预警状态，不发布事件
+        :param frame: 帧图像，回放检测缓存时可以为 None（需提供 detections 和 frame_shape，且需要渲染器），
+                      此时不会生成警告帧
+        :param detections: 检测数据（格式同 extract_detections），为 None 时使用 model（有 tracker 时用内置跟踪器）检测
+        :param timestamp: 当前帧的时间（秒），为 None 时使用 time.time()；回放缓存时传入视频时间
+        :param frame_shape: 帧尺寸 (height, width)，仅在 frame 为 None 时使用
+        :return: (标注后的帧, 事件列表)。事件为 ('enter' | 'exit', track_id, track_class)、
+                 ('violation', track_id, track_class, 警告信息, 警告帧 JPEG 数据, 是否重复报警)，
+                 最后一个为 ('tracks', ids, classes, boxes, 在统计区域内, 在警告区域内, 正在警报)
+        """
+        params = DEFAULT_PARAMS if self.params is None else {**DEFAULT_PARAMS, **self.params}
+        now = time.time() if timestamp is None else timestamp
+        renderer, line_counter, dwell_engine, alert_machine = (self.renderer, self.line_counter, self.dwell_engine,
+                                                               self.alert_machine)
+        polygon_points, polygon_points1 = self.polygon_points, self.polygon_points1
+        track_history, entered_ids, entry_time, warned_ids = (self.track_history, self.entered_ids, self.entry_time,
+                                                              self.warned_ids)
+        count_passed, count_exited = self.count_passed, self.count_exited
+        events = []
+        if frame is not None:
+            frame_shape = frame.shape
+        # 使用模块级定义的目标类别列表
+
+        if detections is None:
+            # 使用 YOLO 模型对当前帧进行目标跟踪，只跟踪指定类别的目标，并设置置信度阈值
+            results, detections = track_frame(frame, self.model, self.tracker)
+        else:
+            results = None
+
+        if renderer is None:
+            # 如果有检测结果，绘制检测框；否则使用原始帧图像
+            a_frame = results[0].plot(line_width=2) if results is not None and results[0] is not None else frame
+
+            # 创建一个与帧图像相同大小的掩码，用于绘制特定区域
+            mask = np.zeros_like(frame)
+            # 在掩码上填充特定区域
+            cv2.fillPoly(mask, [polygon_points], (0, 255, 255))
+            # 将掩码与帧图像叠加，使特定区域半透明显示
+            a_frame = cv2.addWeighted(a_frame, 1, mask, 0.1, 0)
+        else:
+            # 使用渲染器时，所有标注在帧处理结束后一次性绘制到原始帧上
+            a_frame = frame
+
+        # 渲染器需要的绘制数据：最终检测结果、轨迹和警告标注
+        final_boxes, final_ids, final_classes = [], [], []
+        trails = []
+        warning_labels = []
+        # 各目标本帧的区域状态：(在统计区域内, 在警告区域内, 正在警报)
+        track_zones = []
+
+        # 如果检测结果不为空且包含边界框和ID信息
+        if detections is not None:
+            # 获取检测到的目标的边界框、ID、类别和置信度分数
+            boxes, track_ids, track_classes, scores = detections
+            boxes = np.asarray(boxes)
+            scores = np.asarray(scores)
+            track_ids = np.asarray(track_ids).tolist()
+            track_classes = np.asarray(track_classes).tolist()
+
+            # 过滤掉过大和置信度不足的检测框
+            valid_indices = []
+            for i, box in enumerate(boxes):
+                x, y, w, h = box
+                frame_area = frame_shape[0] * frame_shape[1]
+                box_area = w * h
+                # 过滤条件：检测框面积不超过视频面积的五分之一（area_fraction）
+                if box_area < frame_area * params['area_fraction'] and scores[i] >= params['conf']:
+                    valid_indices.append(i)
+
+            boxes = boxes[valid_indices]
+            scores = scores[valid_indices]
+            track_ids = [track_ids[i] for i in valid_indices]
+            track_classes = [track_classes[i] for i in valid_indices]
+
+
+            keep_indices = nms(boxes, scores, iou_threshold=params['iou_threshold'])
+
+            filtered_boxes = boxes[keep_indices]
+            filtered_ids = [track_ids[i] for i in keep_indices]
+            filtered_classes = [track_classes[i] for i in keep_indices]
+
+            # 确保每个框只包含一个主要目标
+            final_boxes = []
+            final_ids = []
+            final_classes = []
+
+            for box, track_id, track_class in zip(filtered_boxes, filtered_ids, filtered_classes):
+                x, y, w, h = box
+                aspect_ratio = w / h
+
+                # 过滤掉不合理的宽高比 (0.2-5.0是合理范围)
+                if params['min_aspect'] < aspect_ratio < params['max_aspect']:
+                    final_boxes.append(box)
+                    final_ids.append(track_id)
+                    final_classes.append(track_class)
+
+            # 区域、停留、警报和计数线使用同一个参考点
+            centers = anchor_points(final_boxes)
+            if dwell_engine is not None:
+                # 所有目标的区域判断和停留计时一次完成
+                zone_inside, _, zone_exceeded = dwell_engine.update(final_ids, centers, final_classes, timestamp=now)
+                warning_zone_index = dwell_engine.zone_index('warning_zone')
+                warning_flags = zone_inside[:, warning_zone_index]
+            elif alert_machine is not None:
+                warning_flags = np.array([cv2.pointPolygonTest(polygon_points1, (float(cx), float(cy)), False) >= 0
+                                          for cx, cy in centers], dtype=bool)
+            if alert_machine is not None:
+                # 所有目标的警报状态一次完成转移，有停留时间引擎时使用其超时判断
+                alert_violating, alert_started = alert_machine.update(
+                    final_ids, warning_flags, final_classes, now,
+                    exceeded=zone_exceeded[:, warning_zone_index] if dwell_engine is not None else None)
+
+            # 使用最终过滤后的结果进行后续处理
+            for i, (box, track_id, track_class) in enumerate(zip(final_boxes, final_ids, final_classes)):
+                x, y, w, h = box
+                # 区域判断的参考点（见 anchor_points）
+                center = centers[i]
+
+                # 获取该目标的跟踪历史
+                track = track_history[track_id]
+                # 将当前中心点添加到跟踪历史中
+                track.append((float(x), float(y)))
+                # 只保留最近的 30 个跟踪点，避免内存占用过大
+                if len(track) > 30:
+                    track.pop(0)
+
+                if renderer is None:
+                    # 将跟踪点转换为适合 OpenCV 绘制的格式
+                    points = np.hstack(track).astype(np.int32).reshape(-1, 1, 2)
+                    # 在帧图像上绘制目标的跟踪轨迹
+                    cv2.polylines(a_frame, [points], isClosed=False, color=(0, 0, 255), thickness=2)
+                else:
+                    trails.append(track)
+
+                # 如果目标还未进入特定区域且当前位于特定区域内
+                if track_id not in entered_ids and cv2.pointPolygonTest(polygon_points, center, False) >= 0:
+                    # 进入特定区域的目标数量加 1
+                    count_passed += 1
+                    # 将该目标的 ID 添加到已进入集合中
+                    entered_ids.add(track_id)
+                    events.append(('enter', track_id, track_class))
+
+                # 如果目标位于警告区域内
+                if dwell_engine is not None or alert_machine is not None:
+                    in_warning_zone = bool(warning_flags[i])
+                else:
+                    in_warning_zone = cv2.pointPolygonTest(polygon_points1, center, False) >= 0
+                violating = False
+                if in_warning_zone:
+                    if alert_machine is not None:
+                        violating = bool(alert_violating[i])
+                    elif dwell_engine is not None:
+                        # 停留阈值按类别配置，未配置阈值的类别不会超时
+                        violating = bool(zone_exceeded[i, warning_zone_index])
+                    elif track_class in ALERT_OBJ_LIST:
+                        if track_id not in entry_time:
+                            # 记录目标进入警告区域的时间
+                            entry_time[track_id] = now
+                            violating = False
+                        else:
+                            # 如果目标在警告区域内停留超过 2 秒（dwell_seconds）
+                            violating = now - entry_time[track_id] > params['dwell_seconds']
+                    else:
+                        violating = False
+                        # 如果目标类别不在需要警报的列表中，移除其进入警告区域的时间记录
+                        if track_id in entry_time:
+                            del entry_time[track_id]
+
+                    if violating:
+                        if renderer is None:
+                            # 创建一个与帧图像相同大小的掩码，用于绘制警告区域
+                            mask1 = np.zeros_like(frame)
+                            # 在掩码上填充警告区域
+                            cv2.fillPoly(mask1, [polygon_points1], (0, 0, 255))
+                            # 将掩码与帧图像叠加，使警告区域半透明显示
+                            a_frame = cv2.addWeighted(a_frame, 1, mask1, 0.2, 0)
+                            # 在帧图像上显示警告信息
+                            cv2.putText(a_frame, f'warn: ID {track_id}', (int(center[0]), int(center[1] - 10)),
+                                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+                        else:
+                            warning_labels.append((track_id, center))
+
+                        # 每次警报事件只报警一次（没有状态机时每个 ID 只报警一次），停留期间不再逐帧输出
+                        if alert_machine is not None:
+                            new_alert = bool(alert_started[i])
+                        else:
+                            new_alert = track_id not in warned_ids
+                        if new_alert:
+                            warning_msg = f"警告：物体 ID {track_id} ({track_class}) 进入了警告区域！"
+                            print(warning_msg)
+                            # 警告帧在绘制标注之前编码为 JPEG，事件只携带编码后的数据，不复制整帧
+                            events.append(('violation', track_id, track_class, warning_msg,
+                                           encode_warning_frame(frame), track_id in warned_ids))
+                            # 将该目标的 ID 添加到已警告集合中
+                            warned_ids.add(track_id)
+                # 如果目标已经进入特定区域且当前不在特定区域内
+                elif track_id in entered_ids and cv2.pointPolygonTest(polygon_points, center, True) < 0:
+                    # 离开特定区域的目标数量加 1
+                    count_exited += 1
+                    # 从已进入集合中移除该目标的 ID
+                    entered_ids.remove(track_id)
+                    events.append(('exit', track_id, track_class))
+                    # 如果该目标有进入警告区域的时间记录，移除该记录
+                    if track_id in entry_time:
+                        del entry_time[track_id]
+
+                track_zones.append((track_id in entered_ids, in_warning_zone, violating))
+
+        zones = np.array(track_zones, dtype=bool).reshape(-1, 3)
+        events.append(('tracks', np.asarray(final_ids, dtype=np.int64), np.asarray(final_classes, dtype=np.int64),
+                       np.asarray(final_boxes, dtype=np.float32).reshape(-1, 4), zones[:, 0], zones[:, 1], zones[:, 2]))
+
+        # 所有目标的位移向量一次性与全部计数线做相交判断
+        if line_counter is not None:
+            line_counter.update(final_ids, anchor_points(final_boxes), final_classes)
+
+        # 所有状态更新完成后再绘制，保证保存的警告帧不含标注
+        if renderer is not None and renderer.enabled and a_frame is not None:
+            renderer.render(a_frame, final_boxes, final_ids, final_classes, trails=trails,
+                            zone=polygon_points, warning_zone=polygon_points1 if warning_labels else None,
+                            warnings=warning_labels,
+                            lines=line_counter.lines if line_counter is not None else None)
+
+        self.count_passed, self.count_exited = count_passed, count_exited
+        return a_frame, events
+
+    def process(self, frame, detections=None, timestamp=None, frame_shape=None):
+        """
+        处理一帧并发布事件
+        :param frame: 帧图像，回放检测缓存时可以为 None（需提供 detections 和 frame_shape）
+        :param detections: 检测数据（格式同 extract_detections），为 None 时使用 model 检测
+        :param timestamp: 当前帧的时间（秒），为 None 时使用 time.time()
+        :param frame_shape: 帧尺寸 (height, width)，仅在 frame 为 None 时使用
+        :return: 标注后的帧
+        """
+        now = time.time() if timestamp is None else timestamp
+        annotated_frame, events = self.track(frame, detections, now, frame_shape)
+
+        index = self.frame_index
+        publish = self.bus.publish
+        tracks = None
+        for kind, track_id, track_class, *extra in events:
+            if kind == 'tracks':
+                boxes, in_zone, in_warning_zone, violating = extra
+                tracks = {'ids': track_id, 'classes': track_class, 'boxes': boxes, 'in_zone': in_zone,
+                          'in_warning_zone': in_warning_zone, 'violating': violating}
+            elif kind == 'enter':
+                publish(ZoneEnter(now, index, track_id, track_class))
+            elif kind == 'exit':
+                publish(ZoneExit(now, index, track_id, track_class))
+            else:
+                publish(Violation(now, index, track_id, track_class, *extra))
+        active_tracks = len(detections[1]) if detections is not None else 0
+        publish(FrameProcessed(now, index, annotated_frame, active_tracks, tracks))
+
+        self.frame_index += 1
+        if self.stats_interval and self.frame_index % self.stats_interval == 0:
+            stats = {
+                'count_passed': self.count_passed,
+                'count_exited': self.count_exited,
+                'current_vehicles': self.current_vehicles,
+                'frame_count': self.frame_index,
+                'active_alerts': self.alert_machine.active if self.alert_machine is not None else None,
+            }
+            if self.stats_provider is not None:
+                stats.update(self.stats_provider())
+            publish(StatsTick(now, index, stats))
+        return annotated_frame
+
+    def get_state(self):
+        """
+        返回会话的跟踪状态（用于断点续处理）。跟踪器、停留时间引擎、警报状态机和计数线
+        各自提供 get_state()，由调用方一起保存。
+        """
+        history_ids = [track_id for track_id, track in self.track_history.items() if track]
+        tracks = [self.track_history[track_id] for track_id in history_ids]
+        entry_ids = list(self.entry_time)
+        return {
+            'history_ids': np.array(history_ids, dtype=np.int64),
+            'history_lengths': np.array([len(track) for track in tracks], dtype=np.int64),
+            'history_points': np.array([point for track in tracks for point in track],
+                                       dtype=np.float64).reshape(-1, 2),
+            'entered_ids': np.array(sorted(self.entered_ids), dtype=np.int64),
+            'warned_ids': np.array(sorted(self.warned_ids), dtype=np.int64),
+            'entry_ids': np.array(entry_ids, dtype=np.int64),
+            'entry_times': np.array([self.entry_time[track_id] for track_id in entry_ids], dtype=np.float64),
+            'count_passed': self.count_passed,
+            'count_exited': self.count_exited,
+            'frame_index': self.frame_index,
+        }
+
+    def set_state(self, state):
+        """从 get_state 的结果恢复跟踪状态"""
+        self.track_history.clear()
+        points = state['history_points'].tolist()
+        offsets = np.concatenate([[0], np.cumsum(state['history_lengths'])])
+        for i, track_id in enumerate(state['history_ids'].tolist()):
+            self.track_history[track_id] = [tuple(point) for point in points[offsets[i]:offsets[i + 1]]]
+        self.entered_ids = set(state['entered_ids'].tolist())
+        self.warned_ids = set(state['warned_ids'].tolist())
+        self.entry_time = dict(zip(state['entry_ids'].tolist(), state['entry_times'].tolist()))
+        self.count_passed = int(state['count_passed'])
+        self.count_exited = int(state['count_exited'])
+        self.frame_index = int(state['frame_index'])
+
+    def close(self):
+        """停止事件总线上的所有订阅者，等待后台订阅者处理完剩余事件"""
+        self.bus.close()
@@ -11,8 +11,28 @@ from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure  # Matplotlib绘图
 import matplotlib as mpl  # Matplotlib配置
 from database_integration import DBIntegration  # 数据库集成
-from voice_alert import play_voice_alert  # 语音警报
-from object_tracking import initialize_tracking, process_frame  # 跟踪和警报功能
+from voice_alert import play_voice_alert, get_pending_alerts  # 语音警报
+from object_tracking import (initialize_tracking, track_frame, empty_detections, write_warning_frame,
+                             ByteTracker, OBJ_LIST, TRACK_CONF)  # 跟踪和警报功能
+from tracking_session import EventBus, TrackingSession, FrameProcessed, Violation, StatsTick  # 跟踪会话和事件总线
+from annotation_renderer import AnnotationRenderer  # 轻量级标注渲染
+from video_encoder import BackgroundVideoEncoder  # 后台视频编码
+from frame_reader import PrefetchFrameReader, LatestFrameReader  # 预取式视频解码、实时低延迟读取
+from line_counter import LineCrossingCounter  # 虚拟计数线
+from scene_calibration import SceneCalibration, find_calibration_file  # 场景标定
+from detection_cache import DetectionCache, DetectionCacheWriter, tracking_cache_key  # 检测结果录制/回放
+from dwell_engine import DwellTimeEngine, DWELL_THRESHOLDS  # 基于视频时间的停留计时
+from alert_state import AlertStateMachine  # 按警报事件去抖的警报状态机
+from motion_gate import MotionGate  # 空闲场景的运动门控
+from monitor_server import MonitorServer, MONITOR_PORT_ENV  # 本地 HTTP/WebSocket 监控服务
+from metrics import REGISTRY, PipelineMetrics  # Prometheus 运行指标
+from profiler import ProcessingProfiler, PROFILE_ENV  # 性能分析
+from checkpoint import (checkpoint_path, video_signature, config_matches, collect_state, restore_state,
+                        save_checkpoint, load_checkpoint, remove_checkpoint)  # 断点续处理
+from trajectory_export import TrajectoryExporter  # 轨迹流式导出
+
+# 通过精度验证后发布的 INT8 OpenVINO 模型目录
+INT8_MODEL_PATH = "best_int8_openvino_model"
 
 # 启用cuDNN自动优化卷积运算速度（适合固定输入尺寸的视频检测）
 torch.backends.cudnn.benchmark = True
@@ -32,11 +52,16 @@ class SpeedAnalyzer:
         2. 相邻帧之间计算像素距离 → 转换为实际距离
         3. 用时间差计算瞬时速度
         4. 用滑动窗口（最近5次速度）做简单滤波，减少抖动
+    地面坐标模式：
+        ground_plane=True 时输入的 center 已经由场景标定的查找表换算为地面坐标（米），
+        不再使用全画面统一的 pixels_per_meter，可以正确处理透视带来的远近差异。
     """
-    def __init__(self, pixels_per_meter=5):
+    def __init__(self, pixels_per_meter=5, ground_plane=False):
         self.tracks = {}  # 存储每辆车的轨迹信息
         self.speeds = {}  # 存储每辆车的平滑速度（km/h）
-        self.pixels_per_meter = pixels_per_meter  # 像素到米的比例（需要根据场景校准）
+        self.ground_plane = ground_plane  # 输入坐标是否为地面坐标（米）
+        # 像素到米的比例（需要根据场景校准），地面坐标模式下为 1
+        self.pixels_per_meter = 1.0 if ground_plane else pixels_per_meter
         self.all_tracked_vehicles = set()  # 累计跟踪的车辆ID
 
     def update(self, track_id, center, timestamp):
@@ -44,7 +69,7 @@ class SpeedAnalyzer:
         更新车辆位置并计算速度
         参数：
             track_id: YOLOv8跟踪输出的车辆ID
-            center: 当前帧车辆边界框中心坐标 (x, y)
+            center: 当前帧车辆边界框中心坐标 (x, y)，地面坐标模式下为地面坐标（米）
             timestamp: 当前帧时间戳
         流程：
             1. 如果是新车辆，初始化轨迹数据
@@ -97,6 +122,42 @@ class SpeedAnalyzer:
         self.tracks[track_id]['prev_pos'] = center
         self.tracks[track_id]['prev_time'] = timestamp
 
+    def get_state(self):
+        """
+        返回速度计算状态（用于断点续处理）。
+        positions 只追加不读取，不影响速度结果，断点中只保存最新位置。
+        """
+        ids = list(self.tracks)
+        tracks = [self.tracks[track_id] for track_id in ids]
+        speed_ids = list(self.speeds)
+        return {
+            'ids': np.array(ids, dtype=np.int64),
+            'prev_pos': np.array([track['prev_pos'] for track in tracks], dtype=np.float64).reshape(-1, 2),
+            'prev_time': np.array([track['prev_time'] for track in tracks], dtype=np.float64),
+            'speed_window': np.array([track['speeds'] for track in tracks], dtype=np.float64).reshape(-1, 5),
+            'speed_index': np.array([track['speed_index'] for track in tracks], dtype=np.int64),
+            'last_seen': np.array([track['last_seen'] for track in tracks], dtype=np.float64),
+            'speed_ids': np.array(speed_ids, dtype=np.int64),
+            'speeds': np.array([self.speeds[track_id] for track_id in speed_ids], dtype=np.float64),
+            'all_tracked': np.array(sorted(self.all_tracked_vehicles), dtype=np.int64),
+        }
+
+    def set_state(self, state):
+        """从 get_state 的结果恢复速度计算状态"""
+        self.tracks = {}
+        for i, track_id in enumerate(state['ids'].tolist()):
+            position = state['prev_pos'][i].astype(np.float32)
+            self.tracks[track_id] = {
+                'prev_pos': position,
+                'prev_time': float(state['prev_time'][i]),
+                'speeds': state['speed_window'][i].copy(),
+                'speed_index': int(state['speed_index'][i]),
+                'last_seen': float(state['last_seen'][i]),
+                'positions': [position]
+            }
+        self.speeds = dict(zip(state['speed_ids'].tolist(), state['speeds'].tolist()))
+        self.all_tracked_vehicles = set(state['all_tracked'].tolist())
+
     def calculate_average_speed(self):
         """计算所有车辆的平均速度（过滤掉0值）"""
         if not self.speeds:
@@ -154,8 +215,19 @@ class MainApp(QtWidgets.QMainWindow):
             self.add_warning("使用默认模型")
             model_pt_path = 'yolov8n.pt'
 
+        # CPU 上优先使用通过精度验证的 INT8 模型（由 coco_yolo_vehicles/quantize.py 生成）
+        if self.device.type == 'cpu' and os.path.isdir(INT8_MODEL_PATH):
+            model_pt_path = INT8_MODEL_PATH
+            self.add_warning("使用 INT8 量化模型")
+
+        self.model_path = model_pt_path
+
         try:
-            self.model = YOLO(model_pt_path).to(self.device)
+            if os.path.isdir(model_pt_path):
+                # 导出的模型不能 .to(device)，直接在 CPU 上推理
+                self.model = YOLO(model_pt_path, task='detect')
+            else:
+                self.model = YOLO(model_pt_path).to(self.device)
             print("模型加载成功")
         except Exception as e:
             self.add_warning(f"模型加载失败: {str(e)}")
@@ -165,8 +237,51 @@ class MainApp(QtWidgets.QMainWindow):
         self.RESULT_PATH = "result.mp4"  # 处理结果保存路径
         self.WARNING_FOLDER = "warning_frames"  # 异常帧保存文件夹
         self.VIDEO_PATH = ""  # 视频文件路径
+        self.RECORD_SIZE = None  # 结果视频分辨率 (width, height)，None 表示与输入一致
+        self.RECORD_FPS = None  # 结果视频帧率，None 表示录制全部帧（如设为 10 则按 10fps 抽帧录制）
+        self.ENCODER_BACKEND = "opencv"  # 编码后端：opencv（mp4v）或 ffmpeg（libx264）
+        self.FRAME_STRIDE = 1  # 视频文件的处理间隔，跳过的帧只 grab 不解码
+        self.START_TIME = None  # 处理区间起始时间（秒），None 表示从头开始
+        self.END_TIME = None  # 处理区间结束时间（秒），None 表示处理到结尾
+        # 虚拟计数线（1920x1080 坐标），按 起点→终点 方向区分左右两侧的穿越方向
+        self.COUNT_LINES = [{'name': '计数线', 'points': [[0, 585], [1918, 546]]}]
+        self.calibration = None  # 场景标定，在视频源打开、帧尺寸确定后加载
+        self.USE_BUILTIN_TRACKER = False  # 是否使用内置跟踪器代替 model.track(persist=True)
+        self.tracker = None  # 内置跟踪器
+        self.USE_DETECTION_CACHE = True  # 视频文件是否使用检测结果缓存（有缓存时回放，没有时录制）
+        self.detection_cache = None  # 回放用的检测结果缓存
+        self.detection_recorder = None  # 录制检测结果的写入器
+        self.DWELL_THRESHOLDS = dict(DWELL_THRESHOLDS)  # 各类别在警告区域的停留阈值（秒）
+        self.dwell_engine = None  # 停留时间引擎，按视频时间计时
+        self.ALERT_COOLDOWN = 10.0  # 警报解除后的冷却时间（秒），冷却期内再次进入不重复报警
+        self.alert_machine = None  # 警报状态机，每次警报事件只报警一次
+        self.event_bus = None  # 事件总线，界面、语音、警告帧和数据库作为订阅者
+        self.session = None  # 跟踪会话，保存当前视频源的跟踪状态
+        self.voice_alerts = None  # 语音警报订阅者（后台线程）
+        self.USE_MOTION_GATE = True  # 区域内没有运动且没有跟踪目标时跳过推理，只按心跳间隔推理
+        self.MOTION_HEARTBEAT = 2.0  # 空闲时的推理间隔（秒）
+        self.motion_gate = None  # 运动门控
+        self.active_tracks = 0  # 最近一次推理得到的跟踪目标数
+        self.MONITOR_PORT = int(os.environ.get(MONITOR_PORT_ENV, 0) or 0) or None  # 本地监控服务端口（如 8765），None 表示不启动
+        self.monitor = None  # 本地监控服务
+        self.metrics = None  # 当前视频流的运行指标，由监控服务的 /metrics 输出
+        self.PROFILE_FRAMES = int(os.environ.get(PROFILE_ENV, 0) or 0)  # 性能分析的帧数，0 表示不分析
+        self.profiler = None  # 处理循环性能分析器
+        self.CHECKPOINT_INTERVAL = 60.0  # 视频文件每隔多少秒保存一次断点，0 表示不保存
+        self.RESUME = False  # 开始处理视频文件时是否从上次的断点继续
+        self.resume_state = None  # 本次处理要恢复的断点 (meta, states)
+        self.last_checkpoint_time = 0.0  # 上次保存断点的时间
+        self.track_id_offset = 0  # 从断点继续且使用 model.track 时，新目标 ID 的偏移量
+        self.TRAJECTORY_DIR = None  # 轨迹导出目录（如 "trajectories"），None 表示不导出
+        self.trajectory_exporter = None  # 轨迹导出器
+        self.stream_name = None  # 当前视频源名称（运行指标、数据库和轨迹导出使用）
 
         self.camera_index = 0  # 默认摄像头索引
+        self.LIVE_MODE = True  # 摄像头使用低延迟模式：抓帧线程只保留最新帧，来不及处理的旧帧直接丢弃
+        self.capture_latencies = []  # 最近各帧从抓取到显示结果的延迟（秒，实时模式）
+        self.CAMERA_RETRY_MAX = 30.0  # 实时模式摄像头断开后重新打开的最长间隔（秒）
+        self.camera_retry_delay = 0.0  # 当前的重新打开间隔（秒），0 表示摄像头正常
+        self.camera_read_failed = False  # 摄像头读取失败是否已经提示过（恢复前不再重复提示）
         self.using_camera = False  # 是否使用摄像头
         self.processing = False  # 是否正在处理视频
 
@@ -174,6 +289,7 @@ class MainApp(QtWidgets.QMainWindow):
             os.makedirs(self.WARNING_FOLDER)  # 创建异常帧保存文件夹
 
         self.speed_analyzer = SpeedAnalyzer(pixels_per_meter=5)  # 初始化速度分析器
+        self.renderer = AnnotationRenderer(class_names=self.model.names)  # 初始化标注渲染器
         self.db_integration = DBIntegration()  # 初始化数据库集成
 
         self.frame_count = 0  # 帧计数器
@@ -190,17 +306,13 @@ class MainApp(QtWidgets.QMainWindow):
         self.inference_times = []  # 推理时间列表
         self.frame_times = []  # 帧处理时间列表
 
-        # 跟踪和警报相关变量
-        self.track_history = None
-        self.entered_ids = None
-        self.entry_time = None
-        self.warned_ids = None
-        self.count_passed = None
-        self.count_exited = None
+        # 跟踪区域（跟踪状态保存在 self.session 中）
         self.polygon_points = None
         self.polygon_points1 = None
+        self.line_counter = None
 
         self.init_video_label()  # 初始化视频显示区域
+        self.start_monitor()  # 按配置启动本地监控服务
 
     def init_video_label(self):
         """初始化视频显示区域（清空原有控件，创建新的占位标签）"""
@@ -322,10 +434,24 @@ class MainApp(QtWidgets.QMainWindow):
             }
         """)
 
+    def start_monitor(self):
+        """启动本地监控服务，控制室可以通过浏览器查看画面和实时统计"""
+        if not self.MONITOR_PORT:
+            return
+        self.monitor = MonitorServer(port=self.MONITOR_PORT, metrics_registry=REGISTRY)
+        if self.monitor.start():
+            self.add_warning(f"监控服务已启动: http://{self.monitor.host}:{self.monitor.port}/")
+        else:
+            self.add_warning(f"监控服务启动失败: {self.monitor.error}")
+            self.monitor = None
+
     def add_warning(self, message):
         """添加系统日志/警告信息到文本框"""
         current_time = time.strftime("%H:%M:%S")
         self.ui.warning_text.append(f"[{current_time}] {message}")
+        # 模型加载阶段监控服务尚未创建
+        if getattr(self, 'monitor', None) is not None:
+            self.monitor.publish_event(message)
 
         scrollbar = self.ui.warning_text.verticalScrollBar()
         scrollbar.setValue(scrollbar.maximum())
@@ -396,14 +522,29 @@ class MainApp(QtWidgets.QMainWindow):
             self.flow_ax.set_title('车辆流量图', fontsize=11, color='#343a40', pad=10)
             self.flow_canvas.draw()
 
-            # 初始化跟踪和警报相关变量
-            (self.videowriter, self.track_history, self.entered_ids, 
-             self.entry_time, self.warned_ids, self.count_passed, 
-             self.count_exited, self.polygon_points, self.polygon_points1, 
+            # 初始化区域和视频参数，跟踪状态在视频源设置完成后由跟踪会话创建
+            (self.videowriter, _, _, _, _, _, _, self.polygon_points, self.polygon_points1,
              self.fps, self.frame_width, self.frame_height) = initialize_tracking(
                 self.VIDEO_PATH, self.RESULT_PATH, self.WARNING_FOLDER
             )
 
+            self.line_counter = LineCrossingCounter(self.COUNT_LINES)
+            self.tracker = ByteTracker() if self.USE_BUILTIN_TRACKER else None
+            self.stream_name = (f"camera_{self.camera_index}" if self.using_camera
+                                else os.path.basename(self.VIDEO_PATH))
+            self.metrics = PipelineMetrics(self.stream_name)
+            # 监控服务在多次处理之间保留，之前的跳帧数不计入本次处理
+            self.metrics.baseline_totals(
+                monitor_skipped=self.monitor.frames_skipped if self.monitor is not None else None)
+            self.db_integration.db.source = self.stream_name  # 统计数据按视频源写入，便于按视频源查询历史
+            # 每次数据库写入都在写入线程中记录到指标，不会漏掉两次统计之间的写入
+            self.db_integration.db.write_callback = self.metrics.observe_db_write
+
+            self.capture_finished = False
+            self.track_id_offset = 0
+            self.resume_state = self.find_checkpoint() if self.RESUME and not self.using_camera else None
+            self.last_checkpoint_time = time.time()
+
             # 记录处理开始时间
             self.process_start_time = time.time()
 
@@ -426,16 +567,31 @@ class MainApp(QtWidgets.QMainWindow):
             self.capture.release()
 
         if self.using_camera:
-            self.capture = cv2.VideoCapture(self.camera_index)
+            if self.LIVE_MODE:
+                self.capture = LatestFrameReader(self.camera_index)
+            else:
+                self.capture = cv2.VideoCapture(self.camera_index)
+            self.capture_latencies = []
+            self.camera_retry_delay = 0.0
+            self.camera_read_failed = False
             if not self.capture.isOpened():
                 self.add_warning("摄像头打开失败，请检查摄像头连接")
                 self.stop_processing()
                 return
             self.fps = 30
-            self.frame_width = 640
-            self.frame_height = 480
+            # 使用摄像头实际输出的分辨率，区域和标定按该分辨率缩放
+            self.frame_width = int(self.capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640
+            self.frame_height = int(self.capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480
         else:
-            self.capture = cv2.VideoCapture(self.VIDEO_PATH)
+            # 视频文件在后台线程中预取解码，并支持跳帧和按时间区间处理
+            self.capture = PrefetchFrameReader(
+                self.VIDEO_PATH,
+                stride=self.FRAME_STRIDE,
+                start_time=self.START_TIME,
+                end_time=self.END_TIME,
+                # 从断点继续时直接定位到断点的下一帧
+                start_frame=self.resume_state[0]['next_frame'] if self.resume_state is not None else None
+            )
             if not self.capture.isOpened():
                 self.add_warning("视频打开失败，请检查文件路径")
                 self.stop_processing()
@@ -449,48 +605,298 @@ class MainApp(QtWidgets.QMainWindow):
                 self.fps = 30
 
         if not self.using_camera:
-            fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-            self.videowriter = cv2.VideoWriter(
-                self.RESULT_PATH,
-                fourcc,
-                self.fps,
-                (self.frame_width, self.frame_height)
-            )
+            # 编码在后台线程中进行，队列满时丢帧而不是阻塞检测
+            encoder_args = (self.result_path(), self.fps * self.capture.keep_ratio,
+                            (self.frame_width, self.frame_height))
+            try:
+                self.videowriter = BackgroundVideoEncoder(
+                    *encoder_args,
+                    output_size=self.RECORD_SIZE,
+                    record_fps=self.RECORD_FPS,
+                    backend=self.ENCODER_BACKEND
+                )
+            except OSError as e:
+                # 找不到（或无法执行）ffmpeg 时改用 OpenCV 编码，不中断处理
+                self.add_warning(f"无法启动 {self.ENCODER_BACKEND} 编码器，改用 OpenCV 编码: {str(e)}")
+                self.videowriter = BackgroundVideoEncoder(
+                    *encoder_args,
+                    output_size=self.RECORD_SIZE,
+                    record_fps=self.RECORD_FPS,
+                    backend='opencv'
+                )
         else:
             self.videowriter = None
 
+        self.load_calibration()
+        # 检测缓存的键包含门控参数，需要先创建运动门控
+        self.motion_gate = MotionGate([self.polygon_points, self.polygon_points1],
+                                      (self.frame_width, self.frame_height),
+                                      heartbeat=self.MOTION_HEARTBEAT) if self.USE_MOTION_GATE else None
+        self.active_tracks = 0
+        self.open_detection_cache()
+        # 警告区域确定后再创建停留时间引擎
+        self.dwell_engine = DwellTimeEngine({'warning_zone': self.polygon_points1},
+                                            (self.frame_width, self.frame_height),
+                                            self.DWELL_THRESHOLDS, fps=self.fps)
+        self.alert_machine = AlertStateMachine(self.DWELL_THRESHOLDS, cooldown=self.ALERT_COOLDOWN)
+        self.open_trajectory_exporter()
+        self.create_session()
+        if self.resume_state is not None and not self.restore_checkpoint():
+            return
+        # 被监视的结构由跟踪会话持有，会话创建（和断点恢复）之后再开始分析，基线快照才能统计到它们
+        self.start_profiler()
+
         update_interval = max(33, int(1000 / min(30, self.fps)))
+        if isinstance(self.capture, LatestFrameReader):
+            # 实时模式由 read() 等待新帧控制节奏，处理完立即处理下一帧，不再额外等待定时器
+            update_interval = 1
         self.timer.start(update_interval)
 
         self.add_warning(f"视频源设置完成: {self.frame_width}x{self.frame_height} @ {self.fps}fps")
 
+    def open_trajectory_exporter(self):
+        """按配置创建轨迹导出器，每个视频源的轨迹写入单独的分区目录"""
+        self.trajectory_exporter = None
+        if not self.TRAJECTORY_DIR:
+            return
+        try:
+            self.trajectory_exporter = TrajectoryExporter(
+                self.TRAJECTORY_DIR, self.stream_name,
+                metadata={'video': self.VIDEO_PATH, 'model': self.model_path, 'fps': self.fps,
+                          'frame_size': [self.frame_width, self.frame_height],
+                          'count_zone': np.asarray(self.polygon_points).tolist(),
+                          'warning_zone': np.asarray(self.polygon_points1).tolist(),
+                          'started_at': time.strftime('%Y-%m-%d %H:%M:%S')}
+            )
+        except Exception as e:
+            self.add_warning(f"轨迹导出不可用: {str(e)}")
+
+    def create_session(self):
+        """创建跟踪会话和事件总线，界面、语音、警告帧和数据库作为订阅者，不在检测循环中同步执行"""
+        self.event_bus = EventBus()
+        # 速度分析器先于轨迹导出更新（同一事件按订阅顺序处理），导出的速度包含本帧
+        self.event_bus.subscribe(FrameProcessed, self.update_speeds, name='speed')
+        if self.trajectory_exporter is not None:
+            self.event_bus.subscribe(FrameProcessed, self.export_trajectories, name='trajectories')
+        # 警报：警告帧和语音在各自的后台线程中处理，界面在主线程中处理，监控服务只是放入队列
+        self.event_bus.subscribe(Violation, self.save_warning_frame, mode='thread', name='warning_frames')
+        self.voice_alerts = self.event_bus.subscribe(Violation, lambda event: play_voice_alert(),
+                                                     mode='thread', maxsize=4, name='voice_alert')
+        self.event_bus.subscribe(Violation, self.show_alert, mode='queue')
+        if self.monitor is not None:
+            self.event_bus.subscribe(Violation, lambda event: self.monitor.publish_event(
+                event.message, track_id=int(event.track_id)), name='monitor_events')
+        # 统计：数据库写入在后台线程中完成，界面和图表在主线程中更新
+        self.event_bus.subscribe(StatsTick, self.store_statistics, mode='thread', maxsize=8, name='database')
+        self.event_bus.subscribe(StatsTick, self.update_status_and_chart, mode='queue', maxsize=2)
+
+        self.session = TrackingSession(
+            self.event_bus, model=self.model, polygon_points=self.polygon_points,
+            polygon_points1=self.polygon_points1, renderer=self.renderer, line_counter=self.line_counter,
+            dwell_engine=self.dwell_engine, alert_machine=self.alert_machine,
+            stats_interval=5, stats_provider=self.collect_stats
+        )
+
+    def collect_stats(self):
+        """汇总界面、监控和数据库共用的统计数据（在检测线程中计算，订阅者只读取结果）"""
+        return {
+            'avg_speed': float(self.speed_analyzer.calculate_average_speed()),
+            'total_vehicles': self.speed_analyzer.get_vehicle_count(),
+            'inference_ms': float(np.mean(self.inference_times) * 1000) if self.inference_times else 0.0,
+            'fps': float(1 / np.mean(self.frame_times)) if self.frame_times else None,
+            'latency_ms': float(np.median(self.capture_latencies) * 1000) if self.capture_latencies else None,
+        }
+
+    def update_speeds(self, event):
+        """速度订阅者（主线程）：用各目标最新的位置更新速度分析器"""
+        # 视频文件使用视频时间，从断点继续处理时速度与不中断时一致
+        timestamp = event.timestamp
+        track_history = self.session.track_history
+        track_ids = [track_id for track_id, track in track_history.items() if track]
+        if track_ids:
+            # 获取所有目标最新的位置
+            centers = np.array([track_history[track_id][-1] for track_id in track_ids], dtype=np.float32)
+            if self.speed_analyzer.ground_plane:
+                # 所有目标一次查表换算为地面坐标（米）
+                centers = self.calibration.to_ground(centers)
+            for track_id, center in zip(track_ids, centers):
+                # 更新速度分析器
+                self.speed_analyzer.update(track_id, center, timestamp)
+
+    def export_trajectories(self, event):
+        """轨迹导出订阅者（主线程，只写入缓冲区）：导出本帧全部目标的位置、速度和区域状态"""
+        tracks = event.tracks
+        if tracks is None or len(tracks['ids']) == 0:
+            return
+        speeds = self.speed_analyzer.speeds
+        speed = np.array([speeds.get(track_id, np.nan) for track_id in tracks['ids'].tolist()], dtype=np.float32)
+        self.trajectory_exporter.append(
+            getattr(self.capture, 'frame_index', event.frame_index), event.timestamp, tracks['ids'],
+            tracks['classes'], tracks['boxes'], speed, tracks['in_zone'], tracks['in_warning_zone'],
+            tracks['violating']
+        )
+
+    def save_warning_frame(self, event):
+        """警告帧订阅者（后台线程）：保存不含标注的警告帧（事件中已编码为 JPEG）"""
+        if event.jpeg is not None:
+            write_warning_frame(self.WARNING_FOLDER, event.track_id, event.timestamp, event.repeat, event.jpeg)
+
+    def show_alert(self, event):
+        """警报界面订阅者（主线程）：在警告信息框中显示警报"""
+        self.ui.warning_text.append(f"[{time.strftime('%H:%M:%S')}] {event.message}")
+
+    def store_statistics(self, event):
+        """数据库订阅者（后台线程）：写入统计数据"""
+        stats = event.stats
+        self.db_integration.store_values(stats['avg_speed'], stats['total_vehicles'], stats['current_vehicles'],
+                                         stats['frame_count'], stats['inference_ms'], stats['fps'] or 0)
+
+    def load_calibration(self):
+        """按视频源查找标定文件，缩放到实际帧尺寸，并更新区域、计数线和速度分析器"""
+        source = f"camera_{self.camera_index}" if self.using_camera else self.VIDEO_PATH
+        path = find_calibration_file(source)
+        self.calibration = None
+        if path is None:
+            return
+
+        try:
+            self.calibration = SceneCalibration.load(path, self.frame_width, self.frame_height)
+        except Exception as e:
+            self.add_warning(f"标定文件加载失败: {str(e)}")
+            return
+
+        self.polygon_points = self.calibration.get_zone('count_zone', self.polygon_points)
+        self.polygon_points1 = self.calibration.get_zone('warning_zone', self.polygon_points1)
+        if self.calibration.lines:
+            self.line_counter = LineCrossingCounter(self.calibration.lines)
+        if self.calibration.has_ground_plane:
+            self.speed_analyzer = SpeedAnalyzer(ground_plane=True)
+
+        self.add_warning(f"加载标定文件: {os.path.basename(path)}")
+
+    def open_detection_cache(self):
+        """视频文件：已有相同视频、模型和参数的检测缓存时进入回放模式，否则边处理边录制"""
+        self.detection_cache = None
+        self.detection_recorder = None
+        if self.using_camera or not self.USE_DETECTION_CACHE:
+            return
+
+        try:
+            key = tracking_cache_key(self.VIDEO_PATH, self.model_path, TRACK_CONF, OBJ_LIST,
+                                     tracker='builtin' if self.tracker is not None else None,
+                                     stride=self.FRAME_STRIDE, start_time=self.START_TIME, end_time=self.END_TIME,
+                                     motion_gate=self.motion_gate.signature if self.motion_gate is not None else None)
+            self.detection_cache = DetectionCache.open(key)
+            if self.detection_cache is not None:
+                self.add_warning(f"使用检测缓存回放（{len(self.detection_cache)}帧），跳过推理")
+            elif self.resume_state is None:
+                # 从断点继续时只处理视频的后半段，录制结果不完整，因此不录制
+                self.detection_recorder = DetectionCacheWriter(
+                    key, video=os.path.basename(self.VIDEO_PATH), fps=self.fps,
+                    frame_width=self.frame_width, frame_height=self.frame_height
+                )
+        except Exception as e:
+            self.add_warning(f"检测缓存不可用: {str(e)}")
+
+    def detect(self, frame):
+        """获取当前帧的检测结果：优先从缓存读取，否则运行模型跟踪（空闲时由运动门控跳过）并录制"""
+        if self.detection_cache is not None:
+            position = self.detection_cache.find(self.capture.frame_index)
+            if position is not None:
+                return self.detection_cache.get(position)[2]
+
+        timestamp = time.time() if self.using_camera else self.capture.timestamp
+        if self.motion_gate is not None and not self.motion_gate.should_infer(frame, timestamp, self.active_tracks):
+            # 区域内没有运动且没有跟踪目标，跳过推理
+            detections = empty_detections()
+        else:
+            _, detections = track_frame(frame, self.model, self.tracker)
+            if self.track_id_offset:
+                # 从断点继续时 model.track 的 ID 从头分配，加上偏移量避免与断点前的目标 ID 重复
+                detections = (detections[0], detections[1] + self.track_id_offset) + tuple(detections[2:])
+            self.active_tracks = len(detections[1])
+        if self.detection_recorder is not None:
+            self.detection_recorder.append(self.capture.frame_index, self.capture.timestamp, detections)
+        return detections
+
+    def start_profiler(self):
+        """按配置对处理循环的前 PROFILE_FRAMES 帧做性能分析"""
+        if self.PROFILE_FRAMES <= 0:
+            return
+        self.profiler = ProcessingProfiler(frames=self.PROFILE_FRAMES)
+        # 监视可能随运行时间增长的结构，每次快照时统计其大小
+        self.profiler.watch('track_history', lambda: self.session.track_history)
+        self.profiler.watch('SpeedAnalyzer.tracks', lambda: self.speed_analyzer.tracks)
+        self.profiler.watch('SpeedAnalyzer.speeds', lambda: self.speed_analyzer.speeds)
+        self.profiler.watch('entered_ids', lambda: self.session.entered_ids)
+        self.profiler.watch('warned_ids', lambda: self.session.warned_ids)
+        self.profiler.start()
+        self.add_warning(f"性能分析已启动: 分析 {self.PROFILE_FRAMES} 帧")
+
+    def finish_profiler(self):
+        """结束性能分析并写出结果"""
+        if self.profiler is not None:
+            if self.profiler.active:
+                self.profiler.finish()
+            self.add_warning(f"性能分析完成，结果保存在 {self.profiler.output_dir}")
+            self.profiler = None
+
     def update_frame(self):
+        """定时器回调：处理一帧，性能分析模式下对该帧做分析"""
+        profiler = self.profiler
+        if profiler is None:
+            self.process_next_frame()
+            return
+
+        with profiler.frame():
+            self.process_next_frame()
+        # 视频结束时 stop_current_process 已经结束了分析
+        if self.profiler is not None and not self.profiler.active:
+            self.finish_profiler()
+
+    def process_next_frame(self):
         """处理单帧视频：检测、跟踪、速度计算、UI更新"""
         if not self.processing:
             return
 
         frame_start_time = time.time()
+        stage_start = time.perf_counter()
 
         success, frame = self.capture.read()
+        stage_start = self.observe_stage('read', stage_start)
         if not success:
             if self.using_camera:
-                self.add_warning("摄像头读取失败")
+                self.handle_camera_failure()
             else:
                 self.add_warning("视频读取完成")
+                self.capture_finished = True
                 self.stop_current_process()
             return
+        if self.camera_read_failed:
+            self.camera_read_failed = False
+            self.add_warning("摄像头已恢复")
+            if self.camera_retry_delay:
+                # 恢复实时模式的定时器间隔
+                self.camera_retry_delay = 0.0
+                self.timer.setInterval(1)
+
+        # 窗口最小化、不录制且没有远程观看者时进入无标注模式，跳过全部绘制
+        display_active = not self.isMinimized()
+        remote_viewers = self.monitor is not None and self.monitor.has_viewers
+        self.renderer.set_outputs(display=display_active or remote_viewers,
+                                  recording=self.videowriter is not None)
 
         try:
-            # 使用 process_frame 函数处理帧，集成警报功能
-            (annotated_frame, self.count_passed, self.count_exited, 
-             self.entered_ids, self.entry_time, self.warned_ids, 
-             self.track_history) = process_frame(
-                frame, self.model, self.videowriter, self.track_history, 
-                self.entered_ids, self.entry_time, self.warned_ids, 
-                self.count_passed, self.count_exited, self.polygon_points, 
-                self.polygon_points1, play_voice_alert, self.WARNING_FOLDER,
-                warning_display=self.ui.warning_text
+            detections = self.detect(frame)
+            stage_start = self.observe_stage('detect', stage_start)
+
+            # 跟踪会话处理帧，警报和统计以事件形式交给订阅者
+            annotated_frame = self.session.process(
+                frame, detections,
+                # 视频文件按视频时间、实时模式按抓帧时间计算停留时间，普通摄像头使用当前时间
+                timestamp=getattr(self.capture, 'timestamp', None)
             )
+            stage_start = self.observe_stage('process', stage_start)
 
             inference_time = time.time() - frame_start_time
             self.inference_times.append(inference_time)
@@ -504,31 +910,168 @@ class MainApp(QtWidgets.QMainWindow):
 
         if self.videowriter is not None:
             self.videowriter.write(annotated_frame)
+            stage_start = self.observe_stage('encode', stage_start)
+
+        if self.monitor is not None:
+            self.monitor.publish_frame(annotated_frame)
 
         # 计算车辆数
-        self.current_vehicles = self.count_passed - self.count_exited
+        self.current_vehicles = self.session.current_vehicles
         
-        # 更新速度分析器中的数据
-        timestamp = time.time()
-        for track_id, track in self.track_history.items():
-            if track:
-                # 获取最新的位置
-                x, y = track[-1]
-                center = np.array([x, y], dtype=np.float32)
-                # 更新速度分析器
-                self.speed_analyzer.update(track_id, center, timestamp)
-
-        self.update_ui_display(annotated_frame)
+        if display_active:
+            self.update_ui_display(annotated_frame)
+            self.observe_stage('display', stage_start)
+        if isinstance(self.capture, LatestFrameReader):
+            # 从抓取帧到结果显示（或发布）的延迟
+            latency = self.capture.latency()
+            self.capture_latencies.append(latency)
+            if len(self.capture_latencies) > 100:
+                self.capture_latencies = self.capture_latencies[-100:]
+            if self.metrics is not None:
+                self.metrics.observe_capture_latency(latency)
         self.frame_count += 1
+        if self.metrics is not None:
+            self.metrics.frame_done(active_tracks=len(detections[1]))
 
-        if self.frame_count % 5 == 0:
-            self.update_status_and_chart()
+        # 在主线程中处理界面订阅者的事件（警报信息、统计和图表）
+        self.event_bus.drain()
 
         frame_time = time.time() - frame_start_time
         self.frame_times.append(frame_time)
         if len(self.frame_times) > 10:
             self.frame_times = self.frame_times[-10:]
 
+        self.check_and_save_checkpoint()
+
+    def result_path(self):
+        """
+        结果视频的保存路径。从断点继续时写入单独的分段文件 result_<起始帧>.mp4，
+        不覆盖中断前已经写好的结果视频（各分段按起始帧排序即为完整结果）。
+        """
+        if self.resume_state is None:
+            return self.RESULT_PATH
+        root, extension = os.path.splitext(self.RESULT_PATH)
+        path = f"{root}_{self.resume_state[0]['next_frame']}{extension}"
+        self.add_warning(f"从断点继续处理，结果视频写入分段文件: {path}")
+        return path
+
+    def checkpoint_config(self):
+        """影响处理结果的视频和参数，与断点中保存的不一致时不能从断点继续"""
+        return {
+            'video': os.path.basename(self.VIDEO_PATH),
+            'video_signature': video_signature(self.VIDEO_PATH),
+            'model': self.model_path,
+            'tracker': 'builtin' if self.tracker is not None else 'ultralytics',
+            'stride': self.FRAME_STRIDE,
+            'start_time': self.START_TIME,
+            'end_time': self.END_TIME,
+            'motion_gate': self.MOTION_HEARTBEAT if self.USE_MOTION_GATE else None,
+            'dwell_thresholds': {str(cls): seconds for cls, seconds in self.DWELL_THRESHOLDS.items()},
+            'alert_cooldown': self.ALERT_COOLDOWN,
+        }
+
+    def find_checkpoint(self):
+        """读取当前视频的断点，视频或处理参数已变化时忽略断点"""
+        try:
+            checkpoint = load_checkpoint(checkpoint_path(self.VIDEO_PATH))
+        except Exception as e:
+            self.add_warning(f"断点文件读取失败: {str(e)}")
+            return None
+        if checkpoint is None:
+            self.add_warning("没有找到断点，从头开始处理")
+            return None
+        if not config_matches(checkpoint[0]['config'], self.checkpoint_config()):
+            self.add_warning("视频或处理参数与断点不一致，从头开始处理")
+            return None
+        return checkpoint
+
+    def restore_checkpoint(self):
+        """把断点中的状态恢复到跟踪会话和各组件，失败时停止处理（视频已经定位到断点位置）"""
+        meta, states = self.resume_state
+        try:
+            restore_state(states, session=self.session, tracker=self.tracker, line_counter=self.line_counter,
+                          dwell_engine=self.dwell_engine, alert_machine=self.alert_machine,
+                          motion_gate=self.motion_gate, speed=self.speed_analyzer)
+        except Exception as e:
+            self.add_warning(f"断点恢复失败: {str(e)}")
+            self.stop_processing()
+            return False
+        self.frame_count = meta['frame_count']
+        # 内置跟踪器的 ID 分配状态已经恢复，model.track 的跟踪器需要 ID 偏移
+        self.track_id_offset = meta['track_id_offset'] if self.tracker is None else 0
+        self.add_warning(f"从断点继续处理: 第{meta['next_frame']}帧（{meta['timestamp']:.1f}秒），"
+                         f"已处理{self.frame_count}帧")
+        return True
+
+    def check_and_save_checkpoint(self, force=False):
+        """视频文件每隔 CHECKPOINT_INTERVAL 秒保存一次断点，force 为 True 时立即保存"""
+        if (self.using_camera or not self.CHECKPOINT_INTERVAL or self.session is None
+                or self.capture.frame_index < 0):
+            return
+        now = time.time()
+        if not force and now - self.last_checkpoint_time < self.CHECKPOINT_INTERVAL:
+            return
+        self.last_checkpoint_time = now
+
+        frame_index = int(self.capture.frame_index)
+        meta = {
+            'config': self.checkpoint_config(),
+            'frame_index': frame_index,
+            'next_frame': frame_index + max(1, int(self.FRAME_STRIDE)),
+            'timestamp': float(self.capture.timestamp),
+            'frame_count': self.frame_count,
+            # 断点之后新分配的 ID 从已出现过的最大 ID 之后开始
+            'track_id_offset': max([self.track_id_offset, *map(int, self.speed_analyzer.all_tracked_vehicles)]),
+        }
+        states = collect_state(session=self.session, tracker=self.tracker, line_counter=self.line_counter,
+                               dwell_engine=self.dwell_engine, alert_machine=self.alert_machine,
+                               motion_gate=self.motion_gate, speed=self.speed_analyzer)
+        try:
+            save_checkpoint(checkpoint_path(self.VIDEO_PATH), states, meta)
+        except Exception as e:
+            self.add_warning(f"断点保存失败: {str(e)}")
+
+    def handle_camera_failure(self):
+        """
+        摄像头读取失败：只在第一次失败时提示，恢复后才会再次提示。
+        实时模式的抓帧线程退出后（摄像头断开）每次 read() 都会立即失败，按指数退避重新打开摄像头，
+        等待期间把定时器间隔设为退避时间，避免 1ms 定时器空转。
+        """
+        if not self.camera_read_failed:
+            self.camera_read_failed = True
+            self.add_warning("摄像头读取失败，正在尝试重新连接")
+        if not isinstance(self.capture, LatestFrameReader) or not self.capture.finished:
+            return
+        self.camera_retry_delay = min(self.CAMERA_RETRY_MAX, max(1.0, self.camera_retry_delay * 2))
+        self.capture.release()
+        self.capture = LatestFrameReader(self.camera_index)
+        self.timer.setInterval(int(self.camera_retry_delay * 1000))
+
+    def observe_stage(self, name, stage_start):
+        """记录一个处理阶段的耗时，返回下一阶段的起始时间"""
+        now = time.perf_counter()
+        if self.metrics is not None:
+            self.metrics.observe_stage(name, now - stage_start)
+        return now
+
+    def update_metrics(self):
+        """同步各组件的累计值和队列深度到运行指标"""
+        if self.metrics is None:
+            return
+        evicted = self.tracker.evicted if self.tracker is not None else (
+            self.dwell_engine.evicted if self.dwell_engine is not None else None)
+        self.metrics.sync_totals(
+            evicted_tracks=evicted,
+            encoder_dropped=self.videowriter.frames_dropped if self.videowriter is not None else None,
+            monitor_skipped=self.monitor.frames_skipped if self.monitor is not None else None,
+            inference_skipped=self.motion_gate.frames_skipped if self.motion_gate is not None else None,
+            live_dropped=self.capture.frames_dropped if isinstance(self.capture, LatestFrameReader) else None
+        )
+        self.metrics.set_queue_depths(
+            alert_queue=get_pending_alerts() + (self.voice_alerts.backlog if self.voice_alerts is not None else 0),
+            encoder_backlog=self.videowriter.backlog if self.videowriter is not None else 0
+        )
+
     def update_ui_display(self, frame):
         """将OpenCV帧转换为Qt显示格式并更新"""
         try:
@@ -571,27 +1114,36 @@ class MainApp(QtWidgets.QMainWindow):
         except Exception as e:
             print(f"显示更新错误: {e}")
 
-    def update_status_and_chart(self):
-        """更新统计信息和流量图"""
+    def update_status_and_chart(self, event):
+        """统计订阅者（主线程）：更新统计信息和流量图"""
         try:
-            avg_speed = self.speed_analyzer.calculate_average_speed()
-            total_vehicles = self.speed_analyzer.get_vehicle_count()
+            stats = event.stats
+            avg_speed = stats['avg_speed']
+            total_vehicles = stats['total_vehicles']
+            current_vehicles = stats['current_vehicles']
+            inference_speed = stats['inference_ms']
 
             scrollbar = self.ui.stats_text.verticalScrollBar()
             scroll_position = scrollbar.value()
 
-            inference_speed = 0
-            if self.inference_times:
-                inference_speed = np.mean(self.inference_times) * 1000
+            line_html = ""
+            if self.line_counter is not None:
+                for name, (forward, backward) in self.line_counter.get_totals().items():
+                    line_html += (f"<p style='margin: 5px 0;'>🚦 <b>{name}:</b> "
+                                  f"<span style='color: #e57373;'>→ {forward} / ← {backward}</span></p>")
+            if stats['latency_ms'] is not None:
+                line_html += (f"<p style='margin: 5px 0;'>⏳ <b>画面延迟:</b> "
+                              f"<span style='color: #ba68c8;'>{stats['latency_ms']:.0f} ms</span></p>")
 
             stats_html = f"""
                 <div style='font-family: "Microsoft YaHei"; font-size: 11pt; color: #495057;'>
                     <h3 style='color: #343a40; margin-top: 0;'>📊 实时统计</h3>
                     <p style='margin: 5px 0;'>🚗 <b>平均车速:</b> <span style='color: #81c784;'>{avg_speed:.1f} km/h</span></p>
                     <p style='margin: 5px 0;'>📈 <b>累计车辆:</b> <span style='color: #7986cb;'>{total_vehicles}</span></p>
-                    <p style='margin: 5px 0;'>👁️ <b>当前车辆:</b> <span style='color: #a1887f;'>{self.current_vehicles}</span></p>
-                    <p style='margin: 5px 0;'>⏱️ <b>处理帧数:</b> <span style='color: #4db6ac;'>{self.frame_count}</span></p>
+                    <p style='margin: 5px 0;'>👁️ <b>当前车辆:</b> <span style='color: #a1887f;'>{current_vehicles}</span></p>
+                    <p style='margin: 5px 0;'>⏱️ <b>处理帧数:</b> <span style='color: #4db6ac;'>{stats['frame_count']}</span></p>
                     <p style='margin: 5px 0;'>⚡ <b>推理速度:</b> <span style='color: #ffb74d;'>{inference_speed:.1f} ms</span></p>
+                    {line_html}
                 </div>
                 """
 
@@ -606,7 +1158,7 @@ class MainApp(QtWidgets.QMainWindow):
 
             current_time = time.strftime("%H:%M:%S")
             self.flow_x.append(current_time)
-            self.flow_y.append(self.current_vehicles)
+            self.flow_y.append(current_vehicles)
 
             if len(self.flow_x) > 15:
                 self.flow_x = self.flow_x[-15:]
@@ -614,18 +1166,24 @@ class MainApp(QtWidgets.QMainWindow):
 
             self.update_flow_graph()
 
-            fps_text = f"FPS: {1 / np.mean(self.frame_times):.1f}" if self.frame_times else "等待数据..."
-            status_text = f"📍 车辆检测 | 🚗 {self.current_vehicles} 辆车 | ⚡ {fps_text} | 📍 智慧交通检测系统"
+            fps_text = f"FPS: {stats['fps']:.1f}" if stats['fps'] else "等待数据..."
+            status_text = f"📍 车辆检测 | 🚗 {current_vehicles} 辆车 | ⚡ {fps_text} | 📍 智慧交通检测系统"
             self.ui.statusBar.showMessage(status_text)
 
-            # 存储统计信息到数据库
-            self.db_integration.store_statistics(
-                self.speed_analyzer,
-                self.current_vehicles,
-                self.frame_count,
-                self.inference_times,
-                self.frame_times
-            )
+            if self.monitor is not None:
+                self.monitor.publish_stats({
+                    'avg_speed': round(avg_speed, 1),
+                    'total_vehicles': total_vehicles,
+                    'current_vehicles': current_vehicles,
+                    'frame_count': stats['frame_count'],
+                    'inference_ms': round(inference_speed, 1),
+                    'fps': round(stats['fps'], 1) if stats['fps'] else None,
+                    'lines': self.line_counter.get_totals() if self.line_counter is not None else {},
+                    'latency_ms': round(stats['latency_ms'], 1) if stats['latency_ms'] is not None else None,
+                })
+
+            # 数据库写入由后台线程的订阅者完成（store_statistics）
+            self.update_metrics()
 
         except Exception as e:
             print(f"状态更新错误: {e}")
@@ -687,8 +1245,40 @@ class MainApp(QtWidgets.QMainWindow):
         if hasattr(self, 'capture') and self.capture.isOpened():
             self.capture.release()
 
+        self.finish_profiler()
+
+        if self.detection_recorder is not None:
+            # 只有完整处理到结尾的录制才保存为缓存
+            if self.capture_finished:
+                self.detection_recorder.close()
+                self.add_warning("检测结果已缓存，下次处理该视频时将跳过推理")
+            else:
+                self.detection_recorder.abort()
+            self.detection_recorder = None
+
+        if not self.using_camera and self.session is not None:
+            if self.capture_finished:
+                # 完整处理到结尾后不再需要断点
+                remove_checkpoint(checkpoint_path(self.VIDEO_PATH))
+            else:
+                self.check_and_save_checkpoint(force=True)
+
+        if self.session is not None:
+            # 处理界面订阅者剩余的事件，等待后台订阅者（数据库、警告帧、语音）处理完成
+            self.event_bus.drain()
+            self.session.close()
+            self.session = None
+            self.voice_alerts = None
+
+        if self.trajectory_exporter is not None:
+            self.trajectory_exporter.close()
+            self.add_warning(self.trajectory_exporter.get_summary())
+            self.trajectory_exporter = None
+
         if hasattr(self, 'videowriter') and self.videowriter is not None:
             self.videowriter.release()
+            self.add_warning(self.videowriter.get_summary())
+            self.videowriter = None
 
         self.start_btn.setEnabled(True)
         self.stop_btn.setEnabled(False)
@@ -705,6 +1295,13 @@ class MainApp(QtWidgets.QMainWindow):
             summary = f"处理完成: {self.frame_count}帧, 平均{avg_speed:.1f}km/h, 共{total_vehicles}车"
 
         self.add_warning(summary)
+        if self.motion_gate is not None and self.motion_gate.frames_checked:
+            self.add_warning(f"运动门控跳过推理: {self.motion_gate.frames_skipped}帧"
+                             f"（{self.motion_gate.skip_ratio:.0%}）")
+        if isinstance(self.capture, LatestFrameReader) and self.capture_latencies:
+            latencies = np.array(self.capture_latencies) * 1000
+            self.add_warning(f"实时模式延迟（最近{len(latencies)}帧）: 中位数 {np.median(latencies):.0f}ms, "
+                             f"P95 {np.percentile(latencies, 95):.0f}ms, 丢弃旧帧 {self.capture.frames_dropped}帧")
 
         self.video_label.clear()
         self.video_label.setText("处理完成\n请选择新的视频源")
@@ -725,6 +1322,8 @@ class MainApp(QtWidgets.QMainWindow):
     def closeEvent(self, event):
         """窗口关闭事件，确保释放资源"""
         self.stop_current_process()
+        if self.monitor is not None:
+            self.monitor.stop()
         # 关闭数据库连接
         if hasattr(self, 'db_integration'):
             self.db_integration.close()
@@ -733,10 +1332,38 @@ class MainApp(QtWidgets.QMainWindow):
 
 if __name__ == "__main__":
     import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="智慧交通检测系统")
+    parser.add_argument("--profile", type=int, default=None, metavar="N",
+                        help=f"对处理循环的前 N 帧做性能分析（也可以设置环境变量 {PROFILE_ENV}=N）")
+    parser.add_argument("--monitor-port", type=int, default=None, metavar="PORT",
+                        help=f"启动本地监控服务的端口（也可以设置环境变量 {MONITOR_PORT_ENV}=PORT）")
+    parser.add_argument("--resume", action="store_true",
+                        help="视频文件从上次保存的断点继续处理（结果视频写入 result_<起始帧>.mp4 分段文件）")
+    parser.add_argument("--checkpoint-interval", type=float, default=None, metavar="SECONDS",
+                        help="断点保存间隔（秒），0 表示不保存断点")
+    parser.add_argument("--trajectories", default=None, metavar="DIR",
+                        help="把每帧的轨迹导出为 Parquet 文件（需要 pyarrow）")
+    args, qt_args = parser.parse_known_args()
 
     try:
-        app = QtWidgets.QApplication(sys.argv)
+        app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
         main_app = MainApp()
+        if args.profile is not None:
+            main_app.PROFILE_FRAMES = args.profile
+        if args.monitor_port is not None and args.monitor_port != main_app.MONITOR_PORT:
+            # 命令行端口优先于环境变量，已按环境变量启动的服务需要重新启动
+            if main_app.monitor is not None:
+                main_app.monitor.stop()
+                main_app.monitor = None
+            main_app.MONITOR_PORT = args.monitor_port
+            main_app.start_monitor()
+        main_app.RESUME = args.resume
+        if args.trajectories is not None:
+            main_app.TRAJECTORY_DIR = args.trajectories
+        if args.checkpoint_interval is not None:
+            main_app.CHECKPOINT_INTERVAL = args.checkpoint_interval
         main_app.show()
         sys.exit(app.exec_())
     except Exception as e:
@@ -0,0 +1,271 @@
+"""
+轨迹流式导出（Parquet 列式存储）
+每帧的最终跟踪结果（帧序号、时间、ID、类别、检测框、速度、区域状态）按行组追加到 Parquet 文件中。
+track_history 只保留每个目标最近 30 个点，导出后可以用 pandas / pyarrow 按列读取数周的轨迹做分析，
+不需要重新做检测。
+
+文件布局（hive 分区，source 作为虚拟列）：
+    trajectories/source=<视频源>/<开始时间>_<序号>.parquet
+正在写入的文件名以 . 开头、以 .part 结尾（pyarrow 读取目录时忽略），关闭后才改为正式文件名，
+读取时不会读到不完整的文件。
+
+需要 pyarrow（pandas 读写 Parquet 同样依赖它）。
+
+用法：
+    python trajectory_export.py trajectories --source car_test3.mp4
+"""
+
+import argparse
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+# 导出的默认目录
+TRAJECTORY_DIR = "trajectories"
+
+# 固定列的名称和数据类型
+COLUMNS = {
+    'frame': np.int64,  # 视频帧序号
+    'timestamp': np.float64,  # 视频时间（秒），摄像头为 Unix 时间
+    'track_id': np.int64,
+    'class': np.int16,
+    'x': np.float32,  # 检测框中心点格式 (x, y, w, h)
+    'y': np.float32,
+    'w': np.float32,
+    'h': np.float32,
+    'speed': np.float32,  # 平滑速度（km/h），尚未测出时为 nan
+    'in_zone': bool,  # 在统计区域内
+    'in_warning_zone': bool,  # 在警告区域内
+    'violating': bool,  # 正在警报
+}
+
+
+def source_directory(directory, source):
+    """返回视频源对应的分区目录（文件名中不能使用的字符替换为下划线）"""
+    return os.path.join(directory, "source=" + re.sub(r'[\\/:*?"<>|=]', '_', str(source)))
+
+
+class TrajectoryExporter:
+    """
+    流式轨迹导出器
+    作用：
+        检测循环每帧调用 append() 只把数组放入当前行组的缓冲区；行组满后交给后台线程编码、压缩并写入，
+        检测循环不等待磁盘。
+    内存上限：
+        缓冲区最多 row_group_size 行，等待写入的行组最多 queue_size 个。写入跟不上时 append() 会等待
+        （轨迹数据不丢弃），内存占用不会随运行时间增长。
+    文件轮转：
+        单个文件超过 rotate_rows 行或写入超过 rotate_interval 秒后关闭并开始新文件。
+    """
+    def __init__(self, directory, source, row_group_size=65536, rotate_rows=5_000_000, rotate_interval=3600,
+                 queue_size=4, compression='zstd', metadata=None):
+        """
+        :param directory: 导出根目录
+        :param source: 视频源名称（作为分区目录）
+        :param row_group_size: 每个行组的行数
+        :param rotate_rows: 单个文件的最大行数
+        :param rotate_interval: 单个文件的最长写入时间（秒），None 表示只按行数轮转
+        :param queue_size: 等待写入的最大行组数
+        :param compression: Parquet 压缩算法
+        :param metadata: 写入每个文件元数据的附加信息（如帧率、区域坐标），需要可 JSON 序列化
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._pq = pq
+        self.schema = pa.schema([(name, pa.from_numpy_dtype(np.dtype(dtype))) for name, dtype in COLUMNS.items()],
+                                metadata={'trajectory_export': json.dumps(dict(metadata or {}, source=source),
+                                                                          ensure_ascii=False, default=str)})
+        self.directory = source_directory(directory, source)
+        self.row_group_size = row_group_size
+        self.rotate_rows = rotate_rows
+        self.rotate_interval = rotate_interval
+        self.compression = compression
+
+        self.rows_written = 0  # 已写入文件的行数
+        self.files_written = []  # 已完成的文件
+        self.error = None  # 后台写入的错误信息
+
+        self._buffer = self._new_buffer()
+        self._buffered = 0
+        self._writer = None
+        self._path = None
+        self._file_rows = 0
+        self._file_opened = 0.0
+        self._sequence = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name='trajectory-export', daemon=True)
+        self._thread.start()
+
+    def append(self, frame, timestamp, ids, classes, boxes, speeds, in_zone, in_warning_zone, violating):
+        """
+        追加一帧的轨迹
+        :param frame: 视频帧序号
+        :param timestamp: 帧时间（秒）
+        :param ids: 各目标的 ID，形状为 (N,)
+        :param classes: 各目标的类别
+        :param boxes: 中心点格式的检测框，形状为 (N, 4)
+        :param speeds: 各目标的速度（km/h），未知为 nan
+        :param in_zone: 是否在统计区域内
+        :param in_warning_zone: 是否在警告区域内
+        :param violating: 是否正在警报
+        """
+        count = len(ids)
+        if count == 0:
+            return
+        boxes = np.asarray(boxes).reshape(-1, 4)
+        values = {
+            'frame': frame, 'timestamp': timestamp, 'track_id': ids, 'class': classes,
+            'x': boxes[:, 0], 'y': boxes[:, 1], 'w': boxes[:, 2], 'h': boxes[:, 3], 'speed': speeds,
+            'in_zone': in_zone, 'in_warning_zone': in_warning_zone, 'violating': violating,
+        }
+        # 直接写入预分配的行组缓冲区，一帧跨越行组边界时分两次写入
+        start = 0
+        while start < count:
+            take = min(count - start, self.row_group_size - self._buffered)
+            position = self._buffered
+            for name, value in values.items():
+                column = self._buffer[name]
+                if np.ndim(value) == 0:
+                    column[position:position + take] = value
+                else:
+                    column[position:position + take] = value[start:start + take]
+            self._buffered += take
+            start += take
+            if self._buffered >= self.row_group_size:
+                self.flush()
+
+    def _new_buffer(self):
+        """分配一个行组的列缓冲区"""
+        return {name: np.empty(self.row_group_size, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+    def flush(self):
+        """把缓冲区中的行作为一个行组交给后台线程写入（队列已满时等待）"""
+        if self._buffered == 0:
+            return
+        columns = {name: column[:self._buffered] for name, column in self._buffer.items()}
+        self._buffer = self._new_buffer()
+        self._buffered = 0
+        self._queue.put(columns)
+
+    @property
+    def backlog(self):
+        """等待写入的行组数"""
+        return self._queue.qsize()
+
+    def _open(self):
+        """打开新文件"""
+        self._sequence += 1
+        name = f"{time.strftime('%Y%m%d_%H%M%S')}_{self._sequence:04d}.parquet"
+        self._path = os.path.join(self.directory, name)
+        self._writer = self._pq.ParquetWriter(self._part_path(), self.schema, compression=self.compression)
+        self._file_rows = 0
+        self._file_opened = time.time()
+
+    def _part_path(self):
+        """正在写入的文件路径"""
+        return os.path.join(self.directory, "." + os.path.basename(self._path) + ".part")
+
+    def _close_file(self):
+        """关闭当前文件并改为正式文件名"""
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(self._part_path(), self._path)
+        self.files_written.append(self._path)
+        self._writer = None
+
+    def _run(self):
+        """后台写入线程"""
+        while True:
+            columns = self._queue.get()
+            if columns is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                if self._writer is not None and (
+                        self._file_rows >= self.rotate_rows
+                        or (self.rotate_interval and time.time() - self._file_opened >= self.rotate_interval)):
+                    self._close_file()
+                if self._writer is None:
+                    self._open()
+                table = self._pa.Table.from_pydict(columns, schema=self.schema)
+                self._writer.write_table(table, row_group_size=self.row_group_size)
+                self._file_rows += table.num_rows
+                self.rows_written += table.num_rows
+            except Exception as e:
+                self.error = str(e)
+                print(f"轨迹导出失败: {e}")
+        try:
+            self._close_file()
+        except Exception as e:
+            self.error = str(e)
+            print(f"轨迹文件关闭失败: {e}")
+
+    def close(self):
+        """写入剩余的行并关闭文件"""
+        if self._thread is None:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def get_summary(self):
+        """返回导出统计信息"""
+        summary = f"轨迹导出: {self.rows_written}行，{len(self.files_written)}个文件（{self.directory}）"
+        if self.error is not None:
+            summary += f"，错误: {self.error}"
+        return summary
+
+
+def read_trajectories(directory=TRAJECTORY_DIR, source=None, columns=None, start=None, end=None):
+    """
+    按列读取导出的轨迹
+    :param directory: 导出根目录
+    :param source: 只读取该视频源，为 None 时读取全部视频源（结果包含 source 列）
+    :param columns: 读取的列，为 None 时读取全部列
+    :param start: 起始时间（秒，timestamp 列），包含
+    :param end: 结束时间（秒），不包含
+    :return: pandas.DataFrame
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(source_directory(directory, source) if source is not None else directory,
+                         format='parquet', partitioning='hive' if source is None else None)
+    condition = None
+    if start is not None:
+        condition = ds.field('timestamp') >= start
+    if end is not None:
+        condition = ds.field('timestamp') < end if condition is None else condition & (ds.field('timestamp') < end)
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查看导出的轨迹")
+    parser.add_argument("directory", nargs="?", default=TRAJECTORY_DIR, help="导出根目录")
+    parser.add_argument("--source", default=None, help="视频源（分区名），默认全部")
+    parser.add_argument("--start", type=float, default=None, help="起始时间（秒）")
+    parser.add_argument("--end", type=float, default=None, help="结束时间（秒）")
+    args = parser.parse_args()
+
+    frame = read_trajectories(args.directory, args.source, start=args.start, end=args.end)
+    if frame.empty:
+        print("没有轨迹数据")
+        return
+    print(f"共 {len(frame)} 行，{frame['track_id'].nunique()} 个目标，"
+          f"时间 {frame['timestamp'].min():.1f} - {frame['timestamp'].max():.1f} 秒")
+    by_class = frame.groupby('class').agg(targets=('track_id', 'nunique'), mean_speed=('speed', 'mean'))
+    print(by_class.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import queue
+import subprocess
+import threading
+
+import cv2
+
+
+class BackgroundVideoEncoder:
+    """
+    后台视频编码器
+    作用：
+        代替在 update_frame 中同步调用 videowriter.write()，编码在独立线程中完成，
+        主循环只负责把帧放入有界队列，队列满时直接丢帧并计数，编码永远不会拖慢检测。
+    功能：
+        1. 可配置输出分辨率（resize 在编码线程中完成）
+        2. 帧率抽取：例如输入 30fps、record_fps=10 时每 3 帧只录制 1 帧
+        3. 可选通过管道把原始帧交给外部 ffmpeg 进程，使用 libx264 等更好的编码器
+    """
+    def __init__(self, output_path, fps, frame_size, output_size=None, record_fps=None,
+                 backend='opencv', fourcc='mp4v', ffmpeg_path='ffmpeg', ffmpeg_codec='libx264',
+                 ffmpeg_args=None, queue_size=32):
+        """
+        :param output_path: 输出视频文件路径
+        :param fps: 输入视频帧率
+        :param frame_size: 输入帧尺寸 (width, height)
+        :param output_size: 输出分辨率 (width, height)，为 None 时与输入一致
+        :param record_fps: 录制帧率，为 None 或不小于输入帧率时录制全部帧
+        :param backend: 编码后端，'opencv' 使用 cv2.VideoWriter，'ffmpeg' 使用外部 ffmpeg 进程
+        :param fourcc: OpenCV 后端使用的编码器四字符码
+        :param ffmpeg_path: ffmpeg 可执行文件路径
+        :param ffmpeg_codec: ffmpeg 后端使用的视频编码器
+        :param ffmpeg_args: 追加给 ffmpeg 的额外参数列表（如 ['-preset', 'veryfast', '-crf', '23']）
+        :param queue_size: 待编码帧队列的最大长度
+        """
+        self.output_path = output_path
+        self.frame_size = tuple(frame_size)
+        self.output_size = tuple(output_size) if output_size else self.frame_size
+        self.backend = backend
+
+        # 帧率抽取：按累计相位决定每一帧是否录制，支持非整数倍的帧率比
+        self.input_fps = fps if fps and fps > 0 else 30
+        self.record_fps = min(record_fps, self.input_fps) if record_fps else self.input_fps
+        self._phase = 0.0
+
+        self.frames_submitted = 0  # 送入编码器的帧数（抽取之后）
+        self.frames_written = 0  # 实际写入的帧数
+        self.frames_dropped = 0  # 因队列已满而丢弃的帧数
+        self.frames_skipped = 0  # 因帧率抽取而跳过的帧数
+        self.error = None  # 编码线程中发生的异常
+
+        if backend == 'ffmpeg':
+            self._writer = self._open_ffmpeg(ffmpeg_path, ffmpeg_codec, ffmpeg_args or [])
+        elif backend == 'opencv':
+            self._writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc),
+                                           self.record_fps, self.output_size)
+        else:
+            raise ValueError(f"未知的编码后端: {backend}")
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name='video-encoder', daemon=True)
+        self._thread.start()
+
+    def _open_ffmpeg(self, ffmpeg_path, codec, extra_args):
+        """启动 ffmpeg 子进程，从标准输入读取 BGR 原始帧"""
+        width, height = self.output_size
+        command = [
+            ffmpeg_path, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+            '-s', f'{width}x{height}', '-r', str(self.record_fps),
+            '-i', '-',
+            '-an', '-c:v', codec, '-pix_fmt', 'yuv420p',
+            *extra_args,
+            self.output_path,
+        ]
+        return subprocess.Popen(command, stdin=subprocess.PIPE)
+
+    @property
+    def backlog(self):
+        """当前等待编码的帧数"""
+        return self._queue.qsize()
+
+    def write(self, frame):
+        """
+        提交一帧待编码（非阻塞）
+        :param frame: BGR 帧图像
+        :return: 是否成功放入队列；因帧率抽取跳过或队列已满时返回 False
+        """
+        self._phase += self.record_fps / self.input_fps
+        if self._phase < 1.0:
+            self.frames_skipped += 1
+            return False
+        self._phase -= 1.0
+
+        self.frames_submitted += 1
+        try:
+            self._queue.put_nowait(frame)
+        except queue.Full:
+            self.frames_dropped += 1
+            return False
+        return True
+
+    def _run(self):
+        """编码线程：从队列取帧、缩放并写入"""
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                if (frame.shape[1], frame.shape[0]) != self.output_size:
+                    frame = cv2.resize(frame, self.output_size, interpolation=cv2.INTER_AREA)
+                if self.backend == 'ffmpeg':
+                    self._writer.stdin.write(frame.tobytes())
+                else:
+                    self._writer.write(frame)
+                self.frames_written += 1
+            except Exception as e:
+                # 记录异常后继续消费队列，保证主循环不会被阻塞
+                self.error = e
+                print(f"视频编码错误: {e}")
+
+    def release(self):
+        """等待队列中剩余的帧编码完成并关闭输出文件"""
+        self._queue.put(None)
+        self._thread.join()
+        if self.backend == 'ffmpeg':
+            try:
+                self._writer.stdin.close()
+            except Exception:
+                pass
+            self._writer.wait()
+        else:
+            self._writer.release()
+
+    def get_summary(self):
+        """返回录制统计信息字符串"""
+        return (f"录制 {self.frames_written} 帧, 丢弃 {self.frames_dropped} 帧, "
+                f"抽帧跳过 {self.frames_skipped} 帧")
@@ -5,8 +5,22 @@ import threading
 engine = pyttsx3.init()
 # 添加一个锁对象
 engine_lock = threading.Lock()
+# 等待或正在播放的语音警报数
+pending_alerts = 0
+pending_lock = threading.Lock()
 
 def play_voice_alert():
-    with engine_lock:
-        engine.say("警告！非机动车闯入机动车道")
-        engine.runAndWait()
\ No newline at end of file
+    global pending_alerts
+    with pending_lock:
+        pending_alerts += 1
+    try:
+        with engine_lock:
+            engine.say("警告！非机动车闯入机动车道")
+            engine.runAndWait()
+    finally:
+        with pending_lock:
+            pending_alerts -= 1
+
+def get_pending_alerts():
+    """返回等待或正在播放的语音警报数"""
+    return pending_alerts
\ No newline at end of file